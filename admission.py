@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+from metrics import registry
+from config import (
+    RATE_LIMIT_USER_PER_MINUTE, RATE_LIMIT_USER_BURST, RATE_LIMIT_CHAT_PER_MINUTE, RATE_LIMIT_CHAT_BURST,
+    SPEAK_QUEUE_DEPTH, SPEAK_QUEUE_POLICY, UPSTREAM_MAX_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLICIES = ("drop_oldest", "drop_newest", "coalesce")
+
+ADMISSIONS = registry.counter(
+    "voicebot_admission_total", "Commands by admission outcome", ("command", "outcome")
+)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.notified_at = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float = 1.0) -> float:
+        self._refill(time.monotonic())
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, cost: float = 1.0):
+        self.tokens -= cost
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class RateLimiter:
+    # One bucket per key; full buckets carry no state, so they are the first to go
+    # when the table grows past max_keys
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 10000):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(self.per_minute, self.burst)
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def _prune(self):
+        for key in [key for key, bucket in self._buckets.items() if bucket.full]:
+            del self._buckets[key]
+        while len(self._buckets) >= self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class SpeakJob:
+    def __init__(self, text: str, run: Callable[[str], Awaitable[bool]]):
+        self.text = text
+        self.run = run
+        self.merged = 1
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def resolve(self, outcome: str):
+        if not self.result.done():
+            self.result.set_result(outcome)
+
+
+class SpeakQueue:
+    # Work waiting for one chat, run one at a time. When full, the policy decides
+    # who loses: the oldest waiting job, the new one, or neither (texts are merged).
+    def __init__(self, chat_id: int, depth: int = SPEAK_QUEUE_DEPTH, policy: str = SPEAK_QUEUE_POLICY):
+        self.chat_id = chat_id
+        self.depth = depth
+        self.policy = policy if policy in QUEUE_POLICIES else "drop_oldest"
+        self.pending: Deque[SpeakJob] = deque()
+        self.running: Optional[SpeakJob] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, job: SpeakJob) -> Tuple[str, SpeakJob]:
+        outcome = "queued"
+        if len(self.pending) >= max(self.depth, 1):
+            if self.policy == "drop_newest":
+                job.resolve("shed")
+                return "shed_newest", job
+            if self.policy == "coalesce":
+                last = self.pending[-1]
+                last.text = f"{last.text} {job.text}"
+                last.merged += 1
+                return "coalesced", last
+            self.pending.popleft().resolve("superseded")
+            outcome = "shed_oldest"
+
+        self.pending.append(job)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._drain())
+        return outcome, job
+
+    async def _drain(self):
+        while self.pending:
+            job = self.pending.popleft()
+            self.running = job
+            try:
+                job.resolve("ok" if await job.run(job.text) else "failed")
+            except asyncio.CancelledError:
+                job.resolve("cancelled")
+                raise
+            except Exception as e:
+                logger.error(f"Error running queued request in chat {self.chat_id}: {e}")
+                job.resolve("failed")
+            finally:
+                self.running = None
+
+    def close(self):
+        for job in self.pending:
+            job.resolve("cancelled")
+        self.pending.clear()
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+
+
+class AdmissionController:
+    # Sits in front of the command handlers: token buckets per user and per chat for
+    # every command, and a bounded queue per chat for commands that cost an LLM turn
+    def __init__(self):
+        self.users = RateLimiter(RATE_LIMIT_USER_PER_MINUTE, RATE_LIMIT_USER_BURST)
+        self.chats = RateLimiter(RATE_LIMIT_CHAT_PER_MINUTE, RATE_LIMIT_CHAT_BURST)
+        self.queues: Dict[int, SpeakQueue] = {}
+
+    def check(self, command: str, chat_id: int, user_id: Optional[int], cost: float = 1.0) -> Tuple[float, bool]:
+        # Returns (seconds to wait, whether to tell the sender); (0, False) admits
+        buckets: List[Tuple[str, TokenBucket]] = []
+        if self.users.enabled and user_id is not None:
+            buckets.append(("rate_limited_user", self.users.bucket(user_id)))
+        if self.chats.enabled:
+            buckets.append(("rate_limited_chat", self.chats.bucket(chat_id)))
+
+        # Nothing is taken unless every bucket admits, so a chat-wide limit does not
+        # also drain the sender's own allowance
+        for outcome, bucket in buckets:
+            wait = bucket.wait_time(cost)
+            if wait > 0:
+                ADMISSIONS.inc(command, outcome)
+                now = time.monotonic()
+                # One notice per cooldown, otherwise the replies become the spam
+                notify = now >= bucket.notified_at
+                if notify:
+                    bucket.notified_at = now + wait
+                return wait, notify
+
+        for _, bucket in buckets:
+            bucket.take(cost)
+        ADMISSIONS.inc(command, "accepted")
+        return 0.0, False
+
+    def submit_speak(self, chat_id: int, text: str, run: Callable[[str], Awaitable[bool]]) -> Tuple[str, SpeakJob]:
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = self.queues[chat_id] = SpeakQueue(chat_id)
+        outcome, job = queue.submit(SpeakJob(text, run))
+        if outcome != "queued":
+            ADMISSIONS.inc("speak", outcome)
+            logger.info(f"[{chat_id}] Speak queue full ({queue.policy}): {outcome}")
+        return outcome, job
+
+    def queue_depth(self, chat_id: Optional[int] = None) -> int:
+        if chat_id is not None:
+            queue = self.queues.get(chat_id)
+            return len(queue.pending) if queue else 0
+        return sum(len(queue.pending) for queue in self.queues.values())
+
+    def close_chat(self, chat_id: int):
+        queue = self.queues.pop(chat_id, None)
+        if queue:
+            queue.close()
+
+    def close(self):
+        for chat_id in list(self.queues):
+            self.close_chat(chat_id)
+
+
+class ConcurrencyLimit:
+    # Global cap on LLM requests and TTS renders in flight, shared by every call.
+    # Held only while waiting on an upstream API, never while audio plays.
+    def __init__(self, limit: int = UPSTREAM_MAX_CONCURRENCY):
+        self.limit = limit
+        self.in_use = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            return self
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._semaphore is not None:
+            self.in_use -= 1
+            self._semaphore.release()
+
+
+admission = AdmissionController()
+upstream_limit = ConcurrencyLimit()
+
+registry.gauge(
+    "voicebot_speak_queue_depth", "Speak requests waiting in per-chat queues",
+    callback=admission.queue_depth
+)
+registry.gauge(
+    "voicebot_upstream_in_use", "Upstream LLM and TTS requests in flight under the global concurrency cap",
+    callback=lambda: upstream_limit.in_use
+)
+registry.gauge(
+    "voicebot_upstream_waiting", "Upstream LLM and TTS requests waiting for a slot under the global concurrency cap",
+    callback=lambda: upstream_limit.waiting
+)
@@ -1,68 +1,274 @@
-import httpx
+import asyncio
 import logging
-from typing import List, Dict
-from config import OPENAI_API_KEY, OPENAI_BASE_URL, MODEL_ID
+import re
+import time
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from conversation_memory import ConversationMemory
+from log_pipeline import TURN_DETAIL
+from llm_client import Endpoint, LLMStatusError, LLMUnavailableError, llm_client
+from response_cache import CachedResponse, response_cache
+from tracing import current_trace, record, span
+from config import MODEL_ID, MEMORY_SUMMARIZE, MEMORY_SUMMARY_MAX_TOKENS
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a helpful AI assistant in a voice call. Keep responses concise and conversational, as they will be spoken aloud. Limit responses to 2-3 sentences unless specifically asked for more detail."
+
+SUMMARY_PROMPT = "Update the running summary of a voice call conversation. Keep names, facts, open questions and user preferences. Reply with the updated summary only, in at most 4 sentences."
+
+ERROR_REPLY = "I'm sorry, I'm having trouble processing that right now."
+EXCEPTION_REPLY = "I apologize, but I encountered an error."
+
+SENTENCE_BOUNDARY = re.compile(r'[.!?…]+["\')\]]*\s+')
+MIN_SENTENCE_CHARS = 12
+
+
+def split_sentences(buffer: str) -> Tuple[List[str], str]:
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(buffer):
+        end = match.end()
+        if len(buffer[start:end].strip()) < MIN_SENTENCE_CHARS:
+            continue
+        sentences.append(buffer[start:end].strip())
+        start = end
+    return sentences, buffer[start:]
+
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+class Speculation:
+    # A reply streamed ahead of a final transcript. stream_response adopts it only
+    # when the final text matches and the conversation has not moved on since.
+    def __init__(self, text: str, memory_version: int):
+        self.text = text
+        self.memory_version = memory_version
+        self.started = time.perf_counter()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, deltas: AsyncIterator[str]):
+        self._task = asyncio.create_task(self._fill(deltas))
+
+    async def _fill(self, deltas: AsyncIterator[str]):
+        try:
+            async for delta in deltas:
+                self._queue.put_nowait(delta)
+        except Exception as e:
+            self._queue.put_nowait(e)
+        finally:
+            self._queue.put_nowait(None)
+
+    async def deltas(self) -> AsyncIterator[str]:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+
 class AIHandler:
     def __init__(self):
-        self.api_key = OPENAI_API_KEY
-        self.base_url = OPENAI_BASE_URL
         self.model = MODEL_ID
-        self.conversation_history: List[Dict] = []
-        self.max_history = 10
-        
-    async def get_response(self, user_message: str) -> str:
+        self.endpoints: List[Endpoint] = llm_client.endpoints
+        self.memory = ConversationMemory(
+            SYSTEM_PROMPT,
+            summarizer=self._summarize if MEMORY_SUMMARIZE else None
+        )
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        return self.memory.messages
+
+    @classmethod
+    async def close(cls):
+        await llm_client.close()
+
+    @classmethod
+    def is_healthy(cls) -> bool:
+        return llm_client.is_healthy()
+
+    def _add_user_message(self, user_message: str):
+        self.memory.append("user", user_message)
+
+    def _build_request(self, stream: bool = False) -> Dict:
+        payload = {
+            "model": self.model,
+            "messages": self.memory.build_prompt(),
+            "temperature": 0.7,
+            "max_tokens": 150
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def cache_key(self, user_message: str) -> Optional[str]:
+        # Allow-listed intents are answered from the prompt and model alone; "repeat"
+        # also depends on the previous reply
+        last_reply = next(
+            (message["content"] for message in reversed(self.memory.messages) if message["role"] == "assistant"),
+            ""
+        )
+        return response_cache.key(user_message, f"{self.model}\x1f{SYSTEM_PROMPT}", last_reply)
+
+    def _cached(self, key: Optional[str]) -> Optional[CachedResponse]:
+        cached = response_cache.get(key) if key else None
+        trace = current_trace.get()
+        if cached is not None and trace is not None:
+            trace.tags.setdefault("response_cache", "text")
+        return cached
+
+    def cached_audio(self, user_message: str, key: str, profile: str) -> Optional[Tuple[str, bytes]]:
+        # A reply cached together with its audio in this voice skips the LLM, TTS and decoding
+        cached = response_cache.peek(key)
+        if cached is None or profile not in cached.audio:
+            return None
+
+        response_cache.get(key)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.tags["response_cache"] = "audio"
+        self._add_user_message(user_message)
+        logger.info(f"AI Response (cached): {cached.text}", extra=TURN_DETAIL)
+        return cached.text, cached.audio[profile]
+
+    def commit_reply(self, ai_message: str):
+        if not ai_message:
+            return
+        self.memory.append("assistant", ai_message)
+
+    async def _summarize(self, summary: str, messages: List[Dict]) -> Optional[str]:
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        data = await llm_client.complete(
+            {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Current summary: {summary or '(none)'}\n\nNew turns:\n{transcript}"}
+                ],
+                "temperature": 0.2,
+                "max_tokens": MEMORY_SUMMARY_MAX_TOKENS
+            },
+            self.endpoints,
+            hedge=False
+        )
+        return data["choices"][0]["message"]["content"]
+
+    async def get_response(self, user_message: str, commit: bool = True) -> str:
         try:
-            self.conversation_history.append({
-                "role": "user",
-                "content": user_message
-            })
-            
-            if len(self.conversation_history) > self.max_history * 2:
-                self.conversation_history = self.conversation_history[-(self.max_history * 2):]
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a helpful AI assistant in a voice call. Keep responses concise and conversational, as they will be spoken aloud. Limit responses to 2-3 sentences unless specifically asked for more detail."
-                            },
-                            *self.conversation_history
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 150
-                    }
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    ai_message = data["choices"][0]["message"]["content"]
-                    
-                    self.conversation_history.append({
-                        "role": "assistant",
-                        "content": ai_message
-                    })
-                    
-                    logger.info(f"AI Response: {ai_message}")
-                    return ai_message
-                else:
-                    logger.error(f"API Error: {response.status_code} - {response.text}")
-                    return "I'm sorry, I'm having trouble processing that right now."
-                    
+            key = self.cache_key(user_message)
+            cached = self._cached(key)
+            self._add_user_message(user_message)
+
+            if cached is not None:
+                ai_message = cached.text
+            else:
+                with span("llm"):
+                    data = await llm_client.complete(self._build_request(), self.endpoints)
+
+                ai_message = data["choices"][0]["message"]["content"]
+                if key:
+                    response_cache.put(key, ai_message)
+
+            if commit:
+                self.commit_reply(ai_message)
+
+            logger.info(f"AI Response: {ai_message}", extra=TURN_DETAIL)
+            return ai_message
+
+        except (LLMStatusError, LLMUnavailableError) as e:
+            logger.error(f"API Error: {e}")
+            return ERROR_REPLY
         except Exception as e:
             logger.error(f"Error getting AI response: {e}")
-            return "I apologize, but I encountered an error."
-    
+            return EXCEPTION_REPLY
+
+    def _deltas(self, payload: Dict) -> AsyncIterator[str]:
+        return llm_client.stream(payload, self.endpoints)
+
+    def speculate(self, user_message: str) -> "Speculation":
+        # Start the reply to a not yet final user turn without touching memory
+        payload = self._build_request(stream=True)
+        payload["messages"] = [*payload["messages"], {"role": "user", "content": user_message}]
+        speculation = Speculation(user_message, self.memory.version)
+        speculation.start(self._deltas(payload))
+        return speculation
+
+    async def stream_response(
+        self,
+        user_message: str,
+        commit: bool = True,
+        speculation: Optional["Speculation"] = None
+    ) -> AsyncIterator[str]:
+        key = self.cache_key(user_message)
+        cached = self._cached(key)
+        if speculation is not None and (cached is not None or speculation.memory_version != self.memory.version):
+            speculation.cancel()
+            speculation = None
+
+        self._add_user_message(user_message)
+
+        if cached is not None:
+            deltas = _replay(cached.text)
+            started = time.perf_counter()
+        elif speculation is not None:
+            deltas = speculation.deltas()
+            started = speculation.started
+        else:
+            deltas = self._deltas(self._build_request(stream=True))
+            started = time.perf_counter()
+
+        buffer = ""
+        spoken: List[str] = []
+        complete = False
+        try:
+            with span("llm" if cached is None else "response_cache"):
+                async for delta in deltas:
+                    buffer += delta
+                    sentences, buffer = split_sentences(buffer)
+                    for sentence in sentences:
+                        if not spoken:
+                            record("llm_first_sentence", started)
+                        spoken.append(sentence)
+                        yield sentence
+
+            tail = buffer.strip()
+            if tail:
+                if not spoken:
+                    record("llm_first_sentence", started)
+                spoken.append(tail)
+                yield tail
+            complete = True
+
+        except (LLMStatusError, LLMUnavailableError) as e:
+            logger.error(f"API Error: {e}")
+            if not spoken:
+                yield ERROR_REPLY
+        except Exception as e:
+            logger.error(f"Error streaming AI response: {e}")
+            if not spoken:
+                yield EXCEPTION_REPLY
+        finally:
+            await deltas.aclose()
+            if speculation is not None:
+                speculation.cancel()
+            if spoken:
+                ai_message = " ".join(spoken)
+                # Interrupted or failed generations are not worth repeating to anyone
+                if complete and key and cached is None:
+                    response_cache.put(key, ai_message)
+                if commit:
+                    self.commit_reply(ai_message)
+                logger.info(f"AI Response: {ai_message}", extra=TURN_DETAIL)
+
     def reset_conversation(self):
-        self.conversation_history = []
+        self.memory.reset()
         logger.info("Conversation history reset")
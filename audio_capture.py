@@ -0,0 +1,190 @@
+import asyncio
+import io
+import logging
+import warnings
+import wave
+from collections import deque
+from typing import Awaitable, Callable, Optional, Set
+from config import (
+    CAPTURE_SAMPLE_RATE, VAD_FRAME_MS, VAD_ENERGY_THRESHOLD, VAD_NOISE_RATIO,
+    VAD_MAX_ZCR, VAD_START_MS, VAD_SILENCE_MS, VAD_PREROLL_MS,
+    VAD_MIN_UTTERANCE_MS, VAD_MAX_UTTERANCE_MS, BARGE_IN_MIN_SPEECH_MS,
+    STT_PARTIAL_INTERVAL_MS, STT_PARTIAL_PAUSE_MS
+)
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import audioop
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2
+
+
+class VoiceActivityDetector:
+    # Energy + zero-crossing VAD over 16-bit mono PCM frames with an adaptive noise floor
+    def __init__(
+        self,
+        energy_threshold: int = VAD_ENERGY_THRESHOLD,
+        noise_ratio: float = VAD_NOISE_RATIO,
+        max_zcr: float = VAD_MAX_ZCR
+    ):
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.max_zcr = max_zcr
+        self.noise_floor = float(energy_threshold) / noise_ratio
+
+    def is_speech(self, frame: bytes) -> bool:
+        energy = audioop.rms(frame, SAMPLE_WIDTH)
+        samples = len(frame) // SAMPLE_WIDTH
+        zcr = audioop.cross(frame, SAMPLE_WIDTH) / samples if samples else 0.0
+
+        threshold = max(self.energy_threshold, self.noise_floor * self.noise_ratio)
+        voiced = energy >= threshold and zcr <= self.max_zcr
+
+        if not voiced:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+        return voiced
+
+
+class UtteranceCapture:
+    def __init__(
+        self,
+        on_utterance: Callable[[bytes], Awaitable[None]],
+        on_speech_start: Optional[Callable[[], None]] = None,
+        on_partial: Optional[Callable[[bytes, int, bool], None]] = None,
+        sample_rate: int = CAPTURE_SAMPLE_RATE,
+        frame_ms: int = VAD_FRAME_MS,
+        start_ms: int = VAD_START_MS,
+        silence_ms: int = VAD_SILENCE_MS,
+        preroll_ms: int = VAD_PREROLL_MS,
+        min_utterance_ms: int = VAD_MIN_UTTERANCE_MS,
+        max_utterance_ms: int = VAD_MAX_UTTERANCE_MS,
+        barge_in_ms: int = BARGE_IN_MIN_SPEECH_MS,
+        partial_interval_ms: int = STT_PARTIAL_INTERVAL_MS,
+        partial_pause_ms: int = STT_PARTIAL_PAUSE_MS,
+        vad: Optional[VoiceActivityDetector] = None
+    ):
+        self.on_utterance = on_utterance
+        self.on_speech_start = on_speech_start
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.min_frames = max(1, min_utterance_ms // frame_ms)
+        self.max_frames = max(1, max_utterance_ms // frame_ms)
+        self.barge_in_frames = max(1, barge_in_ms // frame_ms)
+        self.partial_frames = max(1, partial_interval_ms // frame_ms)
+        self.pause_frames = max(1, partial_pause_ms // frame_ms)
+        self.vad = vad or VoiceActivityDetector()
+
+        self._pending = bytearray()
+        self._preroll = deque(maxlen=max(self.start_frames, preroll_ms // frame_ms))
+        self._utterance = bytearray()
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+        self._announced = False
+        self._since_partial = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.frames_processed = 0
+        self.utterances = 0
+        self.last_speech_frames = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    def push(self, pcm: bytes):
+        self._pending += pcm
+        frame_bytes = self.frame_bytes
+        offset = 0
+        while len(self._pending) - offset >= frame_bytes:
+            self._process_frame(bytes(self._pending[offset:offset + frame_bytes]))
+            offset += frame_bytes
+        if offset:
+            del self._pending[:offset]
+
+    def _process_frame(self, frame: bytes):
+        self.frames_processed += 1
+        voiced = self.vad.is_speech(frame)
+
+        if not self._in_speech:
+            self._preroll.append(frame)
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.start_frames:
+                self._in_speech = True
+                self._silent_run = 0
+                self._speech_frames = self._voiced_run
+                for buffered in self._preroll:
+                    self._utterance += buffered
+                self._preroll.clear()
+            return
+
+        self._utterance += frame
+        if voiced:
+            self._silent_run = 0
+            self._speech_frames += 1
+            self._since_partial += 1
+            if not self._announced and self._speech_frames >= self.barge_in_frames:
+                self._announced = True
+                if self.on_speech_start:
+                    self.on_speech_start()
+            if self.on_partial and self._since_partial >= self.partial_frames:
+                self._since_partial = 0
+                self.on_partial(self.to_wav(bytes(self._utterance)), self._speech_frames, False)
+        else:
+            self._silent_run += 1
+            # A short pause may be the end of the utterance: transcribe everything so far
+            # while the VAD is still waiting out the silence
+            if self.on_partial and self._silent_run == self.pause_frames and self._speech_frames >= self.min_frames:
+                self._since_partial = 0
+                self.on_partial(self.to_wav(bytes(self._utterance)), self._speech_frames, True)
+
+        if self._silent_run >= self.silence_frames or len(self._utterance) >= self.max_frames * self.frame_bytes:
+            self._end_utterance()
+
+    def _end_utterance(self):
+        speech_frames = self._speech_frames
+        pcm = bytes(self._utterance)
+
+        self._utterance.clear()
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+        self._announced = False
+        self._since_partial = 0
+        self.last_speech_frames = speech_frames
+
+        if speech_frames < self.min_frames:
+            return
+
+        self.utterances += 1
+        logger.debug(f"Utterance captured ({len(pcm) / self.frame_bytes * self.frame_ms:.0f}ms)")
+        task = asyncio.create_task(self.on_utterance(self.to_wav(pcm)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def flush(self):
+        if self._in_speech:
+            self._end_utterance()
+
+    def to_wav(self, pcm: bytes) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(SAMPLE_WIDTH)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm)
+        return buffer.getvalue()
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
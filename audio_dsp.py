@@ -0,0 +1,158 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+from metrics import registry
+from config import (
+    PLAYBACK_SAMPLE_RATE, AUDIO_DSP, AUDIO_SILENCE_DB, AUDIO_KEEP_LEAD_MS, AUDIO_KEEP_TAIL_MS,
+    AUDIO_TARGET_DBFS, AUDIO_PEAK_DBFS, AUDIO_MAX_GAIN_DB, AUDIO_PCM_CACHE_MAX_BYTES
+)
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 10
+FULL_SCALE = 32768.0
+
+AUDIO_TRIMMED_SECONDS = registry.histogram(
+    "voicebot_audio_trimmed_seconds", "Silence trimmed from rendered TTS audio", ("edge",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+AUDIO_GAIN_DB = registry.histogram(
+    "voicebot_audio_gain_db", "Loudness normalization gain applied to rendered TTS audio",
+    buckets=(-12.0, -6.0, -3.0, 0.0, 3.0, 6.0, 12.0, 20.0)
+)
+PCM_CACHE_LOOKUPS = registry.counter(
+    "voicebot_pcm_cache_lookups_total", "Lookups of processed call PCM by rendered audio", ("result",)
+)
+
+
+def to_db(value: float) -> float:
+    return 20 * np.log10(max(value, 1e-9))
+
+
+def frame_rms(samples: np.ndarray, sample_rate: int = PLAYBACK_SAMPLE_RATE) -> np.ndarray:
+    # RMS of consecutive 10 ms frames, relative to full scale; a partial last frame is dropped
+    size = sample_rate * FRAME_MS // 1000
+    count = len(samples) // size
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * size].astype(np.float32).reshape(count, size) / FULL_SCALE
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def trim_silence(
+    samples: np.ndarray,
+    sample_rate: int = PLAYBACK_SAMPLE_RATE,
+    threshold_db: float = AUDIO_SILENCE_DB,
+    keep_lead_ms: int = AUDIO_KEEP_LEAD_MS,
+    keep_tail_ms: int = AUDIO_KEEP_TAIL_MS,
+    rms: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, int, int]:
+    # Returns the trimmed samples and how many were cut from the start and the end
+    if rms is None:
+        rms = frame_rms(samples, sample_rate)
+    voiced = np.flatnonzero(rms > 10 ** (threshold_db / 20))
+    if len(voiced) == 0:
+        return samples, 0, 0
+
+    size = sample_rate * FRAME_MS // 1000
+    start = max(0, voiced[0] * size - sample_rate * keep_lead_ms // 1000)
+    end = min(len(samples), (voiced[-1] + 1) * size + sample_rate * keep_tail_ms // 1000)
+    return samples[start:end], start, len(samples) - end
+
+
+def normalize(
+    samples: np.ndarray,
+    sample_rate: int = PLAYBACK_SAMPLE_RATE,
+    target_dbfs: float = AUDIO_TARGET_DBFS,
+    peak_dbfs: float = AUDIO_PEAK_DBFS,
+    max_gain_db: float = AUDIO_MAX_GAIN_DB,
+    threshold_db: float = AUDIO_SILENCE_DB,
+    rms: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, float]:
+    # Brings the speech (frames above the silence threshold) to target_dbfs RMS,
+    # limited so the peak stays under peak_dbfs and quiet noise is not boosted far
+    if rms is None:
+        rms = frame_rms(samples, sample_rate)
+    voiced = rms[rms > 10 ** (threshold_db / 20)]
+    if len(voiced) == 0:
+        return samples, 0.0
+
+    loudness = to_db(float(np.sqrt(np.mean(voiced * voiced))))
+    peak = to_db(max(int(samples.max()), -int(samples.min())) / FULL_SCALE)
+    gain_db = min(target_dbfs - loudness, peak_dbfs - peak, max_gain_db)
+    if abs(gain_db) < 0.1:
+        return samples, 0.0
+
+    scaled = samples.astype(np.float32) * np.float32(10 ** (gain_db / 20))
+    return np.clip(np.rint(scaled), -32768, 32767).astype(np.int16), gain_db
+
+
+def postprocess(pcm: bytes, sample_rate: int = PLAYBACK_SAMPLE_RATE) -> Tuple[bytes, float, float, float]:
+    # Runs on decoded call-rate s16le mono PCM, so the result is ready for raw playback.
+    # Returns the PCM with the seconds trimmed from each end and the gain applied; this
+    # runs in a worker thread, so the caller records those with record_postprocess().
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if len(samples) == 0:
+        return pcm, 0.0, 0.0, 0.0
+    # Trimming only removes frames below the silence threshold, which loudness ignores,
+    # so one pass of frame levels serves both steps
+    rms = frame_rms(samples, sample_rate)
+    samples, lead, tail = trim_silence(samples, sample_rate, rms=rms)
+    samples, gain_db = normalize(samples, sample_rate, rms=rms)
+    return samples.tobytes(), lead / sample_rate, tail / sample_rate, gain_db
+
+
+def record_postprocess(lead_seconds: float, tail_seconds: float, gain_db: float):
+    # On the event loop, like every other metric update
+    AUDIO_TRIMMED_SECONDS.observe("lead", value=lead_seconds)
+    AUDIO_TRIMMED_SECONDS.observe("tail", value=tail_seconds)
+    AUDIO_GAIN_DB.observe(value=gain_db)
+
+
+class PcmCache:
+    # Final call PCM by rendered MP3, so a repeated phrase skips both ffmpeg and the DSP
+    def __init__(self, max_bytes: int = AUDIO_PCM_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size = 0
+
+    @staticmethod
+    def key(mp3: bytes) -> str:
+        settings = "|".join(map(str, (
+            AUDIO_DSP, AUDIO_SILENCE_DB, AUDIO_KEEP_LEAD_MS, AUDIO_KEEP_TAIL_MS,
+            AUDIO_TARGET_DBFS, AUDIO_PEAK_DBFS, AUDIO_MAX_GAIN_DB
+        )))
+        return hashlib.sha256(settings.encode("utf-8") + mp3).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        pcm = self._entries.get(key)
+        if pcm is None:
+            PCM_CACHE_LOOKUPS.inc("miss")
+            return None
+        self._entries.move_to_end(key)
+        PCM_CACHE_LOOKUPS.inc("hit")
+        return pcm
+
+    def put(self, key: str, pcm: bytes):
+        if self.max_bytes <= 0 or len(pcm) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = pcm
+        self.size += len(pcm)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes
+        }
+
+
+pcm_cache = PcmCache()
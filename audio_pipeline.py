@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Optional
+from pytgcalls.types.input_stream import AudioParameters, InputAudioStream, InputStream
+from config import PLAYBACK_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+
+
+def pcm_duration(pcm: bytes, sample_rate: int = PLAYBACK_SAMPLE_RATE) -> float:
+    return len(pcm) / (sample_rate * PCM_SAMPLE_WIDTH * PCM_CHANNELS)
+
+
+def silence_pcm(seconds: float, sample_rate: int = PLAYBACK_SAMPLE_RATE) -> bytes:
+    return b"\0" * (int(sample_rate * seconds) * PCM_SAMPLE_WIDTH * PCM_CHANNELS)
+
+
+def raw_stream(path: str, sample_rate: int = PLAYBACK_SAMPLE_RATE) -> InputStream:
+    # Raw s16le input is read by PyTgCalls directly, without an ffmpeg transcode
+    return InputStream(InputAudioStream(path, AudioParameters(bitrate=sample_rate)))
+
+
+def write_pcm(path: str, pcm: bytes, append: bool = False):
+    # The audio directory lives on tmpfs where available, so this is a memory copy
+    with open(path, "ab" if append else "wb") as file:
+        file.write(pcm)
+
+
+class PcmDecoder:
+    # Decodes EdgeTTS MP3 bytes to call-native PCM through a pre-spawned ffmpeg,
+    # so process start-up happens off the per-turn hot path.
+    def __init__(self, sample_rate: int = PLAYBACK_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._spare: Optional[asyncio.subprocess.Process] = None
+        self._refill_task: Optional[asyncio.Task] = None
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "mp3", "-i", "pipe:0",
+            "-f", "s16le", "-ac", str(PCM_CHANNELS), "-ar", str(self.sample_rate),
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+    async def _refill(self):
+        try:
+            self._spare = await self._spawn()
+        except Exception as e:
+            logger.error(f"Error starting ffmpeg decoder: {e}")
+
+    def start(self):
+        if self._spare is None and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _take(self) -> asyncio.subprocess.Process:
+        if self._refill_task and not self._refill_task.done():
+            # Shielded so a cancelled decode does not cancel the shared refill
+            await asyncio.shield(self._refill_task)
+
+        process = self._spare
+        self._spare = None
+        if process is None or process.returncode is not None:
+            process = await self._spawn()
+
+        self.start()
+        return process
+
+    async def decode(self, mp3: bytes) -> Optional[bytes]:
+        process = None
+        try:
+            process = await self._take()
+            pcm, error = await process.communicate(mp3)
+
+            if process.returncode != 0 or not pcm:
+                logger.error(f"ffmpeg decode failed ({process.returncode}): {error.decode(errors='replace').strip()}")
+                return None
+            return pcm
+
+        except Exception as e:
+            logger.error(f"Error decoding audio: {e}")
+            return None
+        finally:
+            # Cancelled by barge-in or leave: don't leave ffmpeg running with its pipes open
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def close(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+
+        if self._spare and self._spare.returncode is None:
+            self._spare.kill()
+            await self._spare.wait()
+        self._spare = None
+
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Command dispatch on a stream of synthetic group messages, mostly chatter with
+a few commands:
+  - before: the six NewMessage(pattern=...) handlers of the original main.py.
+    Telethon runs every handler's filter on every message and awaits the
+    handlers that match one after another. Handlers act in every chat, and
+    /joincall awaits event.get_chat() before doing anything
+  - after: the single CommandRouter, with handlers shaped like commands.py: a
+    first-character check, a table lookup, call commands only in chats with a
+    call, handlers as tracked tasks
+Updates are dispatched the way Telethon does by default (one task per update),
+so the end-to-end numbers include that overhead. Telegram round trips
+(get_chat, respond) sleep for --rtt-ms and are counted; the work of a command
+sleeps for --handler-ms.
+
+Usage: python benchmarks/bench_command_router.py [--messages 200000] [--command-ratio 0.01]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+import types
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+from command_router import COMMAND_MESSAGES, GLOBAL_COMMANDS, CommandRouter
+
+COMMANDS = ["joincall", "leavecall", "callstatus", "speak", "reset", "language", "help"]
+# The handlers main.py registered before the router; /language came later
+BASELINE_COMMANDS = ["joincall", "leavecall", "callstatus", "speak", "reset", "help"]
+CHATTER = [
+    "lol that's exactly what I said yesterday",
+    "does anyone know when the meetup starts? I thought it was at 7 but the pinned message says 8",
+    "ok",
+    "https://example.com/some/long/link/to/an/article?ref=share",
+    "Morning everyone! ☀️",
+    "I'll be there in 10",
+]
+
+calls = Counter()
+rtt = 0.0
+work = 0.0
+
+
+class FakeEvent:
+    def __init__(self, chat_id: int, text: str):
+        self.chat_id = chat_id
+        self.sender_id = chat_id * 7
+        self.raw_text = text
+        self.message = types.SimpleNamespace(text=text, message=text)
+        self.pattern_match = None
+
+    async def get_chat(self):
+        calls["get_chat"] += 1
+        await asyncio.sleep(rtt)
+
+    async def respond(self, text: str):
+        calls["respond"] += 1
+        await asyncio.sleep(rtt)
+
+
+def synthetic_stream(count: int, chats: int, command_ratio: float, seed: int = 7):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        chat_id = rng.randrange(1, chats + 1)
+        if rng.random() < command_ratio:
+            command = rng.choice(COMMANDS)
+            text = f"/{command} hello there" if command == "speak" else f"/{command}"
+        else:
+            text = rng.choice(CHATTER)
+        events.append(FakeEvent(chat_id, text))
+    return events
+
+
+def baseline_handlers(active):
+    # The bodies of the original main.py handlers, with the voice handler calls as sleeps
+    async def joincall(event):
+        await event.get_chat()
+        await asyncio.sleep(work)
+        await event.respond("✅ Joined the voice call!")
+
+    async def leavecall(event):
+        await asyncio.sleep(work)
+        await event.respond("✅ Left the voice call.")
+
+    async def callstatus(event):
+        await event.respond("📊 Voice Call Status")
+
+    async def speak(event):
+        text = event.message.text.replace("/speak", "").strip()
+        if not text:
+            await event.respond("❌ Please provide text to speak.")
+            return
+        if event.chat_id not in active:
+            await event.respond("❌ Not currently in a voice call.")
+            return
+        await asyncio.sleep(work)
+        await event.respond("✅ Message spoken in the voice call.")
+
+    async def reset(event):
+        await event.respond("✅ Conversation history reset.")
+
+    async def help(event):
+        await event.respond("🤖 Voice Bot Commands")
+
+    return {"joincall": joincall, "leavecall": leavecall, "callstatus": callstatus,
+            "speak": speak, "reset": reset, "help": help}
+
+
+def router_handlers(active):
+    # Shaped like commands.py; the router has already scoped call commands
+    async def joincall(event):
+        if event.chat_id in active:
+            await event.respond("ℹ️ Already in the voice call in this chat.")
+            return
+        await asyncio.sleep(work)
+        await event.respond("✅ Joined the voice call!")
+
+    async def action(event):
+        await asyncio.sleep(work)
+        await event.respond("✅ Done.")
+
+    async def reply(event):
+        await event.respond("📊 Voice Call Status")
+
+    handlers = {command: action for command in COMMANDS}
+    handlers.update(joincall=joincall, callstatus=reply, help=reply)
+    return handlers
+
+
+def telethon_filter(pattern):
+    # What NewMessage.filter does for a handler registered with only a pattern:
+    # no chat, sender or direction filters are set, so the regex is the test
+    def check(event) -> bool:
+        match = pattern(event.message.message or "")
+        if not match:
+            return False
+        event.pattern_match = match
+        return True
+    return check
+
+
+def baseline_dispatcher(handlers):
+    builders = [(telethon_filter(re.compile(f"/{command}").match), handlers[command]) for command in BASELINE_COMMANDS]
+
+    async def dispatch(event):
+        for check, callback in builders:
+            if not check(event):
+                continue
+            try:
+                await callback(event)
+            except Exception:
+                pass
+
+    def reject(event):
+        # Everything the loop above does for a message no handler takes
+        for check, _ in builders:
+            check(event)
+
+    return dispatch, reject
+
+
+async def dispatch_all(events, dispatch):
+    # Telethon's default: every update is dispatched in its own task
+    tasks = [asyncio.create_task(dispatch(event)) for event in events]
+    await asyncio.gather(*tasks)
+
+
+def rejection_cost(events, reject) -> float:
+    started = time.perf_counter()
+    for event in events:
+        reject(event)
+    return (time.perf_counter() - started) / len(events)
+
+
+async def main():
+    global rtt, work
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--active-chats", type=int, default=10, help="chats with a call")
+    parser.add_argument("--command-ratio", type=float, default=0.01)
+    parser.add_argument("--handler-ms", type=float, default=5.0)
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="Telegram round trip for get_chat and respond")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    rtt, work = args.rtt_ms / 1000, args.handler_ms / 1000
+
+    events = synthetic_stream(args.messages, args.chats, args.command_ratio)
+    chatter = [event for event in events if not event.raw_text.startswith("/")]
+    commands = len(events) - len(chatter)
+    active = set(range(1, args.active_chats + 1))
+
+    baseline_dispatch, baseline_reject = baseline_dispatcher(baseline_handlers(active))
+    router = CommandRouter(
+        router_handlers(active),
+        is_active=lambda chat_id: chat_id in active,
+        # The whole stream is offered at once here, so the cap on running commands is lifted
+        max_tasks=args.messages
+    )
+
+    async def router_dispatch(event):
+        await router(event)
+
+    results = {}
+    for name, dispatch in (("before", baseline_dispatch), ("router", router_dispatch)):
+        runs = []
+        for _ in range(args.repeats):
+            calls.clear()
+            started, cpu_started = time.perf_counter(), time.process_time()
+            await dispatch_all(events, dispatch)
+            # The router returns once a handler is started; count the wait for them to finish
+            await router.close(timeout=(rtt + work) * 10 + 1)
+            wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            runs.append((wall, cpu, dict(calls)))
+        # Best of the repeats, as for the other benchmarks
+        results[name] = min(runs, key=lambda run: run[0])
+
+    # A reject path that ends in the router's own bookkeeping, counter included
+    reject_seconds = {
+        "before": min(rejection_cost(chatter, baseline_reject) for _ in range(args.repeats)),
+        "router": min(rejection_cost(chatter, router.dispatch) for _ in range(args.repeats)),
+    }
+
+    print(f"{args.messages} messages across {args.chats} chats ({args.active_chats} with a call), "
+          f"{commands} commands ({args.command_ratio:.1%}), handlers {args.handler_ms:g}ms, rtt {args.rtt_ms:g}ms")
+    print(f"{'':8s} {'reject/chatter msg':>18s} {'end-to-end':>12s} {'cpu/msg':>9s} {'get_chat':>9s} {'respond':>8s}")
+    for name in ("before", "router"):
+        wall, cpu, counted = results[name]
+        print(f"{name:8s} {reject_seconds[name] * 1e6:16.2f}us {args.messages / wall:8.0f} msg/s "
+              f"{cpu / args.messages * 1e6:7.2f}us {counted.get('get_chat', 0):9d} {counted.get('respond', 0):8d}")
+    print()
+    print(f"router skipped {COMMAND_MESSAGES.value('out_of_scope') / args.repeats:.0f} call commands in chats "
+          f"without a call; global commands: {', '.join(sorted(GLOBAL_COMMANDS))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
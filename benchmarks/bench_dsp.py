@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Cost of getting a rendered TTS clip to call-ready PCM, per play:
+  - per-play ffmpeg transcode (a fresh ffmpeg for every playback, MP3 -> 48 kHz)
+  - the pre-spawned decoder plus the NumPy trim/normalize stage (first play)
+  - the processed PCM cache (every later play of the same clip)
+Also reports how much leading silence is trimmed, which is time the listener
+no longer waits before hearing speech. Needs ffmpeg on PATH, like the bot.
+
+Usage: python benchmarks/bench_dsp.py [--plays 30] [--seconds 4] [--lead-ms 250]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+from audio_dsp import PcmCache, frame_rms, postprocess, trim_silence
+from audio_pipeline import PcmDecoder
+from config import PLAYBACK_SAMPLE_RATE, AUDIO_SILENCE_DB
+
+SOURCE_RATE = 24000
+
+
+def synthetic_mp3(seconds: float, lead_ms: int, tail_ms: int) -> bytes:
+    # Speech-like voiced bursts at a quiet level, padded with silence like EdgeTTS output,
+    # encoded the way EdgeTTS delivers it (24 kHz mono 48 kbit/s MP3)
+    t = np.arange(int(seconds * SOURCE_RATE)) / SOURCE_RATE
+    envelope = (np.sin(2 * np.pi * 3 * t) > -0.3).astype(np.float32)
+    voice = 0.12 * envelope * (np.sin(2 * np.pi * 160 * t) + 0.5 * np.sin(2 * np.pi * 480 * t))
+    lead = np.zeros(SOURCE_RATE * lead_ms // 1000)
+    tail = np.zeros(SOURCE_RATE * tail_ms // 1000)
+    pcm = (np.concatenate([lead, voice, tail]) * 32767).astype(np.int16).tobytes()
+    return subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "s16le", "-ar", str(SOURCE_RATE), "-ac", "1",
+         "-i", "pipe:0", "-f", "mp3", "-b:a", "48k", "pipe:1"],
+        input=pcm, capture_output=True, check=True
+    ).stdout
+
+
+async def per_play_transcode(mp3: bytes) -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "mp3", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(PLAYBACK_SAMPLE_RATE), "pipe:1",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    pcm, _ = await process.communicate(mp3)
+    return pcm
+
+
+def first_audible_ms(pcm: bytes) -> float:
+    rms = frame_rms(np.frombuffer(pcm, dtype=np.int16))
+    voiced = np.flatnonzero(rms > 10 ** (AUDIO_SILENCE_DB / 20))
+    return float(voiced[0] * 10) if len(voiced) else 0.0
+
+
+def rms_dbfs(pcm: bytes) -> float:
+    samples = np.frombuffer(pcm, dtype=np.int16) / 32768.0
+    return 20 * np.log10(np.sqrt(np.mean(samples ** 2)) + 1e-9)
+
+
+def summary(samples) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"p50 {statistics.median(ordered) * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plays", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=4.0)
+    parser.add_argument("--lead-ms", type=int, default=250)
+    parser.add_argument("--tail-ms", type=int, default=600)
+    args = parser.parse_args()
+
+    mp3 = synthetic_mp3(args.seconds, args.lead_ms, args.tail_ms)
+
+    transcode = []
+    for _ in range(args.plays):
+        started = time.perf_counter()
+        raw = await per_play_transcode(mp3)
+        transcode.append(time.perf_counter() - started)
+
+    decoder = PcmDecoder()
+    decoder.start()
+    await asyncio.sleep(0.5)
+    first_play, dsp_only = [], []
+    for _ in range(args.plays):
+        started = time.perf_counter()
+        pcm = await decoder.decode(mp3)
+        dsp_started = time.perf_counter()
+        processed, _, _, _ = postprocess(pcm)
+        dsp_only.append(time.perf_counter() - dsp_started)
+        first_play.append(time.perf_counter() - started)
+        # Let the decoder refill its spare process, as it would between turns
+        await asyncio.sleep(0.2)
+    await decoder.close()
+
+    cache = PcmCache()
+    key = cache.key(mp3)
+    cache.put(key, processed)
+    cached = []
+    for _ in range(args.plays):
+        started = time.perf_counter()
+        cache.get(cache.key(mp3))
+        cached.append(time.perf_counter() - started)
+
+    _, lead, tail = trim_silence(np.frombuffer(raw, dtype=np.int16))
+    print(f"clip: {args.seconds:.1f}s speech + {args.lead_ms}ms lead / {args.tail_ms}ms tail silence, "
+          f"{len(mp3)} bytes MP3, {args.plays} plays")
+    print(f"per-play ffmpeg transcode:   {summary(transcode)}")
+    print(f"decoder + NumPy DSP (first): {summary(first_play)}")
+    print(f"  of which NumPy DSP:        {summary(dsp_only)}  "
+          f"({statistics.median(dsp_only) / (len(raw) / 2 / PLAYBACK_SAMPLE_RATE) * 1000:.2f}ms per audio-second)")
+    print(f"processed PCM cache (later): {summary(cached)}")
+    print()
+    print(f"first audible sound: {first_audible_ms(raw):.0f}ms -> {first_audible_ms(processed):.0f}ms "
+          f"(trimmed {lead / PLAYBACK_SAMPLE_RATE * 1000:.0f}ms lead, {tail / PLAYBACK_SAMPLE_RATE * 1000:.0f}ms tail)")
+    print(f"overall RMS: {rms_dbfs(raw):.1f} dBFS -> {rms_dbfs(processed):.1f} dBFS")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+End-to-end turn latency through VoiceCallHandler against local stand-ins for
+Telegram (PyTgCalls sink), the LLM, Groq STT and EdgeTTS. Drives scripted
+conversations on several calls at once and prints a JSON report that can be
+saved and compared between commits. Needs ffmpeg on PATH, like the bot.
+
+Usage: python benchmarks/bench_e2e.py [--calls 4] [--turns 8] [--voice-ratio 0.5]
+                                      [--output run.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("API_ID", "0")
+os.environ.setdefault("MODEL_ID", "stub-model")
+os.environ.setdefault("GROQ_API_KEY", "gsk_stub")
+os.environ.setdefault("TRACE_HISTORY", "100000")
+os.environ.setdefault("TTS_PREWARM_PHRASES", "")
+
+from e2e.fakes import FakeCommunicate, FakePyTgCalls, FakeServices, silent_mp3_second
+from e2e.scenarios import build_script, utterance_wav
+
+# Numbers compared by --compare; lower is better for all of them except throughput
+COMPARED = (
+    ("ttfa_ms", "p50"), ("ttfa_ms", "p95"), ("turn_ms", "p50"), ("turn_ms", "p95"),
+    ("throughput", "turns_per_s"), ("cpu", "ms_per_turn"), ("rss_mb", "peak")
+)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def distribution(values):
+    if not values:
+        return None
+    return {
+        "mean": round(statistics.mean(values) * 1000, 1),
+        "p50": round(percentile(values, 0.5) * 1000, 1),
+        "p95": round(percentile(values, 0.95) * 1000, 1),
+        "p99": round(percentile(values, 0.99) * 1000, 1),
+        "max": round(max(values) * 1000, 1)
+    }
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=REPO_ROOT).returncode != 0
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def run_call(handler, chat_id: int, script, think: float, wav_dir: str):
+    if not await handler.join_call(chat_id):
+        raise RuntimeError(f"Could not join fake call {chat_id}")
+
+    for i, (kind, payload) in enumerate(script):
+        if kind == "text":
+            await handler.process_and_speak(chat_id, payload)
+        else:
+            path = os.path.join(wav_dir, f"utterance_{chat_id}_{i}.wav")
+            with open(path, "wb") as file:
+                file.write(utterance_wav(payload))
+            await handler.listen_and_respond(chat_id, path)
+        await asyncio.sleep(think)
+
+    await handler.leave_call(chat_id)
+
+
+async def run(args) -> dict:
+    services = FakeServices(
+        tokens_per_second=args.tokens_per_second,
+        first_token_ms=args.first_token_ms,
+        stt_base_ms=args.stt_ms,
+        seed=args.seed
+    )
+    base_url = await services.start()
+
+    audio_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1/chat/completions"
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["AUDIO_DIR"] = audio_dir
+    os.environ["STREAM_RESPONSES"] = "false" if args.no_stream else "true"
+    os.environ["MAX_CALLS"] = str(max(args.calls, int(os.environ.get("MAX_CALLS", 10))))
+
+    # Imported only now so config picks up the stub endpoints
+    import edge_tts
+    import voice_handler
+    from tracing import recent_traces
+
+    FakeCommunicate.mp3_second = silent_mp3_second()
+    FakeCommunicate.realtime_factor = args.tts_realtime_factor
+    FakePyTgCalls.speed = args.playback_speed
+    edge_tts.Communicate = FakeCommunicate
+    voice_handler.PyTgCalls = FakePyTgCalls
+
+    handler = voice_handler.VoiceCallHandler(client=None)
+    await handler.start()
+
+    rng = random.Random(args.seed)
+    scripts = {1000 + i: build_script(args.turns, args.voice_ratio, rng) for i in range(args.calls)}
+
+    rss_start = current_rss_mb()
+    cpu_start = time.process_time()
+    children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wall_start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            run_call(handler, chat_id, script, args.think_ms / 1000, audio_dir)
+            for chat_id, script in scripts.items()
+        ))
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        children_cpu = (children.ru_utime - children_start.ru_utime) + (children.ru_stime - children_start.ru_stime)
+        sink_audio = handler.pytgcalls.audio_seconds
+        await handler.cleanup()
+        await services.stop()
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+    traces = [trace for trace in recent_traces if trace.chat_id in scripts]
+    ok = [trace for trace in traces if trace.outcome == "ok"]
+
+    stages = {}
+    for trace in ok:
+        for span in trace.spans:
+            if span.end is not None:
+                stages.setdefault(span.stage, []).append(span.end - span.start)
+
+    outcomes = {}
+    for trace in traces:
+        outcomes[trace.outcome] = outcomes.get(trace.outcome, 0) + 1
+
+    return {
+        **git_revision(),
+        "config": vars(args),
+        "turns": len(traces),
+        "outcomes": outcomes,
+        "ttfa_ms": distribution([trace.first_audio - trace.start for trace in ok if trace.first_audio]),
+        "turn_ms": distribution([trace.end - trace.start for trace in ok]),
+        "stages_ms": {stage: distribution(values) for stage, values in sorted(stages.items())},
+        "throughput": {
+            "wall_s": round(wall, 2),
+            "turns_per_s": round(len(traces) / wall, 3) if wall else None,
+            "audio_s": round(sink_audio, 1)
+        },
+        "cpu": {
+            "process_s": round(cpu, 3),
+            "children_s": round(children_cpu, 3),
+            "ms_per_turn": round((cpu + children_cpu) / len(traces) * 1000, 2) if traces else None
+        },
+        "rss_mb": {
+            "start": round(rss_start, 1),
+            "end": round(current_rss_mb(), 1),
+            "peak": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        },
+        "fake_requests": {"llm": services.llm_requests, "stt": services.stt_requests}
+    }
+
+
+def compare(report: dict, baseline: dict):
+    print(f"{'metric':<26}{'baseline':>12}{'current':>12}{'change':>10}", file=sys.stderr)
+    for section, key in COMPARED:
+        before = (baseline.get(section) or {}).get(key)
+        after = (report.get(section) or {}).get(key)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{section + '.' + key:<26}{before:>12}{after:>12}{change:>10}", file=sys.stderr)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=4, help="concurrent calls")
+    parser.add_argument("--turns", type=int, default=8, help="turns per call")
+    parser.add_argument("--voice-ratio", type=float, default=0.5, help="share of spoken turns (STT + listen_and_respond)")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="pause between a call's turns")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--first-token-ms", type=float, default=250.0)
+    parser.add_argument("--stt-ms", type=float, default=150.0)
+    parser.add_argument("--tts-realtime-factor", type=float, default=10.0)
+    parser.add_argument("--playback-speed", type=float, default=20.0, help="fake sink plays this many times faster than real time")
+    parser.add_argument("--no-stream", action="store_true", help="use the non-streaming reply path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--compare", help="baseline report to diff against (printed to stderr)")
+    args = parser.parse_args()
+
+    report = await run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Sequential-turn latency: fresh httpx client per turn vs the pooled AIHandler client.
+
+Usage: python benchmarks/bench_llm_client.py [--turns 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+os.environ.setdefault("MODEL_ID", "stub-model")
+
+import httpx
+from aiohttp import web
+from ai_handler import AIHandler
+from llm_client import Endpoint
+
+
+async def completion(request):
+    await request.json()
+    return web.json_response({
+        "choices": [{"message": {"role": "assistant", "content": "Sure, here you go."}}]
+    })
+
+
+async def start_stub():
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completion)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+async def per_turn_client(url: str, handler: AIHandler, turns: int):
+    latencies = []
+    endpoint = Endpoint("stub", url, handler.model, api_key="stub")
+    for i in range(turns):
+        handler._add_user_message(f"turn {i}")
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(url, headers=endpoint.headers(), json=endpoint.payload(handler._build_request()))
+            response.json()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def pooled_client(url: str, handler: AIHandler, turns: int):
+    latencies = []
+    handler.endpoints = [Endpoint("stub", url, handler.model)]
+    for i in range(turns):
+        start = time.perf_counter()
+        await handler.get_response(f"turn {i}")
+        latencies.append(time.perf_counter() - start)
+    await handler.close()
+    return latencies
+
+
+def report(name: str, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<12} mean={statistics.mean(latencies) * 1000:7.2f}ms "
+          f"p50={statistics.median(latencies) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    runner, url = await start_stub()
+    try:
+        report("per-turn", await per_turn_client(url, AIHandler(), args.turns))
+        report("pooled", await pooled_client(url, AIHandler(), args.turns))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
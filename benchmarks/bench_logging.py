@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Turn throughput and event loop stalls with logging off, with the old synchronous
+stdout handler, and with the queued pipeline (text, JSON, JSON sampled).
+
+Turns log what the real handlers log: transcript, reply, TTS text and playback,
+with realistic payload sizes. The sink stands in for a container stdout pipe
+under backpressure: every write blocks for --sink-ms.
+
+Usage: python benchmarks/bench_logging.py [--turns 400] [--calls 8] [--sink-ms 0.5]
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+import log_pipeline
+from log_pipeline import LOG_RECORDS_DROPPED, TURN_DETAIL, TEXT_FORMAT, setup_logging
+from tracing import Trace, current_trace
+
+logger = logging.getLogger("bench")
+
+TRANSCRIPT = "can you tell me what the weather is going to be like tomorrow afternoon in the city center " * 2
+REPLY = ("Tomorrow afternoon looks mostly sunny with a light breeze from the west. "
+         "Temperatures should peak around twenty two degrees, so a light jacket is plenty. ") * 3
+
+
+class SlowSink(io.TextIOBase):
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        time.sleep(self.delay)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+async def turn(chat_id: int):
+    trace = Trace(chat_id, TRANSCRIPT)
+    token = current_trace.set(trace)
+    try:
+        logger.info(f"[{chat_id}] Heard: {TRANSCRIPT}", extra=TURN_DETAIL)
+        await asyncio.sleep(0)
+        logger.info(f"[{chat_id}] Processing text: {TRANSCRIPT}", extra=TURN_DETAIL)
+        await asyncio.sleep(0)
+        logger.info(f"AI Response: {REPLY}", extra=TURN_DETAIL)
+        for sentence in REPLY.split(". "):
+            logger.info(f"Converting text to speech: {sentence[:50]}...", extra=TURN_DETAIL)
+            await asyncio.sleep(0)
+        logger.info(f"[{chat_id}] Playing 3 item(s), 4.2s", extra=TURN_DETAIL)
+    finally:
+        current_trace.reset(token)
+
+
+async def run(args, configure) -> dict:
+    sink = SlowSink(args.sink_ms / 1000)
+    configure(sink)
+    dropped_before = sum(LOG_RECORDS_DROPPED.value(reason) for reason in ("queue_full", "sampled"))
+
+    stalls = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - started - 0.001)
+
+    async def call(chat_id: int, turns: int):
+        for _ in range(turns):
+            await turn(chat_id)
+
+    monitor = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(call(-1000 - index, args.turns // args.calls) for index in range(args.calls)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    log_pipeline.stop_logging()
+    for handler in logging.getLogger().handlers[:]:
+        logging.getLogger().removeHandler(handler)
+
+    stalls.sort()
+    return {
+        "turns_per_sec": args.turns / elapsed,
+        "stall_p99_ms": stalls[int(len(stalls) * 0.99)] * 1000 if stalls else 0.0,
+        "stall_max_ms": stalls[-1] * 1000 if stalls else 0.0,
+        "writes": sink.writes,
+        "dropped": sum(LOG_RECORDS_DROPPED.value(reason) for reason in ("queue_full", "sampled")) - dropped_before
+    }
+
+
+def logging_off(sink):
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def synchronous(sink):
+    # What logging.basicConfig in main.py used to set up
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+
+
+def queued(log_format: str, sample_rate: float = 1.0):
+    def configure(sink):
+        setup_logging(stream=sink, log_format=log_format, sample_rate=sample_rate)
+        logging.getLogger().setLevel(logging.INFO)
+    return configure
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--calls", type=int, default=8)
+    parser.add_argument("--sink-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    modes = {
+        "off": logging_off,
+        "sync stdout": synchronous,
+        "queued text": queued("text"),
+        "queued json": queued("json"),
+        "queued json 10%": queued("json", sample_rate=0.1),
+    }
+
+    print(f"{args.turns} turns over {args.calls} calls, {args.sink_ms}ms per sink write")
+    print(f"{'mode':<16} {'turns/s':>9} {'stall p99':>10} {'stall max':>10} {'writes':>7} {'dropped':>8}")
+    for name, configure in modes.items():
+        result = await run(args, configure)
+        print(f"{name:<16} {result['turns_per_sec']:>9.0f} {result['stall_p99_ms']:>8.2f}ms "
+              f"{result['stall_max_ms']:>8.2f}ms {result['writes']:>7} {result['dropped']:>8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
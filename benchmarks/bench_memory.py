@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Prompt size and turn latency over a long conversation: the old 20-message
+window vs token-budgeted ConversationMemory, against a local stub whose
+latency grows with prompt size.
+
+Usage: python benchmarks/bench_memory.py [--turns 150] [--ms-per-1k-tokens 40]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+os.environ.setdefault("MODEL_ID", "stub-model")
+
+from aiohttp import web
+from ai_handler import AIHandler, SYSTEM_PROMPT
+from llm_client import Endpoint, llm_client
+from conversation_memory import estimate_tokens
+
+
+def make_app(ms_per_1k_tokens: float):
+    async def completion(request):
+        body = await request.json()
+        tokens = sum(estimate_tokens(message["content"]) for message in body["messages"])
+        await asyncio.sleep(0.01 + tokens / 1000 * ms_per_1k_tokens / 1000)
+        words = random.randint(15, 60)
+        content = " ".join(["word"] * words) + "."
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completion)
+    return app
+
+
+async def start_stub(ms_per_1k_tokens: float):
+    runner = web.AppRunner(make_app(ms_per_1k_tokens))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+def user_turn(rng: random.Random, i: int) -> str:
+    return f"Turn {i}: " + " ".join(["detail"] * rng.choice((5, 10, 40, 120)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_window(url: str, turns: int, window: int = 20):
+    # The previous behaviour: keep the last `window` messages regardless of size
+    rng = random.Random(1)
+    handler = AIHandler()
+    history = []
+    prompt_tokens, latencies = [], []
+    client = llm_client.http()
+    for i in range(turns):
+        history.append({"role": "user", "content": user_turn(rng, i)})
+        history = history[-window:]
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}, *history]
+        prompt_tokens.append(sum(estimate_tokens(message["content"]) for message in messages))
+        start = time.perf_counter()
+        response = await client.post(url, json={"model": handler.model, "messages": messages})
+        latencies.append(time.perf_counter() - start)
+        history.append({"role": "assistant", "content": response.json()["choices"][0]["message"]["content"]})
+    return prompt_tokens, latencies
+
+
+async def run_memory(url: str, turns: int):
+    rng = random.Random(1)
+    handler = AIHandler()
+    handler.endpoints = [Endpoint("stub", url, handler.model)]
+    prompt_tokens, latencies = [], []
+
+    build_request = handler._build_request
+
+    def recording_build_request(stream: bool = False):
+        prompt_tokens.append(handler.memory.prompt_tokens)
+        return build_request(stream)
+
+    handler._build_request = recording_build_request
+
+    for i in range(turns):
+        start = time.perf_counter()
+        await handler.get_response(user_turn(rng, i))
+        latencies.append(time.perf_counter() - start)
+
+    # Let the last background summary land before reading the stats
+    await asyncio.sleep(0.2)
+    return prompt_tokens, latencies, handler.memory.stats()
+
+
+def summarize(prompt_tokens, latencies):
+    return {
+        "prompt_tokens_mean": round(statistics.mean(prompt_tokens), 1),
+        "prompt_tokens_max": max(prompt_tokens),
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 2),
+        "latency_ms_p95": round(percentile(latencies, 0.95) * 1000, 2)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=150)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=40.0)
+    args = parser.parse_args()
+
+    runner, url = await start_stub(args.ms_per_1k_tokens)
+    try:
+        window_tokens, window_latency = await run_window(url, args.turns)
+        memory_tokens, memory_latency, stats = await run_memory(url, args.turns)
+        print(json.dumps({
+            "turns": args.turns,
+            "message_window": summarize(window_tokens, window_latency),
+            "token_budget": {**summarize(memory_tokens, memory_latency), "memory": stats}
+        }, indent=2))
+    finally:
+        await AIHandler.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Session persistence costs:
+  - write amplification per conversation turn, writing each turn through in its
+    own transaction vs the write-behind batches the bot uses.
+    "disk" is what SQLite handed to write(2), from /proc/self/io, against the
+    payload (message text and chat rows) that actually changed
+  - how long the hot path waits on the store per turn in each mode (write-behind
+    batches are written by the background task in the bot, so they do not count)
+  - restore time for one chat as its saved history grows, and the startup
+    lookup of calls to rejoin
+
+Usage: python benchmarks/bench_session_store.py [--chats 20] [--turns 50] [--flush-every 40]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+from conversation_memory import ConversationMemory
+from session_store import STATE_BYTES_WRITTEN, STATE_ROWS_WRITTEN, SessionStore
+
+USER = "Could you remind me what we decided about the release date for the mobile app?"
+ASSISTANT = ("We agreed to ship the mobile app on the twelfth, after the last round of testing. "
+             "The web release follows a week later.")
+
+
+def fake_session(chat_id: int):
+    # The attributes the store reads and restores, without Telegram or the LLM client
+    return types.SimpleNamespace(
+        chat_id=chat_id, is_in_call=True, stt_language=None, stt_model=None,
+        tts_handler=types.SimpleNamespace(voice="en-US-AndrewNeural", rate="+0%", volume="+0%"),
+        ai_handler=types.SimpleNamespace(memory=ConversationMemory("You are a helpful voice assistant."))
+    )
+
+
+def bytes_written() -> int:
+    try:
+        with open("/proc/self/io") as file:
+            for line in file:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def counters() -> tuple:
+    return (STATE_ROWS_WRITTEN.value("messages") + STATE_ROWS_WRITTEN.value("chats"), STATE_BYTES_WRITTEN.value())
+
+
+async def run_turns(path: str, chats: int, turns: int, flush_every: int) -> dict:
+    # flush_every=1 is write-through: every turn waits for its own transaction
+    store = SessionStore(path)
+    sessions = [fake_session(chat_id) for chat_id in range(1, chats + 1)]
+    for session in sessions:
+        await store.restore(session)
+        store.save(session)
+    await store.flush()
+
+    rows_before, payload_before = counters()
+    flushes_before = store.flushes
+    disk_before = bytes_written()
+    waits = []
+    total = 0
+    for turn in range(turns):
+        for session in sessions:
+            started = time.perf_counter()
+            memory = session.ai_handler.memory
+            memory.append("user", f"{USER} ({turn})")
+            memory.append("assistant", ASSISTANT)
+            if turn % 10 == 9:
+                memory.on_change("summary", None)
+            total += 1
+            if flush_every == 1:
+                await store.flush()
+            waits.append(time.perf_counter() - started)
+            if total % flush_every == 0:
+                await store.flush()
+    await store.flush()
+    disk = bytes_written() - disk_before
+    rows_after, payload_after = counters()
+    transactions = store.flushes - flushes_before
+    await store.close()
+    return {
+        "turns": total,
+        "transactions": transactions,
+        "rows": rows_after - rows_before,
+        "payload": payload_after - payload_before,
+        "disk": disk,
+        "waits": waits
+    }
+
+
+def report(name: str, result: dict):
+    turns = result["turns"]
+    waits = sorted(result["waits"])
+    p99 = waits[min(len(waits) - 1, int(0.99 * len(waits)))]
+    amplification = result["disk"] / result["payload"] if result["payload"] else 0.0
+    print(f"{name:14s} {result['transactions']:6d} txns  {result['rows'] / turns:5.2f} rows/turn  "
+          f"payload {result['payload'] / turns:6.0f} B/turn  disk {result['disk'] / turns:7.0f} B/turn  "
+          f"(x{amplification:4.1f})  hot-path wait p50 {statistics.median(waits) * 1e6:7.1f}us "
+          f"p99 {p99 * 1e6:7.1f}us")
+
+
+async def seed_history(path: str, chat_id: int, messages: int, other_chats: int):
+    store = SessionStore(path, max_messages=messages + 1)
+    for other in range(1000, 1000 + other_chats):
+        session = fake_session(other)
+        await store.restore(session)
+        for index in range(20):
+            session.ai_handler.memory.append("user", f"{USER} ({index})")
+        store.save(session)
+    session = fake_session(chat_id)
+    await store.restore(session)
+    for index in range(messages):
+        session.ai_handler.memory.append("user" if index % 2 == 0 else "assistant", f"{ASSISTANT} ({index})")
+    store.save(session)
+    await store.close()
+
+
+async def time_restore(path: str, chat_id: int, repeats: int) -> tuple:
+    restores, lookups = [], []
+    for _ in range(repeats):
+        # A fresh store each time, as after a restart: opening the file is part of the cost
+        store = SessionStore(path)
+        started = time.perf_counter()
+        await store.calls_to_rejoin()
+        lookups.append(time.perf_counter() - started)
+        session = fake_session(chat_id)
+        started = time.perf_counter()
+        await store.restore(session)
+        restores.append(time.perf_counter() - started)
+        await store.close()
+    return statistics.median(restores), statistics.median(lookups), len(session.ai_handler.memory.messages)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--flush-every", type=int, default=40, help="turns per write-behind batch")
+    parser.add_argument("--history", default="10,100,1000,10000,50000")
+    parser.add_argument("--other-chats", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        through = await run_turns(os.path.join(directory, "through.db"), args.chats, args.turns, 1)
+        behind = await run_turns(os.path.join(directory, "behind.db"), args.chats, args.turns, args.flush_every)
+        print(f"{args.chats} chats x {args.turns} turns (2 messages each, summary every 10th)")
+        report("write-through", through)
+        report("write-behind", behind)
+        print()
+
+        print(f"restore one chat, {args.other_chats} other saved chats, {args.repeats} cold opens each:")
+        for size in (int(value) for value in args.history.split(",")):
+            path = os.path.join(directory, f"history-{size}.db")
+            await seed_history(path, 1, size, args.other_chats)
+            restore, lookup, loaded = await time_restore(path, 1, args.repeats)
+            print(f"  {size:6d} saved messages: restore p50 {restore * 1000:6.2f}ms "
+                  f"({loaded} messages in memory), rejoin lookup {lookup * 1000:6.2f}ms, "
+                  f"file {os.path.getsize(path) / 1024:7.0f} KiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
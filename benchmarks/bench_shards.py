@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Call capacity of sharded workers on one machine.
+
+Each worker process serves simulated calls over the same unix-socket IPC the
+supervisor uses. A call pushes 20 ms frames of synthetic speech through the
+capture/VAD pipeline in real time, plus --frame-cpu-ms of busy work standing in
+for decode and resampling. Chats are placed on workers by the hash ring. The
+number of calls is stepped up until the p95 frame lag on any worker passes
+--max-lag-ms; the last passing step is the capacity for that worker count.
+
+Usage: python benchmarks/bench_shards.py [--workers 1,2,4] [--seconds 5] [--max-lag-ms 20]
+"""
+
+import argparse
+import array
+import asyncio
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+from audio_capture import UtteranceCapture
+from config import CAPTURE_SAMPLE_RATE
+from sharding import HashRing, IPCClient, IPCServer
+
+FRAME_MS = 20
+
+
+def synthetic_call(seconds: int, sample_rate: int, seed: int) -> bytes:
+    # 1.5 s of voiced tone every 2.5 s over low background noise
+    rng = random.Random(seed)
+    samples = array.array("h")
+    for n in range(seconds * sample_rate):
+        t = n / sample_rate
+        value = rng.gauss(0, 60)
+        if t % 2.5 < 1.5:
+            value += 4000 * math.sin(2 * math.pi * 180 * t) + 1500 * math.sin(2 * math.pi * 540 * t)
+        samples.append(max(-32768, min(32767, int(value))))
+    return samples.tobytes()
+
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def simulate_call(pcm: bytes, seconds: float, frame_cpu: float, lags: list):
+    async def on_utterance(wav: bytes):
+        pass
+
+    capture = UtteranceCapture(on_utterance)
+    chunk = CAPTURE_SAMPLE_RATE * FRAME_MS // 1000 * 2
+    interval = FRAME_MS / 1000
+    # Calls start at random phases, like real calls do
+    await asyncio.sleep(random.random() * interval)
+
+    started = time.perf_counter()
+    for tick in range(int(seconds / interval)):
+        scheduled = started + tick * interval
+        lags.append(max(0.0, time.perf_counter() - scheduled))
+        offset = tick * chunk % len(pcm)
+        capture.push(pcm[offset:offset + chunk])
+        busy(frame_cpu)
+        await asyncio.sleep(max(0.0, scheduled + interval - time.perf_counter()))
+    await capture.close()
+
+
+async def run_worker(socket_path: str):
+    pcm = synthetic_call(10, CAPTURE_SAMPLE_RATE, seed=os.getpid())
+    stopped = asyncio.Event()
+
+    async def run(notify, calls: int, seconds: float, frame_cpu_ms: float) -> dict:
+        lags: list = []
+        await asyncio.gather(*(
+            simulate_call(pcm, seconds, frame_cpu_ms / 1000, lags) for _ in range(calls)
+        ))
+        lags.sort()
+        return {"p95": lags[int(len(lags) * 0.95)] if lags else 0.0}
+
+    async def stop(notify):
+        stopped.set()
+
+    server = IPCServer(socket_path, {"run": run, "stop": stop})
+    await server.start()
+    await stopped.wait()
+    await server.stop()
+
+
+async def measure(clients: dict, ring: HashRing, calls: int, args) -> float:
+    placement = {name: 0 for name in clients}
+    for chat_id in range(-1001000000000, -1001000000000 - calls, -1):
+        placement[ring.node_for(chat_id)] += 1
+
+    results = await asyncio.gather(*(
+        clients[name].call("run", calls=count, seconds=args.seconds, frame_cpu_ms=args.frame_cpu_ms)
+        for name, count in placement.items()
+    ))
+    return max(result["p95"] for result in results) * 1000
+
+
+async def capacity(workers: int, args) -> tuple:
+    directory = tempfile.mkdtemp(prefix="bench-shards-")
+    names = [f"worker-{index}" for index in range(workers)]
+    processes, clients = [], {}
+    for name in names:
+        path = os.path.join(directory, f"{name}.sock")
+        processes.append(await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--worker", path
+        ))
+        clients[name] = IPCClient(path)
+        await clients[name].connect(timeout=30)
+
+    ring = HashRing(names)
+    best, best_lag = 0, 0.0
+    calls = args.step * workers
+    try:
+        while calls <= args.max_calls:
+            lag = await measure(clients, ring, calls, args)
+            print(f"  workers={workers} calls={calls:<4} p95 frame lag {lag:6.1f}ms")
+            if lag > args.max_lag_ms:
+                break
+            best, best_lag = calls, lag
+            calls += args.step * workers
+    finally:
+        for client in clients.values():
+            try:
+                await client.call("stop", timeout=5)
+            except Exception:
+                pass
+            await client.close()
+        for process in processes:
+            await process.wait()
+    return best, best_lag
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default: 1,2,4.. up to the CPU count)")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--frame-cpu-ms", type=float, default=0.5)
+    parser.add_argument("--max-lag-ms", type=float, default=20.0)
+    parser.add_argument("--step", type=int, default=4, help="calls added per worker at each step")
+    parser.add_argument("--max-calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(",")]
+    else:
+        counts = sorted({min(2 ** power, cores) for power in range(cores.bit_length() + 1)})
+
+    print(f"{cores} CPUs, {args.seconds:.0f}s per step, {args.frame_cpu_ms}ms CPU per {FRAME_MS}ms frame, "
+          f"max p95 lag {args.max_lag_ms:.0f}ms")
+    results = {}
+    for workers in counts:
+        results[workers] = await capacity(workers, args)
+
+    print()
+    print(f"{'workers':>8} {'calls':>6} {'per worker':>11} {'scaling':>8} {'p95 lag':>9}")
+    base = results[counts[0]][0] / counts[0] or 1
+    for workers, (calls, lag) in results.items():
+        print(f"{workers:>8} {calls:>6} {calls / workers:>11.1f} {calls / base:>7.2f}x {lag:>7.1f}ms")
+    if len(results) > 1:
+        print(f"median calls per worker: {statistics.median(c / w for w, (c, _) in results.items()):.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        asyncio.run(run_worker(sys.argv[2]))
+    else:
+        asyncio.run(main())
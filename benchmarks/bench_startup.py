@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cold start of the bot process: time until the health server answers and until
+the voice handler is ready, for the old sequential order ("eager": import
+everything, build the Groq client, start PyTgCalls, then the health server)
+and the current one ("lazy": health server first, modules imported off the
+loop, warm-ups in the background). Each trial is a fresh interpreter; Telegram
+is not contacted (PyTgCalls is replaced by the e2e fake).
+
+Usage: python benchmarks/bench_startup.py [--trials 5] [--budget 10]
+Exits with status 1 when the lazy median time-to-ready exceeds the budget.
+"""
+
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("API_ID", "0")
+os.environ.setdefault("TTS_PREWARM_PHRASES", "")
+os.environ.setdefault("FILLERS", "false")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def child(mode: str) -> dict:
+    logging.basicConfig(level=logging.WARNING)
+    from startup import StartupTimer
+    from health_server import HealthCheckServer
+
+    timer = StartupTimer(PROCESS_STARTED)
+    timer.mark("imports")
+    health_server = HealthCheckServer(readiness=lambda: {"ready": timer.total is not None})
+    health_at = None
+
+    if mode == "lazy":
+        await timer.run("health_server", health_server.start())
+        health_at = time.perf_counter() - PROCESS_STARTED
+        await timer.run("load_modules", asyncio.to_thread(importlib.import_module, "voice_handler"))
+    else:
+        with timer.phase("load_modules"):
+            importlib.import_module("voice_handler")
+
+    import voice_handler
+    from e2e.fakes import FakePyTgCalls
+    voice_handler.PyTgCalls = FakePyTgCalls
+
+    handler = voice_handler.VoiceCallHandler(client=None)
+    if mode == "lazy":
+        handler.prepare()
+        await timer.run("pytgcalls", handler.start())
+    else:
+        with timer.phase("groq_client"):
+            handler.stt_handler.get_client()
+        await timer.run("pytgcalls", handler.start())
+        await timer.run("health_server", health_server.start())
+        health_at = time.perf_counter() - PROCESS_STARTED
+
+    timer.ready()
+    report = {"mode": mode, "health_s": health_at, "ready_s": timer.total, "phases": timer.report()["phases"]}
+
+    await handler.cleanup()
+    await health_server.stop()
+    return report
+
+
+def run_trial(mode: str) -> dict:
+    env = {**os.environ, "PORT": str(free_port())}
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(reports) -> dict:
+    ms = lambda values: round(statistics.median(values) * 1000, 1)
+    phases = {}
+    for report in reports:
+        for name, timing in report["phases"].items():
+            phases.setdefault(name, []).append(timing["seconds"])
+    return {
+        "health_ms_p50": ms([report["health_s"] for report in reports]),
+        "ready_ms_p50": ms([report["ready_s"] for report in reports]),
+        "ready_ms_max": round(max(report["ready_s"] for report in reports) * 1000, 1),
+        "phases_ms_p50": {name: ms(values) for name, values in phases.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=float(os.environ.get("STARTUP_BUDGET", 10.0)), help="seconds")
+    parser.add_argument("--child", choices=("eager", "lazy"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args.child))))
+        return
+
+    results = {mode: summarize([run_trial(mode) for _ in range(args.trials)]) for mode in ("eager", "lazy")}
+    within_budget = results["lazy"]["ready_ms_p50"] <= args.budget * 1000
+    print(json.dumps({"trials": args.trials, "budget_s": args.budget, "within_budget": within_budget, **results}, indent=2))
+    if not within_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
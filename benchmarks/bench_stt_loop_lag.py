@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Event loop lag while transcriptions are in flight: blocking Groq client on
+the loop vs the async STTHandler path, against a local Whisper stand-in.
+
+Usage: python benchmarks/bench_stt_loop_lag.py [--requests 5] [--delay 0.3]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+from aiohttp import web
+from groq import AsyncGroq, Groq
+from loop_monitor import LoopLagMonitor
+import stt_handler
+from stt_handler import STTHandler
+
+
+def make_app(delay: float):
+    async def transcribe(request):
+        await request.read()
+        await asyncio.sleep(delay)
+        return web.Response(text="hello from the stub\n")
+
+    app = web.Application()
+    app.router.add_post("/openai/v1/audio/transcriptions", transcribe)
+    return app
+
+
+async def start_stub(delay: float):
+    runner = web.AppRunner(make_app(delay))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def run_stub_thread(delay: float):
+    # The blocking client would deadlock against a stub on the same loop.
+    ready = {}
+    started = asyncio.Event()
+    outer = asyncio.get_running_loop()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner, url = loop.run_until_complete(start_stub(delay))
+        ready["url"], ready["loop"], ready["runner"] = url, loop, runner
+        outer.call_soon_threadsafe(started.set)
+        loop.run_forever()
+        loop.run_until_complete(runner.cleanup())
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return ready, started, thread
+
+
+async def measure(name: str, work):
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=float("inf"))
+    monitor.start()
+    await asyncio.sleep(0.05)
+    await work()
+    await monitor.stop()
+    print(f"{name:<16} max loop lag={monitor.max_lag * 1000:8.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.3)
+    args = parser.parse_args()
+
+    ready, started, thread = run_stub_thread(args.delay)
+    await started.wait()
+    url = ready["url"]
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as handle:
+        handle.write(b"\0" * 32000)
+        audio_file = handle.name
+
+    try:
+        sync_client = Groq(api_key="stub", base_url=url)
+
+        async def blocking():
+            for _ in range(args.requests):
+                with open(audio_file, "rb") as file:
+                    sync_client.audio.transcriptions.create(
+                        file=(audio_file, file.read()),
+                        model="whisper-large-v3",
+                        response_format="text"
+                    )
+
+        handler = STTHandler()
+        handler.client = AsyncGroq(api_key="stub", base_url=url)
+
+        async def non_blocking():
+            await asyncio.gather(*(handler.transcribe_audio(audio_file) for _ in range(args.requests)))
+
+        await measure("blocking client", blocking)
+        await measure("STTHandler", non_blocking)
+        await handler.close()
+        print(f"(STT concurrency limit: {stt_handler.STT_MAX_CONCURRENCY})")
+    finally:
+        os.remove(audio_file)
+        ready["loop"].call_soon_threadsafe(ready["loop"].stop)
+        thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
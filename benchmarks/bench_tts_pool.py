@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Per-utterance TTS latency: a new edge_tts.Communicate websocket per utterance vs
+the warm connection pool, against a local stand-in for the Edge read-aloud
+service. The stand-in speaks the same websocket protocol, and it delays each
+handshake by --handshake-ms to stand in for TCP + TLS + upgrade round trips.
+Audio from both paths is compared byte for byte.
+
+Usage: python benchmarks/bench_tts_pool.py [--utterances 40] [--handshake-ms 120] [--concurrency 1]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+import edge_tts
+import edge_tts.communicate
+from aiohttp import WSMsgType, web
+from tts_engine import TTS_CONNECT_SECONDS, TTS_CONNECTIONS, TTS_SYNTHESIS_SECONDS, EdgeTTSPool
+
+PHRASES = [
+    "Sure, let me check that for you.",
+    "The meeting has been moved to three o'clock tomorrow afternoon.",
+    "I didn't catch that, could you say it again?",
+    "Here is a quick summary of what we discussed so far today.",
+]
+
+
+def make_app(handshake: float, per_char: float):
+    async def edge(request):
+        await asyncio.sleep(handshake)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type != WSMsgType.TEXT or "Path:ssml" not in message.data:
+                continue
+            request_id = message.data.split("X-RequestId:", 1)[1].split("\r\n", 1)[0]
+            ssml = message.data.split("\r\n\r\n", 1)[1]
+            await ws.send_str(f"X-RequestId:{request_id}\r\nPath:turn.start\r\n\r\n{{}}")
+            await asyncio.sleep(per_char * len(ssml))
+            # Deterministic fake MP3 frames derived from the request body
+            digest = hashlib.sha256(ssml.encode()).digest()
+            header = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+            for index in range(4):
+                await ws.send_bytes(len(header).to_bytes(2, "big") + header + digest * 32 + bytes([index]))
+            await ws.send_str(f"X-RequestId:{request_id}\r\nPath:turn.end\r\n\r\n{{}}")
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/edge/v1", edge)
+    return app
+
+
+async def one_off(text: str) -> bytes:
+    communicate = edge_tts.Communicate(text, "en-US-AndrewNeural")
+    return b"".join([chunk["data"] async for chunk in communicate.stream() if chunk["type"] == "audio"])
+
+
+async def run(synthesize, texts, concurrency: int) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, outputs = [], {}
+
+    async def one(text: str):
+        async with semaphore:
+            started = time.perf_counter()
+            outputs[text] = await synthesize(text)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in texts))
+    return latencies, outputs, time.perf_counter() - started
+
+
+def summary(latencies) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"p50 {statistics.median(ordered) * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms"
+
+
+def quantile_ms(histogram, q: float, *labels: str) -> str:
+    value = histogram.quantile(q, *labels)
+    return f"{value * 1000:7.1f}ms" if value is not None else "      -"
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=40)
+    parser.add_argument("--handshake-ms", type=float, default=120.0)
+    parser.add_argument("--ms-per-char", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=6)
+    args = parser.parse_args()
+
+    runner = web.AppRunner(make_app(args.handshake_ms / 1000, args.ms_per_char / 1000))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"ws://127.0.0.1:{port}/edge/v1?TrustedClientToken=stand-in"
+    edge_tts.communicate.WSS_URL = url
+
+    texts = [f"{PHRASES[i % len(PHRASES)]} ({i})" for i in range(args.utterances)]
+    pool = EdgeTTSPool(size=args.pool_size, url=url, min_idle=0, enabled=True)
+    try:
+        baseline, baseline_audio, baseline_wall = await run(one_off, texts, args.concurrency)
+        pooled, pooled_audio, pooled_wall = await run(
+            lambda text: pool.synthesize(text, "en-US-AndrewNeural"), texts, args.concurrency
+        )
+    finally:
+        await pool.close()
+        await runner.cleanup()
+
+    print(f"{args.utterances} utterances, concurrency {args.concurrency}, handshake {args.handshake_ms:.0f}ms")
+    print(f"one-off connection:  {summary(baseline)}  total {baseline_wall:.2f}s")
+    print(f"pooled connections:  {summary(pooled)}  total {pooled_wall:.2f}s")
+    print()
+    print(f"pool connection setup:     p50 {quantile_ms(TTS_CONNECT_SECONDS, 0.5)}  "
+          f"({TTS_CONNECTIONS.value('opened'):.0f} connections opened)")
+    print(f"synthesis, new connection: p50 {quantile_ms(TTS_SYNTHESIS_SECONDS, 0.5, 'new')}")
+    print(f"synthesis, reused:         p50 {quantile_ms(TTS_SYNTHESIS_SECONDS, 0.5, 'reused')}")
+    print(f"audio identical:           {'yes' if baseline_audio == pooled_audio else 'NO'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+CPU cost of the capture pipeline (framing + VAD + segmentation) per call-second.
+
+Usage: python benchmarks/bench_vad.py [--seconds 60] [--chunk-ms 20]
+"""
+
+import argparse
+import array
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("API_ID", "0")
+
+from audio_capture import UtteranceCapture
+from config import CAPTURE_SAMPLE_RATE
+
+
+def synthetic_call(seconds: int, sample_rate: int) -> bytes:
+    # 1.5 s of voiced tone every 2.5 s over low background noise
+    rng = random.Random(0)
+    samples = array.array("h")
+    for n in range(seconds * sample_rate):
+        t = n / sample_rate
+        value = rng.gauss(0, 60)
+        if t % 2.5 < 1.5:
+            value += 4000 * math.sin(2 * math.pi * 180 * t) + 1500 * math.sin(2 * math.pi * 540 * t)
+        samples.append(max(-32768, min(32767, int(value))))
+    return samples.tobytes()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--chunk-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    pcm = synthetic_call(args.seconds, CAPTURE_SAMPLE_RATE)
+    chunk = CAPTURE_SAMPLE_RATE * args.chunk_ms // 1000 * 2
+
+    utterance_bytes = []
+
+    async def on_utterance(wav: bytes):
+        utterance_bytes.append(len(wav))
+
+    capture = UtteranceCapture(on_utterance)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for offset in range(0, len(pcm), chunk):
+        capture.push(pcm[offset:offset + chunk])
+    capture.flush()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    await asyncio.sleep(0)
+    await capture.close()
+
+    print(f"call audio:        {args.seconds}s @ {CAPTURE_SAMPLE_RATE}Hz, {args.chunk_ms}ms chunks")
+    print(f"frames processed:  {capture.frames_processed}")
+    print(f"utterances:        {capture.utterances}")
+    print(f"cpu per call-sec:  {cpu / args.seconds * 1000:.3f}ms ({cpu / args.seconds * 100:.3f}% of a core)")
+    print(f"wall total:        {wall * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
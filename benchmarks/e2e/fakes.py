@@ -0,0 +1,191 @@
+"""
+Local stand-ins for the services a turn touches: an OpenAI-compatible chat
+endpoint and a Groq transcription endpoint (one aiohttp server), an EdgeTTS
+Communicate replacement and a PyTgCalls sink that plays raw PCM in scaled time.
+"""
+
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from e2e.scenarios import REPLY_WORDS, TRANSCRIPTS
+
+PCM_BYTES_PER_SECOND = 48000 * 2
+
+
+class FakeServices:
+    # Serves /v1/chat/completions (streamed or not) and /openai/v1/audio/transcriptions
+    def __init__(
+        self,
+        tokens_per_second: float = 50.0,
+        first_token_ms: float = 250.0,
+        reply_words: tuple = (12, 40),
+        stt_base_ms: float = 150.0,
+        stt_ms_per_audio_second: float = 30.0,
+        seed: int = 0
+    ):
+        self.tokens_per_second = tokens_per_second
+        self.first_token_ms = first_token_ms
+        self.reply_words = reply_words
+        self.stt_base_ms = stt_base_ms
+        self.stt_ms_per_audio_second = stt_ms_per_audio_second
+        self.rng = random.Random(seed)
+
+        self.llm_requests = 0
+        self.stt_requests = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def _reply(self) -> List[str]:
+        words = [self.rng.choice(REPLY_WORDS) for _ in range(self.rng.randint(*self.reply_words))]
+        tokens = []
+        for i, word in enumerate(words):
+            end = "." if (i + 1) % 9 == 0 or i == len(words) - 1 else ""
+            tokens.append(("" if i == 0 else " ") + word + end)
+        return tokens
+
+    async def completions(self, request: web.Request):
+        body = await request.json()
+        self.llm_requests += 1
+        tokens = self._reply()
+        await asyncio.sleep(self.first_token_ms / 1000)
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return web.json_response({
+                "choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}]
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for token in tokens:
+            chunk = {"choices": [{"delta": {"content": token}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(1 / self.tokens_per_second)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def transcriptions(self, request: web.Request):
+        audio = b""
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "file":
+                audio = await part.read()
+        self.stt_requests += 1
+
+        seconds = max(0, len(audio) - 44) / (16000 * 2)
+        await asyncio.sleep((self.stt_base_ms + seconds * self.stt_ms_per_audio_second) / 1000)
+        return web.Response(text=TRANSCRIPTS[len(audio) % len(TRANSCRIPTS)], content_type="text/plain")
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.completions)
+        app.router.add_post("/openai/v1/audio/transcriptions", self.transcriptions)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+def silent_mp3_second() -> bytes:
+    # One second of EdgeTTS-shaped MP3 (24 kHz mono, 48 kbit/s) without headers,
+    # so whole seconds can be concatenated into clips of any length
+    return subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono", "-t", "1",
+            "-b:a", "48k", "-write_xing", "0", "-id3v2_version", "0",
+            "-f", "mp3", "pipe:1"
+        ],
+        check=True, capture_output=True
+    ).stdout
+
+
+class FakeCommunicate:
+    # Drop-in for edge_tts.Communicate: streams MP3 sized to the spoken length of
+    # the text, producing audio `realtime_factor` times faster than real time
+    mp3_second = b""
+    first_chunk_ms = 120.0
+    realtime_factor = 10.0
+    words_per_second = 2.5
+    chunk_seconds = 1
+
+    def __init__(self, text: str, voice: str = "", rate: str = "+0%", volume: str = "+0%", **kwargs):
+        self.text = text
+
+    async def stream(self):
+        seconds = max(1, round(len(self.text.split()) / self.words_per_second))
+        await asyncio.sleep(self.first_chunk_ms / 1000)
+        for sent in range(0, seconds, self.chunk_seconds):
+            count = min(self.chunk_seconds, seconds - sent)
+            await asyncio.sleep(count / self.realtime_factor)
+            yield {"type": "audio", "data": self.mp3_second * count}
+
+
+class FakePyTgCalls:
+    # Drop-in for PyTgCalls: accepts raw PCM streams and reports stream end after
+    # the clip's duration divided by `speed`
+    latency_ms = 20.0
+    speed = 20.0
+
+    def __init__(self, client=None):
+        self._handlers = []
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self.streams_started = 0
+        self.audio_seconds = 0.0
+
+    def on_stream_end(self):
+        def decorator(handler):
+            self._handlers.append(handler)
+            return handler
+        return decorator
+
+    async def start(self):
+        pass
+
+    async def join_group_call(self, chat_id: int, stream, stream_type=None):
+        await self._play(chat_id, stream)
+
+    async def leave_group_call(self, chat_id: int):
+        timer = self._timers.pop(chat_id, None)
+        if timer:
+            timer.cancel()
+
+    async def change_stream(self, chat_id: int, stream):
+        await self._play(chat_id, stream)
+
+    async def _play(self, chat_id: int, stream):
+        await asyncio.sleep(self.latency_ms / 1000)
+        audio = getattr(stream, "stream_audio", None)
+        path = getattr(audio, "path", None)
+        seconds = os.path.getsize(path) / PCM_BYTES_PER_SECOND if path and os.path.exists(path) else 0.0
+
+        timer = self._timers.pop(chat_id, None)
+        if timer:
+            timer.cancel()
+
+        self.streams_started += 1
+        self.audio_seconds += seconds
+        loop = asyncio.get_running_loop()
+        self._timers[chat_id] = loop.call_later(seconds / self.speed, self._ended, chat_id)
+
+    def _ended(self, chat_id: int):
+        self._timers.pop(chat_id, None)
+        update = SimpleNamespace(chat_id=chat_id, time=time.time())
+        for handler in self._handlers:
+            asyncio.create_task(handler(self, update))
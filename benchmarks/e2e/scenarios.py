@@ -0,0 +1,56 @@
+"""
+Scripted conversations for the end-to-end benchmark. A turn is either typed
+(/speak, process_and_speak) or spoken (a WAV file fed to listen_and_respond).
+"""
+
+import io
+import random
+import wave
+from typing import List, Tuple
+
+USER_LINES = [
+    "Hi there, can you hear me?",
+    "What's the weather usually like in Lisbon in spring?",
+    "Give me a quick tip for sleeping better.",
+    "Tell me a short joke about programmers.",
+    "How long should I boil an egg?",
+    "What's a good name for a grey cat?",
+    "Summarize what we talked about so far.",
+    "Thanks, that's all for now."
+]
+
+TRANSCRIPTS = [
+    "Can you recommend a book for the weekend?",
+    "What time is it in Tokyo right now?",
+    "How do I make my coffee less bitter?",
+    "Remind me what you said a moment ago.",
+    "Okay, and what about the evening?"
+]
+
+REPLY_WORDS = (
+    "sure", "that", "sounds", "great", "you", "could", "try", "a", "little", "more",
+    "water", "and", "then", "wait", "for", "about", "ten", "minutes", "it", "usually",
+    "works", "well", "honestly", "I", "would", "start", "with", "the", "basics", "first"
+)
+
+Turn = Tuple[str, object]
+
+
+def build_script(turns: int, voice_ratio: float, rng: random.Random) -> List[Turn]:
+    script = []
+    for i in range(turns):
+        if rng.random() < voice_ratio:
+            script.append(("voice", round(rng.uniform(1.5, 6.0), 1)))
+        else:
+            script.append(("text", USER_LINES[i % len(USER_LINES)]))
+    return script
+
+
+def utterance_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\0" * int(seconds * sample_rate) * 2)
+    return buffer.getvalue()
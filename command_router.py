@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, FrozenSet, Optional, Set
+from metrics import registry
+from config import COMMAND_TIMEOUT, COMMAND_MAX_TASKS
+
+logger = logging.getLogger(__name__)
+
+# Commands that make sense in any chat; the rest act on a call and are only
+# handled where the bot has one
+GLOBAL_COMMANDS = frozenset({"joincall", "callstatus", "help"})
+MAX_COMMAND_CHARS = 64
+
+COMMAND_MESSAGES = registry.counter(
+    "voicebot_command_messages_total", "Messages seen by the command router, by what was done with them", ("result",)
+)
+COMMAND_SECONDS = registry.histogram(
+    "voicebot_command_seconds", "Time to run a command handler", ("command",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0)
+)
+COMMAND_TASKS = registry.gauge("voicebot_command_tasks", "Command handlers currently running")
+
+
+class CommandRouter:
+    # One NewMessage handler for all commands. Chatter is rejected by its first character,
+    # commands are looked up by name, and handlers run as tracked tasks with a timeout so
+    # a slow one never holds up the update loop.
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[..., Awaitable[None]]],
+        is_active: Optional[Callable[[int], bool]] = None,
+        global_commands: FrozenSet[str] = GLOBAL_COMMANDS,
+        timeout: float = COMMAND_TIMEOUT,
+        max_tasks: int = COMMAND_MAX_TASKS
+    ):
+        self.handlers = handlers
+        self.is_active = is_active
+        self.global_commands = global_commands
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    def route(self, text: Optional[str]) -> Optional[str]:
+        if not text or text[0] != "/":
+            return None
+        # Only the first word matters, and it is short; never scan a long message
+        name = text[1:MAX_COMMAND_CHARS].split(None, 1)
+        if not name:
+            return None
+        # "/speak@name" addresses the command to an account, as Telegram clients send it
+        name = name[0].partition("@")[0]
+        return name if name in self.handlers else None
+
+    async def __call__(self, event):
+        self.dispatch(event)
+
+    def dispatch(self, event) -> Optional[asyncio.Task]:
+        command = self.route(event.raw_text)
+        if command is None:
+            COMMAND_MESSAGES.inc("ignored")
+            return None
+
+        if command not in self.global_commands and self.is_active and not self.is_active(event.chat_id):
+            COMMAND_MESSAGES.inc("out_of_scope")
+            logger.debug(f"Ignoring /{command} in chat {event.chat_id}: no call there")
+            return None
+
+        if len(self._tasks) >= self.max_tasks:
+            COMMAND_MESSAGES.inc("overloaded")
+            logger.warning(f"Dropping /{command} in chat {event.chat_id}: {len(self._tasks)} commands already running")
+            return None
+
+        COMMAND_MESSAGES.inc("dispatched")
+        task = asyncio.create_task(self._run(command, event))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        COMMAND_TASKS.set(value=len(self._tasks))
+        return task
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        COMMAND_TASKS.set(value=len(self._tasks))
+
+    async def _run(self, command: str, event):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.handlers[command](event), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            COMMAND_MESSAGES.inc("timeout")
+            logger.error(f"/{command} in chat {event.chat_id} timed out after {self.timeout:g}s")
+            try:
+                await event.respond(f"⌛ /{command} took too long and was stopped.")
+            except Exception as e:
+                logger.error(f"Error reporting /{command} timeout: {e}")
+        except Exception as e:
+            COMMAND_MESSAGES.inc("error")
+            logger.error(f"Error running /{command} in chat {event.chat_id}: {e}")
+        finally:
+            COMMAND_SECONDS.observe(command, value=time.perf_counter() - started)
+
+    async def close(self, timeout: float = 5.0):
+        tasks = list(self._tasks)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable, Dict, Optional
+from admission import admission
+from command_router import CommandRouter
+from config import BARGE_IN
+
+logger = logging.getLogger(__name__)
+
+# Set by bind(); the handlers run wherever the VoiceCallHandler lives (the bot
+# process, or a shard worker when commands are proxied by the supervisor)
+voice_handler = None
+
+def bind(handler):
+    global voice_handler
+    voice_handler = handler
+
+async def admitted(event, command: str) -> bool:
+    # Proxied events were already rate limited by the supervisor
+    if getattr(event, "admitted", False):
+        return True
+    
+    wait, notify = admission.check(command, event.chat_id, event.sender_id)
+    if wait <= 0:
+        return True
+    
+    logger.warning(f"Rate limited /{command} from {event.sender_id} in chat {event.chat_id} ({wait:.1f}s)")
+    if notify:
+        await event.respond(f"⏳ Too many commands, please wait {math.ceil(wait)}s.")
+    return False
+
+async def join_call_handler(event):
+    try:
+        logger.info("Received /joincall command")
+        if not await admitted(event, "joincall"):
+            return
+        
+        chat_id = event.chat_id
+        
+        if voice_handler.in_call(chat_id):
+            await event.respond("ℹ️ Already in the voice call in this chat.")
+            return
+        
+        if not voice_handler.can_join():
+            await event.respond("❌ I'm already in the maximum number of voice calls.")
+            return
+        
+        success = await voice_handler.join_call(chat_id)
+        
+        if success:
+            await event.respond("✅ Joined the voice call! I'm ready to listen and respond.")
+        else:
+            await event.respond("❌ Failed to join the voice call. Make sure there's an active voice chat.")
+            
+    except Exception as e:
+        logger.error(f"Error in join_call_handler: {e}")
+        await event.respond(f"❌ Error: {str(e)}")
+
+async def leave_call_handler(event):
+    try:
+        logger.info("Received /leavecall command")
+        if not await admitted(event, "leavecall"):
+            return
+        
+        admission.close_chat(event.chat_id)
+        success = await voice_handler.leave_call(event.chat_id)
+        
+        if success:
+            await event.respond("✅ Left the voice call.")
+        else:
+            await event.respond("❌ Not currently in a voice call.")
+            
+    except Exception as e:
+        logger.error(f"Error in leave_call_handler: {e}")
+        await event.respond(f"❌ Error: {str(e)}")
+
+async def status_handler(event):
+    try:
+        logger.info("Received /callstatus command")
+        if not await admitted(event, "callstatus"):
+            return
+        
+        status = voice_handler.get_status(event.chat_id)
+        
+        status_text = f"""
+📊 **Voice Call Status**
+
+🔊 In Call: {'Yes' if status['in_call'] else 'No'}
+💬 Chat ID: {status['chat_id'] if status['chat_id'] else 'N/A'}
+⏳ Pending Turns: {status['pending_turns']}
+📥 Queued /speak: {admission.queue_depth(event.chat_id)}
+📞 Active Calls: {status['active_calls']}
+🎤 STT Ready: {'Yes' if status['stt_ready'] else 'No'}
+🗂️ TTS Cache: {status['tts_cache']['hits']} hits / {status['tts_cache']['misses']} misses ({status['tts_cache']['hit_ratio']:.0%})
+💾 Reply Cache: {status['response_cache']['hits']} hits / {status['response_cache']['misses']} misses ({status['response_cache']['hit_ratio']:.0%})
+        """
+        
+        await event.respond(status_text)
+        
+    except Exception as e:
+        logger.error(f"Error in status_handler: {e}")
+        await event.respond(f"❌ Error: {str(e)}")
+
+async def speak_handler(event):
+    try:
+        logger.info("Received /speak command")
+        if not await admitted(event, "speak"):
+            return
+        
+        # Everything after the command word, which may carry an @mention
+        parts = event.message.text.split(maxsplit=1)
+        text = parts[1].strip() if len(parts) > 1 else ""
+        
+        if not text:
+            await event.respond("❌ Please provide text to speak. Usage: /speak <text>")
+            return
+        
+        if not voice_handler.in_call(event.chat_id):
+            await event.respond("❌ Not currently in a voice call. Use /joincall first.")
+            return
+        
+        chat_id = event.chat_id
+        if BARGE_IN:
+            await voice_handler.interrupt(chat_id)
+        
+        outcome, job = admission.submit_speak(
+            chat_id, text, lambda text: voice_handler.process_and_speak(chat_id, text)
+        )
+        if outcome == "shed_newest":
+            await event.respond("⏳ Too many messages are waiting to be spoken here. This one was dropped.")
+            return
+        if outcome == "coalesced":
+            await event.respond("🔗 Added to the message waiting to be spoken.")
+            return
+        
+        # Shielded: if this handler is stopped, the queued job still gets spoken
+        result = await asyncio.shield(job.result)
+        
+        if result == "ok":
+            await event.respond("✅ Message spoken in the voice call.")
+        elif result == "superseded":
+            await event.respond("⏭️ Skipped: newer messages replaced this one.")
+        else:
+            await event.respond("❌ Failed to speak in the voice call.")
+            
+    except Exception as e:
+        logger.error(f"Error in speak_handler: {e}")
+        await event.respond(f"❌ Error: {str(e)}")
+
+async def reset_handler(event):
+    try:
+        logger.info("Received /reset command")
+        if not await admitted(event, "reset"):
+            return
+        if voice_handler.reset_conversation(event.chat_id):
+            await event.respond("✅ Conversation history reset.")
+        else:
+            await event.respond("❌ Not currently in a voice call.")
+    except Exception as e:
+        logger.error(f"Error in reset_handler: {e}")
+        await event.respond(f"❌ Error: {str(e)}")
+
+async def language_handler(event):
+    try:
+        logger.info("Received /language command")
+        if not await admitted(event, "language"):
+            return
+        parts = event.message.text.split()
+        if len(parts) < 2:
+            await event.respond("❌ Please provide a language code. Usage: /language <code|auto> [model]")
+            return
+        
+        model = parts[2] if len(parts) > 2 else None
+        if voice_handler.set_transcription(event.chat_id, language=parts[1].lower(), model=model):
+            await event.respond(f"✅ Transcription language set to {parts[1].lower()}" + (f" ({model})" if model else ""))
+        else:
+            await event.respond("❌ Not currently in a voice call.")
+    except Exception as e:
+        logger.error(f"Error in language_handler: {e}")
+        await event.respond(f"❌ Error: {str(e)}")
+
+async def help_handler(event):
+    if not await admitted(event, "help"):
+        return
+    help_text = """
+🤖 **Voice Bot Commands**
+
+/joincall - Join the voice call in current chat
+/leavecall - Leave the voice call in current chat
+/callstatus - Check voice call status
+/speak <text> - Make the bot speak text in voice call
+/reset - Reset conversation history
+/language <code|auto> [model] - Set the transcription language (and Whisper model) for this call
+/help - Show this help message
+
+**Features:**
+🎤 Speech-to-Text (Groq Whisper API)
+🔊 Text-to-Speech (EdgeTTS)
+🤖 AI Responses (OpenAI-compatible)
+    """
+    await event.respond(help_text)
+
+COMMANDS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "joincall": join_call_handler,
+    "leavecall": leave_call_handler,
+    "callstatus": status_handler,
+    "speak": speak_handler,
+    "reset": reset_handler,
+    "language": language_handler,
+    "help": help_handler
+}
+
+def register(
+    client,
+    handlers: Dict[str, Callable[..., Awaitable[None]]] = COMMANDS,
+    is_active: Optional[Callable[[int], bool]] = None
+) -> CommandRouter:
+    from telethon import events
+    router = CommandRouter(handlers, is_active=is_active)
+    client.add_event_handler(router, events.NewMessage())
+    logger.info(f"Available commands: {', '.join('/' + command for command in handlers)}")
+    return router
@@ -12,6 +12,146 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 MODEL_ID = os.getenv("MODEL_ID")
 
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 1500))
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", 200))
+MEMORY_SUMMARIZE = os.getenv("MEMORY_SUMMARIZE", "true").lower() == "true"
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 10))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", 5))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60.0))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5.0))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 30.0))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", 5.0))
+LLM_FALLBACK_ENDPOINTS = [
+    entry.strip() for entry in os.getenv("LLM_FALLBACK_ENDPOINTS", "").split("|") if entry.strip()
+]
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.25))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 2.0))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 3))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30.0))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 1.5))
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "gsk_free")
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", 2))
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", 30.0))
+STT_MODEL = os.getenv("STT_MODEL", "whisper-large-v3")
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en")
+STT_FALLBACK_MODEL = os.getenv("STT_FALLBACK_MODEL", "whisper-large-v3-turbo")
+STT_FALLBACK_QUEUE = int(os.getenv("STT_FALLBACK_QUEUE", 2))
+STT_PARTIALS = os.getenv("STT_PARTIALS", "true").lower() == "true"
+STT_PARTIAL_INTERVAL_MS = int(os.getenv("STT_PARTIAL_INTERVAL_MS", 1000))
+STT_PARTIAL_PAUSE_MS = int(os.getenv("STT_PARTIAL_PAUSE_MS", 200))
+STT_SPECULATIVE_LLM = os.getenv("STT_SPECULATIVE_LLM", "false").lower() == "true"
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.1))
+LOOP_LAG_WARN = float(os.getenv("LOOP_LAG_WARN", 0.25))
 
 HEALTH_CHECK_PORT = int(os.getenv("PORT", 8080))
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", 10.0))
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", 100))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_TURN_SAMPLE_RATE = float(os.getenv("LOG_TURN_SAMPLE_RATE", 1.0))
+
+AUDIO_DIR = os.getenv("AUDIO_DIR", "/dev/shm/voicebot" if os.path.isdir("/dev/shm") else "temp_audio")
+PLAYBACK_SAMPLE_RATE = int(os.getenv("PLAYBACK_SAMPLE_RATE", 48000))
+AUDIO_DSP = os.getenv("AUDIO_DSP", "true").lower() == "true"
+AUDIO_SILENCE_DB = float(os.getenv("AUDIO_SILENCE_DB", -50.0))
+AUDIO_KEEP_LEAD_MS = int(os.getenv("AUDIO_KEEP_LEAD_MS", 20))
+AUDIO_KEEP_TAIL_MS = int(os.getenv("AUDIO_KEEP_TAIL_MS", 150))
+AUDIO_TARGET_DBFS = float(os.getenv("AUDIO_TARGET_DBFS", -20.0))
+AUDIO_PEAK_DBFS = float(os.getenv("AUDIO_PEAK_DBFS", -1.0))
+AUDIO_MAX_GAIN_DB = float(os.getenv("AUDIO_MAX_GAIN_DB", 12.0))
+AUDIO_PCM_CACHE_MAX_BYTES = int(os.getenv("AUDIO_PCM_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "")
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+TTS_PREWARM_PHRASES = [
+    phrase.strip() for phrase in os.getenv(
+        "TTS_PREWARM_PHRASES",
+        "Hello! I'm here and listening."
+    ).split("|") if phrase.strip()
+]
+
+PLAYBACK_MAX_BATCH_SECONDS = float(os.getenv("PLAYBACK_MAX_BATCH_SECONDS", 30.0))
+PLAYBACK_END_MARGIN = float(os.getenv("PLAYBACK_END_MARGIN", 1.0))
+PLAYBACK_APPEND_LEAD = float(os.getenv("PLAYBACK_APPEND_LEAD", 0.3))
+
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+TTS_FIRST_CHUNK_CHARS = int(os.getenv("TTS_FIRST_CHUNK_CHARS", 80))
+TTS_MAX_CHUNK_CHARS = int(os.getenv("TTS_MAX_CHUNK_CHARS", 240))
+TTS_PARALLELISM = int(os.getenv("TTS_PARALLELISM", 3))
+
+TTS_POOL = os.getenv("TTS_POOL", "true").lower() == "true"
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", 6))
+TTS_POOL_MIN_IDLE = int(os.getenv("TTS_POOL_MIN_IDLE", 1))
+TTS_POOL_PING_INTERVAL = float(os.getenv("TTS_POOL_PING_INTERVAL", 20.0))
+TTS_CONN_MAX_AGE = float(os.getenv("TTS_CONN_MAX_AGE", 600.0))
+TTS_CONN_MAX_IDLE = float(os.getenv("TTS_CONN_MAX_IDLE", 120.0))
+TTS_CONNECT_TIMEOUT = float(os.getenv("TTS_CONNECT_TIMEOUT", 5.0))
+TTS_RECEIVE_TIMEOUT = float(os.getenv("TTS_RECEIVE_TIMEOUT", 10.0))
+TTS_CONNECT_RETRIES = int(os.getenv("TTS_CONNECT_RETRIES", 2))
+TTS_RECONNECT_MAX_DELAY = float(os.getenv("TTS_RECONNECT_MAX_DELAY", 60.0))
+TTS_WSS_URL = os.getenv("TTS_WSS_URL", "")
+TTS_VOICES_TTL = float(os.getenv("TTS_VOICES_TTL", 86400.0))
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 900.0))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+RESPONSE_CACHE_INTENTS = [
+    intent.strip() for intent in os.getenv(
+        "RESPONSE_CACHE_INTENTS",
+        "greeting,identity,capabilities,thanks,repeat"
+    ).split(",") if intent.strip()
+]
+
+FILLERS = os.getenv("FILLERS", "true").lower() == "true"
+FILLER_AFTER_MS = int(os.getenv("FILLER_AFTER_MS", 700))
+
+BARGE_IN = os.getenv("BARGE_IN", "true").lower() == "true"
+BARGE_IN_MIN_SPEECH_MS = int(os.getenv("BARGE_IN_MIN_SPEECH_MS", 300))
+BARGE_IN_TIMEOUT = float(os.getenv("BARGE_IN_TIMEOUT", 0.5))
+
+SHARDS = int(os.getenv("SHARDS", 1))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", 64))
+# One session per worker, comma-separated: Telegram drops an auth key used by two connections at once
+SHARD_SESSION_STRINGS = [session.strip() for session in os.getenv("SHARD_SESSION_STRINGS", "").split(",") if session.strip()]
+SHARD_SOCKET_DIR = os.getenv("SHARD_SOCKET_DIR", "/tmp/voicebot-shards")
+SHARD_START_TIMEOUT = float(os.getenv("SHARD_START_TIMEOUT", 120.0))
+SHARD_HEARTBEAT_INTERVAL = float(os.getenv("SHARD_HEARTBEAT_INTERVAL", 5.0))
+SHARD_RESTART_MAX_DELAY = float(os.getenv("SHARD_RESTART_MAX_DELAY", 30.0))
+
+STATE_DB = os.getenv("STATE_DB", "state/sessions.db")
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", 2.0))
+STATE_FLUSH_BATCH = int(os.getenv("STATE_FLUSH_BATCH", 256))
+STATE_MAX_MESSAGES = int(os.getenv("STATE_MAX_MESSAGES", 200))
+STATE_REJOIN = os.getenv("STATE_REJOIN", "true").lower() == "true"
+
+MAX_CALLS = int(os.getenv("MAX_CALLS", 10))
+SESSION_MAX_CONCURRENT_TURNS = int(os.getenv("SESSION_MAX_CONCURRENT_TURNS", 1))
+SESSION_MAX_PENDING_TURNS = int(os.getenv("SESSION_MAX_PENDING_TURNS", 3))
+
+RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", 12))
+RATE_LIMIT_USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", 4))
+RATE_LIMIT_CHAT_PER_MINUTE = float(os.getenv("RATE_LIMIT_CHAT_PER_MINUTE", 30))
+RATE_LIMIT_CHAT_BURST = int(os.getenv("RATE_LIMIT_CHAT_BURST", 8))
+SPEAK_QUEUE_DEPTH = int(os.getenv("SPEAK_QUEUE_DEPTH", 2))
+SPEAK_QUEUE_POLICY = os.getenv("SPEAK_QUEUE_POLICY", "drop_oldest")
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", 8))
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", 180.0))
+COMMAND_MAX_TASKS = int(os.getenv("COMMAND_MAX_TASKS", 256))
+
+CAPTURE_SAMPLE_RATE = int(os.getenv("CAPTURE_SAMPLE_RATE", 48000))
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", 20))
+VAD_ENERGY_THRESHOLD = int(os.getenv("VAD_ENERGY_THRESHOLD", 500))
+VAD_NOISE_RATIO = float(os.getenv("VAD_NOISE_RATIO", 3.0))
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", 0.35))
+VAD_START_MS = int(os.getenv("VAD_START_MS", 60))
+VAD_SILENCE_MS = int(os.getenv("VAD_SILENCE_MS", 600))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", 200))
+VAD_MIN_UTTERANCE_MS = int(os.getenv("VAD_MIN_UTTERANCE_MS", 250))
+VAD_MAX_UTTERANCE_MS = int(os.getenv("VAD_MAX_UTTERANCE_MS", 15000))
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+from config import MEMORY_TOKEN_BUDGET, MEMORY_SUMMARY_MAX_TOKENS
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[str, List[Dict]], Awaitable[Optional[str]]]
+# Called with ("append", message), ("summary", None) or ("reset", None)
+ChangeListener = Callable[[str, Optional[Dict]], None]
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English; close enough to budget prompts
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        summary_max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS,
+        summarizer: Optional[Summarizer] = None
+    ):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+        self.on_change: Optional[ChangeListener] = None
+
+        self.summary = ""
+        self._messages: Deque[Dict] = deque()
+        self._message_tokens: Deque[int] = deque()
+        self._history_tokens = 0
+        self._system_message = {"role": "system", "content": system_prompt}
+        self._system_tokens = estimate_tokens(system_prompt)
+
+        self._evicted: List[Dict] = []
+        self._summary_task: Optional[asyncio.Task] = None
+        self.evicted_total = 0
+        self.summaries = 0
+        self.version = 0
+
+    @property
+    def messages(self) -> List[Dict]:
+        return list(self._messages)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self._system_tokens + self._history_tokens
+
+    def append(self, role: str, content: str):
+        message = {"role": role, "content": content}
+        self.version += 1
+        tokens = estimate_tokens(content)
+        self._messages.append(message)
+        self._message_tokens.append(tokens)
+        self._history_tokens += tokens
+        self._enforce_budget()
+        if self.on_change:
+            self.on_change("append", message)
+
+    def _enforce_budget(self):
+        evicted = False
+        while len(self._messages) > 1 and self.prompt_tokens > self.token_budget:
+            self._evicted.append(self._messages.popleft())
+            self._history_tokens -= self._message_tokens.popleft()
+            self.evicted_total += 1
+            evicted = True
+
+        if evicted:
+            self._schedule_summary()
+
+    def _schedule_summary(self):
+        if self.summarizer is None:
+            self._evicted.clear()
+            return
+        if self._summary_task is None or self._summary_task.done():
+            self._summary_task = asyncio.create_task(self._fold_evicted())
+
+    async def _fold_evicted(self):
+        while self._evicted:
+            batch, self._evicted = self._evicted, []
+            try:
+                summary = await self.summarizer(self.summary, batch)
+            except Exception as e:
+                logger.error(f"Error summarizing conversation: {e}")
+                summary = None
+
+            if summary:
+                self._set_summary(summary)
+                self.summaries += 1
+                if self.on_change:
+                    self.on_change("summary", None)
+
+    def _set_summary(self, summary: str):
+        max_chars = self.summary_max_tokens * 4
+        summary = summary.strip()[:max_chars]
+
+        self.summary = summary
+        content = self.system_prompt
+        if summary:
+            content += f"\n\nSummary of the earlier conversation: {summary}"
+        self._system_message = {"role": "system", "content": content}
+        self._system_tokens = estimate_tokens(content)
+        self._enforce_budget()
+
+    def build_prompt(self) -> List[Dict]:
+        return [self._system_message, *self._messages]
+
+    def reset(self):
+        if self._summary_task and not self._summary_task.done():
+            self._summary_task.cancel()
+        self._summary_task = None
+        self.version += 1
+        self._messages.clear()
+        self._message_tokens.clear()
+        self._history_tokens = 0
+        self._evicted.clear()
+        self._set_summary("")
+        if self.on_change:
+            self.on_change("reset", None)
+
+    def restore(self, summary: str, messages: List[Dict]):
+        # Saved state from before a restart. Whatever no longer fits the budget is dropped
+        # rather than summarized again, since older turns are already in the summary.
+        self.version += 1
+        self._set_summary(summary or "")
+        for message in messages:
+            tokens = estimate_tokens(message["content"])
+            self._messages.append(message)
+            self._message_tokens.append(tokens)
+            self._history_tokens += tokens
+        while len(self._messages) > 1 and self.prompt_tokens > self.token_budget:
+            self._messages.popleft()
+            self._history_tokens -= self._message_tokens.popleft()
+
+    def stats(self) -> dict:
+        return {
+            "messages": len(self._messages),
+            "prompt_tokens": self.prompt_tokens,
+            "token_budget": self.token_budget,
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            "evicted": self.evicted_total,
+            "summaries": self.summaries
+        }
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from metrics import registry
+from tts_handler import TTSHandler
+
+logger = logging.getLogger(__name__)
+
+FILLER_PHRASES = {
+    "thinking": ["Hmm, let me think.", "Good question.", "Let me see."],
+    "ack": ["Sure.", "Okay.", "Alright."]
+}
+
+QUESTION_WORDS = {
+    "what", "why", "how", "when", "where", "who", "which", "whose",
+    "can", "could", "would", "should", "is", "are", "do", "does", "did", "will"
+}
+
+FILLERS_PLAYED = registry.counter(
+    "voicebot_fillers_total", "Acknowledgement fillers played while waiting for a reply", ("kind",)
+)
+
+Renderer = Callable[[TTSHandler, str], Awaitable[Optional[bytes]]]
+
+
+def filler_kind(text: str) -> Optional[str]:
+    words = text.strip().lower().split()
+    # Greetings and one-word turns get quick replies; a filler would only talk over them
+    if len(words) <= 2:
+        return None
+    if text.strip().endswith("?") or words[0].strip(",") in QUESTION_WORDS:
+        return "thinking"
+    return "ack"
+
+
+class FillerBank:
+    # Short acknowledgements rendered to call PCM once per voice and kept in memory,
+    # so playing one costs no network round trip
+    def __init__(self, render: Renderer, phrases: Dict[str, List[str]] = FILLER_PHRASES):
+        self.render = render
+        self.phrases = phrases
+        self._audio: Dict[str, Dict[str, List[Tuple[str, bytes]]]] = {}
+        self._building: Set[str] = set()
+        self._last: Dict[str, str] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def build(self, tts_handler: TTSHandler):
+        voice = tts_handler.voice
+        if voice in self._audio or voice in self._building:
+            return
+
+        self._building.add(voice)
+        try:
+            bank: Dict[str, List[Tuple[str, bytes]]] = {}
+            for kind, phrases in self.phrases.items():
+                rendered = await asyncio.gather(*(self.render(tts_handler, phrase) for phrase in phrases))
+                bank[kind] = [(phrase, pcm) for phrase, pcm in zip(phrases, rendered) if pcm]
+            self._audio[voice] = bank
+            logger.info(f"Filler bank ready for {voice}: {sum(len(items) for items in bank.values())} clips")
+        except Exception as e:
+            logger.error(f"Error building filler bank for {voice}: {e}")
+        finally:
+            self._building.discard(voice)
+
+    def ensure(self, tts_handler: TTSHandler):
+        if tts_handler.voice in self._audio or tts_handler.voice in self._building:
+            return
+        # Build a copy so a later set_voice on the session does not change the bank's voice
+        handler = TTSHandler()
+        handler.voice, handler.rate, handler.volume = tts_handler.voice, tts_handler.rate, tts_handler.volume
+        task = asyncio.create_task(self.build(handler))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def pick(self, voice: str, text: str) -> Optional[Tuple[str, str, bytes]]:
+        kind = filler_kind(text)
+        clips = self._audio.get(voice, {}).get(kind) if kind else None
+        if not clips:
+            return None
+
+        # Avoid saying the same filler twice in a row
+        choices = [clip for clip in clips if clip[0] != self._last.get(voice)] or clips
+        phrase, pcm = random.choice(choices)
+        self._last[voice] = phrase
+        return kind, phrase, pcm
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
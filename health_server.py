@@ -1,21 +1,56 @@
 import asyncio
 import logging
+from typing import Callable, Optional
 from aiohttp import web
+from metrics import registry
+from tracing import recent_traces
 from config import HEALTH_CHECK_PORT
 
 logger = logging.getLogger(__name__)
 
 class HealthCheckServer:
-    def __init__(self):
+    def __init__(self, readiness: Optional[Callable[[], dict]] = None):
+        self.readiness = readiness
         self.app = web.Application()
-        self.app.router.add_get('/', self.health_check)
-        self.app.router.add_get('/health', self.health_check)
+        self.app.router.add_get('/', self.liveness)
+        # /health stays a liveness probe for the platform (render.yaml); an upstream
+        # outage or a slow start must not get a process that is in calls restarted
+        self.app.router.add_get('/health', self.liveness)
+        self.app.router.add_get('/ready', self.ready_check)
+        self.app.router.add_get('/metrics', self.metrics)
+        self.app.router.add_get('/traces', self.traces)
         self.runner = None
         self.site = None
     
-    async def health_check(self, request):
+    async def liveness(self, request):
         return web.Response(text='OK', status=200)
     
+    async def ready_check(self, request):
+        if self.readiness is None:
+            return web.json_response({"ready": False, "checks": {}}, status=503)
+        
+        try:
+            report = self.readiness()
+        except Exception as e:
+            logger.error(f"Error checking readiness: {e}")
+            return web.json_response({"ready": False, "error": str(e)}, status=503)
+        
+        return web.json_response(report, status=200 if report.get("ready") else 503)
+    
+    async def metrics(self, request):
+        return web.Response(
+            text=registry.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+    
+    async def traces(self, request):
+        try:
+            limit = int(request.query.get('limit', 20))
+        except ValueError:
+            limit = 20
+        traces = list(recent_traces)[-limit:] if limit > 0 else []
+        return web.json_response([trace.to_dict() for trace in reversed(traces)])
+    
     async def start(self):
         try:
             self.runner = web.AppRunner(self.app)
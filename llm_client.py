@@ -0,0 +1,355 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import httpx
+from metrics import registry
+from tracing import current_trace
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, MODEL_ID, LLM_FALLBACK_ENDPOINTS,
+    LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_KEEPALIVE_EXPIRY,
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_POOL_TIMEOUT,
+    LLM_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET, LLM_HEDGE_AFTER
+)
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+LLM_REQUESTS = registry.counter(
+    "voicebot_llm_requests_total", "LLM requests by endpoint and outcome", ("endpoint", "outcome")
+)
+LLM_SERVED = registry.counter(
+    "voicebot_llm_served_total", "LLM replies by the endpoint that served them", ("endpoint",)
+)
+LLM_RETRIES_TOTAL = registry.counter(
+    "voicebot_llm_retries_total", "LLM requests retried after a retryable failure"
+)
+LLM_HEDGES = registry.counter(
+    "voicebot_llm_hedges_total", "Hedged LLM requests, by whether the hedge won", ("won",)
+)
+LLM_BREAKER_OPEN = registry.gauge(
+    "voicebot_llm_breaker_open", "1 while an endpoint's circuit breaker is open", ("endpoint",)
+)
+
+
+class LLMStatusError(Exception):
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"{status_code} - {body}")
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRYABLE_STATUS
+
+
+class LLMUnavailableError(Exception):
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, LLMStatusError):
+        return error.retryable
+    return isinstance(error, (httpx.TransportError, httpx.TimeoutException, json.JSONDecodeError))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `reset_timeout` one
+    # trial request is let through (half-open) and its outcome closes or re-opens it
+    def __init__(self, name: str, threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        state = self.state
+        if state == "half_open":
+            # A trial whose outcome was never reported (e.g. a cancelled hedge) expires
+            return self._trial_at is None or time.monotonic() - self._trial_at >= self.reset_timeout
+        return state == "closed"
+
+    def begin(self):
+        if self.state == "half_open":
+            self._trial_at = time.monotonic()
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"LLM endpoint {self.name} recovered, closing circuit")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+        LLM_BREAKER_OPEN.set(self.name, value=0)
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_at = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"LLM endpoint {self.name} failed {self.failures} times, opening circuit")
+            self.opened_at = time.monotonic()
+            LLM_BREAKER_OPEN.set(self.name, value=1)
+
+
+class Endpoint:
+    def __init__(self, name: str, url: str, model: str, api_key: Optional[str] = None):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.breaker = CircuitBreaker(name)
+
+    def headers(self) -> Dict:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def payload(self, payload: Dict) -> Dict:
+        return {**payload, "model": self.model}
+
+
+def endpoints_from_config() -> List[Endpoint]:
+    # Primary from OPENAI_*; fallbacks as "url;model[;API_KEY_ENV]" entries
+    endpoints = [Endpoint("primary", OPENAI_BASE_URL, MODEL_ID, OPENAI_API_KEY)]
+    for i, entry in enumerate(LLM_FALLBACK_ENDPOINTS, start=1):
+        parts = [part.strip() for part in entry.split(";")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            logger.error(f"Ignoring malformed LLM_FALLBACK_ENDPOINTS entry: {entry}")
+            continue
+        api_key = os.getenv(parts[2]) if len(parts) > 2 and parts[2] else OPENAI_API_KEY
+        endpoints.append(Endpoint(f"fallback{i}", parts[0], parts[1], api_key))
+    return endpoints
+
+
+class _OpenStream:
+    # A streamed completion that has already produced its first token
+    def __init__(self, endpoint: Endpoint, context, response: httpx.Response):
+        self.endpoint = endpoint
+        self.first: Optional[str] = None
+        self._context = context
+        self._lines = response.aiter_lines()
+
+    async def next_delta(self) -> Optional[str]:
+        async for line in self._lines:
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return None
+
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                return delta
+        return None
+
+    async def aclose(self):
+        await self._context.__aexit__(None, None, None)
+
+
+class LLMClient:
+    # One connection pool per process, shared by every call session. Requests go to
+    # the first endpoint whose circuit is closed, retry with jittered exponential
+    # backoff on retryable errors, and are hedged to the next endpoint when the first
+    # token (or, without streaming, the whole reply) takes longer than `hedge_after`.
+    def __init__(
+        self,
+        retries: int = LLM_RETRIES,
+        base_delay: float = LLM_RETRY_BASE_DELAY,
+        max_delay: float = LLM_RETRY_MAX_DELAY,
+        hedge_after: float = LLM_HEDGE_AFTER
+    ):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self.endpoints = endpoints_from_config()
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            http2 = _http2_available()
+            self._http = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(
+                    connect=LLM_CONNECT_TIMEOUT,
+                    read=LLM_READ_TIMEOUT,
+                    write=LLM_READ_TIMEOUT,
+                    pool=LLM_POOL_TIMEOUT
+                ),
+                headers={"Content-Type": "application/json"}
+            )
+            logger.info(f"LLM HTTP client created (http2={http2})")
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            try:
+                await self._http.aclose()
+            except Exception as e:
+                logger.error(f"Error closing LLM HTTP client: {e}")
+            self._http = None
+
+    def is_healthy(self, endpoints: Optional[List[Endpoint]] = None) -> bool:
+        return any(endpoint.breaker.state != "open" for endpoint in endpoints or self.endpoints)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from many calls from arriving in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _failed(self, endpoint: Endpoint, error: BaseException):
+        if is_retryable(error):
+            endpoint.breaker.record_failure()
+        outcome = str(error.status_code) if isinstance(error, LLMStatusError) else type(error).__name__
+        LLM_REQUESTS.inc(endpoint.name, outcome)
+        logger.warning(f"LLM request to {endpoint.name} failed: {error}")
+
+    def _served(self, endpoint: Endpoint):
+        endpoint.breaker.record_success()
+        LLM_REQUESTS.inc(endpoint.name, "ok")
+        LLM_SERVED.inc(endpoint.name)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.tags["llm_endpoint"] = endpoint.name
+
+    async def _post(self, endpoint: Endpoint, payload: Dict) -> Dict:
+        response = await self.http().post(endpoint.url, json=endpoint.payload(payload), headers=endpoint.headers())
+        if response.status_code != 200:
+            raise LLMStatusError(response.status_code, response.text)
+        return response.json()
+
+    async def _open(self, endpoint: Endpoint, payload: Dict) -> _OpenStream:
+        context = self.http().stream("POST", endpoint.url, json=endpoint.payload(payload), headers=endpoint.headers())
+        response = await context.__aenter__()
+        try:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise LLMStatusError(response.status_code, body.decode(errors="replace"))
+            stream = _OpenStream(endpoint, context, response)
+            stream.first = await stream.next_delta()
+            return stream
+        except BaseException:
+            await context.__aexit__(None, None, None)
+            raise
+
+    async def _race(self, candidates: List[Endpoint], start: Callable[[Endpoint], Awaitable], hedge: bool):
+        # Runs the request on candidates[0]; if it has not finished within hedge_after,
+        # starts the same request on candidates[1] and keeps whichever succeeds first
+        candidates[0].breaker.begin()
+        tasks: Dict[asyncio.Task, Endpoint] = {asyncio.create_task(start(candidates[0])): candidates[0]}
+        can_hedge = hedge and self.hedge_after > 0 and len(candidates) > 1
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                timeout = self.hedge_after if can_hedge and not hedged else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    candidates[1].breaker.begin()
+                    logger.info(f"LLM endpoint {candidates[0].name} slow, hedging to {candidates[1].name}")
+                    tasks[asyncio.create_task(start(candidates[1]))] = candidates[1]
+                    continue
+
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self._failed(endpoint, e)
+                        error = e
+                        continue
+                    if hedged:
+                        LLM_HEDGES.inc("true" if endpoint is not candidates[0] else "false")
+                    return endpoint, result
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(self._discard_loser)
+
+    @staticmethod
+    def _discard_loser(task: asyncio.Task):
+        # A losing hedge that already opened a stream still holds a connection
+        if not task.cancelled() and task.exception() is None and isinstance(task.result(), _OpenStream):
+            asyncio.create_task(task.result().aclose())
+
+    async def _with_retries(self, endpoints: List[Endpoint], start: Callable[[Endpoint], Awaitable], hedge: bool):
+        error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            candidates = [endpoint for endpoint in endpoints if endpoint.breaker.available()]
+            if not candidates:
+                raise LLMUnavailableError("All LLM endpoints are unavailable (circuit open)")
+
+            # Move on to the next endpoint on every retry
+            shift = attempt % len(candidates)
+            candidates = candidates[shift:] + candidates[:shift]
+            try:
+                return await self._race(candidates, start, hedge)
+            except Exception as e:
+                error = e
+                if not is_retryable(e) or attempt == self.retries:
+                    raise
+            LLM_RETRIES_TOTAL.inc()
+            await asyncio.sleep(self._backoff(attempt))
+        raise error
+
+    async def complete(self, payload: Dict, endpoints: Optional[List[Endpoint]] = None, hedge: bool = True) -> Dict:
+        endpoint, data = await self._with_retries(
+            endpoints or self.endpoints, lambda endpoint: self._post(endpoint, payload), hedge
+        )
+        self._served(endpoint)
+        return data
+
+    async def stream(self, payload: Dict, endpoints: Optional[List[Endpoint]] = None) -> AsyncIterator[str]:
+        # Retries and hedging only cover the wait for the first token; once text has
+        # been yielded a failure is passed on to the caller
+        endpoint, stream = await self._with_retries(
+            endpoints or self.endpoints, lambda endpoint: self._open(endpoint, {**payload, "stream": True}), True
+        )
+        self._served(endpoint)
+        try:
+            delta = stream.first
+            while delta is not None:
+                yield delta
+                delta = await stream.next_delta()
+        except Exception as e:
+            self._failed(endpoint, e)
+            raise
+        finally:
+            await stream.aclose()
+
+
+llm_client = LLMClient()
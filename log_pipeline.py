@@ -0,0 +1,133 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from typing import Optional
+from metrics import registry
+from tracing import current_trace
+from config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_TURN_SAMPLE_RATE
+
+# Pass as extra= on verbose per-turn lines (transcripts, replies, TTS text) so they can be sampled
+TURN_DETAIL = {"turn_detail": True}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+LOG_RECORDS_DROPPED = registry.counter(
+    "voicebot_log_records_dropped_total", "Log records dropped, by reason", ("reason",)
+)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _sampled(turn_id: int, rate: float) -> bool:
+    # Decided per turn, so a sampled turn keeps all of its lines
+    return (turn_id * 2654435761) % 2 ** 32 < rate * 2 ** 32
+
+
+class TurnContextFilter(logging.Filter):
+    # Runs in the caller before the record is queued, while the turn's context is visible
+    def __init__(self, sample_rate: float = LOG_TURN_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace.get()
+        record.chat_id = trace.chat_id if trace else None
+        record.turn_id = trace.turn_id if trace else None
+
+        if getattr(record, "turn_detail", False) and self.sample_rate < 1.0:
+            keep = _sampled(trace.turn_id, self.sample_rate) if trace else random.random() < self.sample_rate
+            if not keep:
+                LOG_RECORDS_DROPPED.inc("sampled")
+                return False
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    # Never waits on the listener: when the queue is full the record is dropped and counted
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc("queue_full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, since args may change after the call returns;
+        # formatting and the write happen on the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, worker: Optional[str] = None):
+        super().__init__()
+        self.worker = worker
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if self.worker:
+            entry["worker"] = self.worker
+        if getattr(record, "chat_id", None) is not None:
+            entry["chat_id"] = record.chat_id
+        if getattr(record, "turn_id", None) is not None:
+            entry["turn_id"] = record.turn_id
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(
+    worker: Optional[str] = None,
+    stream=None,
+    log_format: str = LOG_FORMAT,
+    sample_rate: float = LOG_TURN_SAMPLE_RATE
+) -> logging.handlers.QueueListener:
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter(worker))
+    elif worker:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT.replace("%(name)s", f"{worker} - %(name)s")))
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(TurnContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    # Flushes what is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
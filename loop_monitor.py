@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+from metrics import registry
+from config import LOOP_LAG_INTERVAL, LOOP_LAG_WARN
+
+logger = logging.getLogger(__name__)
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, warn_threshold: float = LOOP_LAG_WARN):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._windows: Dict[int, float] = {}
+        self._next_window = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Event loop lag monitor started (interval={self.interval * 1000:.0f}ms)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def begin_window(self) -> int:
+        window_id = self._next_window
+        self._next_window += 1
+        self._windows[window_id] = 0.0
+        return window_id
+
+    def end_window(self, window_id: int) -> float:
+        return self._windows.pop(window_id, 0.0)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            for window_id, peak in self._windows.items():
+                if lag > peak:
+                    self._windows[window_id] = lag
+
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+
+loop_monitor = LoopLagMonitor()
+
+registry.gauge(
+    "voicebot_event_loop_lag_seconds", "Most recent event loop lag sample in seconds",
+    callback=lambda: loop_monitor.last_lag
+)
+registry.gauge(
+    "voicebot_event_loop_lag_max_seconds", "Largest event loop lag seen since start in seconds",
+    callback=lambda: loop_monitor.max_lag
+)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Callable, List, Optional
+from log_pipeline import TURN_DETAIL
+from stt_handler import STTHandler
+from tracing import record
+from config import STT_LANGUAGE
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w']+")
+
+
+def _normalize(word: str) -> str:
+    return _PUNCTUATION.sub("", word.lower())
+
+
+def same_words(a: str, b: str) -> bool:
+    return [_normalize(word) for word in a.split()] == [_normalize(word) for word in b.split()]
+
+
+class PartialTranscriber:
+    # Transcribes one utterance while it is still being spoken. Every partial request
+    # covers the utterance so far, so successive windows overlap; words that two
+    # consecutive hypotheses agree on become the stable prefix, and a pause hypothesis
+    # only starts a speculative reply when it keeps that prefix. The request started at
+    # a pause is reused as the final transcript when no speech followed it.
+    def __init__(
+        self,
+        stt_handler: STTHandler,
+        model: Optional[str] = None,
+        language: Optional[str] = STT_LANGUAGE,
+        on_pause_hypothesis: Optional[Callable[[str], None]] = None
+    ):
+        self.stt_handler = stt_handler
+        self.model = model
+        self.language = language
+        self.on_pause_hypothesis = on_pause_hypothesis
+
+        self.stable = ""
+        self._stable_words = 0
+        self._previous: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._task_frames = 0
+
+        self.requests = 0
+        self.skipped = 0
+        self.reused = False
+
+    def push(self, wav: bytes, speech_frames: int, pause: bool):
+        if self._task and not self._task.done():
+            if not pause:
+                self.skipped += 1
+                return
+            # The pause request covers more speech than the one in flight
+            self._task.cancel()
+
+        # Partials are extra requests; leave the slots to final transcripts under load
+        if self.stt_handler.is_loaded():
+            self.skipped += 1
+            return
+
+        self._task_frames = speech_frames
+        self._task = asyncio.create_task(self._request(wav, pause))
+        self.requests += 1
+
+    async def _request(self, wav: bytes, pause: bool) -> Optional[str]:
+        text = await self.stt_handler.transcribe_bytes(
+            wav, "partial.wav", model=self.model, language=self.language, partial=True
+        )
+        if not text:
+            return None
+
+        extends = self._stabilize(text)
+        if pause and self.on_pause_hypothesis:
+            if extends:
+                self.on_pause_hypothesis(text)
+            else:
+                logger.debug(f"Not speculating: pause hypothesis revised the stable prefix '{self.stable}'")
+        return text
+
+    def _stabilize(self, text: str) -> bool:
+        # Returns whether the hypothesis keeps every word of the stable prefix so far;
+        # the prefix then becomes what it and the previous hypothesis agree on
+        words = text.split()
+        agreed = 0
+        for previous, current in zip(self._previous, words):
+            if _normalize(previous) != _normalize(current):
+                break
+            agreed += 1
+
+        extends = agreed >= self._stable_words
+        if not extends:
+            logger.debug(f"Stable partial revised: {self.stable}")
+        self._stable_words = agreed
+        self.stable = " ".join(words[:agreed])
+        self._previous = words
+        return extends
+
+    async def final(self, wav: bytes, speech_frames: int) -> Optional[str]:
+        task = self._task
+        if task is not None and self._task_frames == speech_frames:
+            started = time.perf_counter()
+            try:
+                text = await task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                text = None
+
+            if text:
+                self.reused = True
+                record("stt", started)
+                logger.info(f"Transcription (from partial): {text}", extra=TURN_DETAIL)
+                return text
+        elif task is not None:
+            task.cancel()
+
+        return await self.stt_handler.transcribe_bytes(wav, model=self.model, language=self.language)
+
+    def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
@@ -0,0 +1,274 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+from pytgcalls import PyTgCalls
+from log_pipeline import TURN_DETAIL
+from audio_pipeline import pcm_duration, raw_stream, write_pcm
+from tracing import current_trace, span
+from config import PLAYBACK_MAX_BATCH_SECONDS, PLAYBACK_END_MARGIN, PLAYBACK_APPEND_LEAD
+
+logger = logging.getLogger(__name__)
+
+_item_ids = itertools.count(1)
+
+
+class PlaybackItem:
+    def __init__(self, pcm: bytes, label: str = ""):
+        self.item_id = next(_item_ids)
+        self.pcm = pcm
+        self.label = label
+        self.duration = pcm_duration(pcm)
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.ended_at: Optional[float] = None
+        self.cancelled = False
+        self.trace = current_trace.get()
+        self._done = asyncio.get_running_loop().create_future()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.done()
+
+    @property
+    def played(self) -> bool:
+        return self._done.done() and self._done.result()
+
+    async def wait(self) -> bool:
+        return await asyncio.shield(self._done)
+
+    def _finish(self, played: bool):
+        if not self._done.done():
+            self._done.set_result(played)
+
+
+class PlaybackScheduler:
+    # Per-call audio queue. Items that are ready together are joined into one raw
+    # stream, and items queued while it plays are appended to the file being read, so
+    # a streamed reply plays back to back without a gap; on_stream_end drives the queue.
+    def __init__(self, pytgcalls: PyTgCalls, chat_id: int, audio_dir: str, silence_file: str):
+        self.pytgcalls = pytgcalls
+        self.chat_id = chat_id
+        self.audio_dir = audio_dir
+        self.silence_file = silence_file
+
+        self._queue: Deque[PlaybackItem] = deque()
+        self._playing: List[Tuple[PlaybackItem, float]] = []
+        self._appended: Set[int] = set()
+        self._audio_file: Optional[str] = None
+        self._batch_total = 0.0
+        self._batch_started: Optional[float] = None
+        self._has_items = asyncio.Event()
+        self._stream_ended = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.items_played = 0
+        self.items_cancelled = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        self.cancel_all()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def is_playing(self) -> bool:
+        return bool(self._playing)
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, pcm: bytes, label: str = "", interrupt: bool = False) -> PlaybackItem:
+        if interrupt:
+            self.cancel_all()
+
+        item = PlaybackItem(pcm, label)
+        self._queue.append(item)
+        self._has_items.set()
+        if self._playing:
+            # Lets the playing batch take it on before its stream runs out
+            self._changed.set()
+        return item
+
+    def cancel(self, item: PlaybackItem):
+        if item.finished or item.cancelled:
+            return
+
+        item.cancelled = True
+        self.items_cancelled += 1
+        if item in self._queue:
+            self._queue.remove(item)
+            item._finish(False)
+        else:
+            self._changed.set()
+
+    def cancel_all(self):
+        for item in list(self._queue):
+            self.cancel(item)
+        for item, _ in self._playing:
+            self.cancel(item)
+
+    def on_stream_end(self):
+        self._stream_ended.set()
+
+    def _take_batch(self) -> List[PlaybackItem]:
+        batch = []
+        total = 0.0
+        while self._queue and (not batch or total + self._queue[0].duration <= PLAYBACK_MAX_BATCH_SECONDS):
+            item = self._queue.popleft()
+            batch.append(item)
+            total += item.duration
+        return batch
+
+    async def _run(self):
+        while True:
+            while not self._queue:
+                self._has_items.clear()
+                await self._has_items.wait()
+
+            batch = self._take_batch()
+            try:
+                await self._play_batch(batch)
+            except Exception as e:
+                logger.error(f"[{self.chat_id}] Playback error: {e}")
+                for item in batch:
+                    item._finish(False)
+            finally:
+                self._playing = []
+                self._appended = set()
+                self._audio_file = None
+                self._batch_started = None
+
+    def _cut_time(self) -> Optional[float]:
+        for item, offset in self._playing:
+            if item.cancelled:
+                return self._batch_started + offset
+        return None
+
+    async def _play_batch(self, batch: List[PlaybackItem]):
+        offsets = []
+        total = 0.0
+        for item in batch:
+            offsets.append(total)
+            total += item.duration
+
+        audio_file = os.path.join(self.audio_dir, f"playback_{time.time_ns()}.raw")
+        write_pcm(audio_file, b"".join(item.pcm for item in batch))
+
+        try:
+            self._changed.clear()
+            self._playing = list(zip(batch, offsets))
+            self._audio_file = audio_file
+            self._batch_total = total
+
+            with span("playback_start", trace=batch[0].trace):
+                await self.pytgcalls.change_stream(self.chat_id, raw_stream(audio_file))
+            # Cleared only now: the previous stream's end can arrive while this one starts
+            self._stream_ended.clear()
+            self._batch_started = time.time()
+            audible_at = time.perf_counter()
+            for item, offset in self._playing:
+                item.started_at = self._batch_started + offset
+                if item.trace is not None:
+                    item.trace.mark_first_audio(audible_at + offset)
+            logger.info(f"[{self.chat_id}] Playing {len(batch)} item(s), {total:.1f}s", extra=TURN_DETAIL)
+
+            natural_end = await self._wait_batch()
+            now = time.time()
+
+            if not natural_end:
+                await self.pytgcalls.change_stream(self.chat_id, raw_stream(self.silence_file))
+
+            requeue = []
+            for item, offset in self._playing:
+                start = self._batch_started + offset
+                end = start + item.duration
+                if item.cancelled:
+                    item.ended_at = min(now, end) if start <= now else None
+                    item._finish(False)
+                elif natural_end and item.item_id in self._appended and end > now + PLAYBACK_APPEND_LEAD:
+                    # The stream ran out before this append reached it; play it next
+                    item.started_at = None
+                    requeue.append(item)
+                elif natural_end or end <= now:
+                    item.ended_at = now if natural_end and item is self._playing[-1][0] else end
+                    self.items_played += 1
+                    item._finish(True)
+                else:
+                    item.started_at = None
+                    requeue.append(item)
+
+            for item in reversed(requeue):
+                self._queue.appendleft(item)
+        finally:
+            try:
+                os.remove(audio_file)
+            except OSError:
+                pass
+
+    def _extend(self):
+        # Appends queued items to the file the call is reading, while enough of it is
+        # left that the reader has not reached the end yet
+        if self._cut_time() is not None:
+            return
+        while self._queue:
+            item = self._queue[0]
+            remaining = self._batch_started + self._batch_total - time.time()
+            if remaining < PLAYBACK_APPEND_LEAD or self._batch_total + item.duration > PLAYBACK_MAX_BATCH_SECONDS:
+                return
+            write_pcm(self._audio_file, item.pcm, append=True)
+            self._queue.popleft()
+
+            offset = self._batch_total
+            self._playing.append((item, offset))
+            self._appended.add(item.item_id)
+            self._batch_total += item.duration
+            item.started_at = self._batch_started + offset
+            if item.trace is not None:
+                item.trace.mark_first_audio(time.perf_counter() + remaining)
+            logger.info(f"[{self.chat_id}] Appended 1 item, {item.duration:.1f}s", extra=TURN_DETAIL)
+
+    async def _wait_batch(self) -> bool:
+        while True:
+            self._extend()
+            # With more audio waiting, switch as soon as the stream should be done
+            # rather than after the end event
+            stream_end = self._batch_started + self._batch_total + (0.0 if self._queue else PLAYBACK_END_MARGIN)
+            cut_at = self._cut_time()
+            deadline = min(cut_at, stream_end) if cut_at is not None else stream_end
+            timeout = max(0.0, deadline - time.time())
+
+            self._changed.clear()
+            ended_waiter = asyncio.create_task(self._stream_ended.wait())
+            changed_waiter = asyncio.create_task(self._changed.wait())
+            try:
+                await asyncio.wait({ended_waiter, changed_waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                ended_waiter.cancel()
+                changed_waiter.cancel()
+
+            if self._stream_ended.is_set():
+                return True
+            cut_at = self._cut_time()
+            if cut_at is not None and time.time() >= cut_at:
+                return False
+            if time.time() >= stream_end:
+                return True
+
+    def get_status(self) -> dict:
+        return {
+            "playing": self.is_playing,
+            "queued": self.queued,
+            "items_played": self.items_played,
+            "items_cancelled": self.items_cancelled
+        }
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from metrics import registry
+from config import RESPONSE_CACHE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_INTENTS
+
+logger = logging.getLogger(__name__)
+
+# Only questions whose answer does not depend on what was said before (or, for
+# "repeat", only on the previous reply) are worth caching
+INTENT_PATTERNS = {
+    "greeting": re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening))( there| everyone| bot)?$"),
+    "identity": re.compile(r"^(who are you|what are you|what is your name|are you (a bot|an ai|a robot|human|real))$"),
+    "capabilities": re.compile(r"^(what can you do|how can you help( me| us)?|what do you do)$"),
+    "thanks": re.compile(r"^(thanks|thank you)( so much| very much| a lot)?$"),
+    "repeat": re.compile(r"^((can you |could you )?(repeat that|say that again)|what did you say|come again|pardon)$")
+}
+TURN_SCOPED_INTENTS = {"repeat"}
+
+_CONTRACTIONS = {"what's": "what is", "who's": "who is", "you're": "you are", "whats": "what is"}
+_LEADING = re.compile(r"^((um|uh|so|okay|ok|well|hey bot|bot)\s+)+")
+_TRAILING = re.compile(r"(\s+(please|then|again please))+$")
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+
+CACHE_LOOKUPS = registry.counter(
+    "voicebot_response_cache_lookups_total", "Response cache lookups by result", ("result",)
+)
+
+
+def normalize(text: str) -> str:
+    text = _PUNCTUATION.sub(" ", text.lower())
+    words = [_CONTRACTIONS.get(word, word) for word in text.split()]
+    text = " ".join(words)
+    text = _LEADING.sub("", text)
+    return _TRAILING.sub("", text).strip()
+
+
+def intent_of(text: str) -> Optional[str]:
+    return _match_intent(normalize(text))
+
+
+def _match_intent(normalized: str) -> Optional[str]:
+    for intent, pattern in INTENT_PATTERNS.items():
+        if pattern.match(normalized):
+            return intent
+    return None
+
+
+class CachedResponse:
+    def __init__(self, intent: str, text: str):
+        self.intent = intent
+        self.text = text
+        self.created_at = time.monotonic()
+        self.audio: Dict[str, bytes] = {}
+        self.hits = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode("utf-8")) + sum(len(pcm) for pcm in self.audio.values())
+
+
+class ResponseCache:
+    # TTL + byte-bounded LRU of LLM replies to allow-listed intents, keyed by intent
+    # and a hash of the normalized question and the context the answer depends on.
+    # Intents only decide what is cacheable; "good morning" and "good evening" are
+    # different entries. Entries can carry the decoded
+    # call audio per voice, so a hit skips the LLM, TTS and decoding.
+    def __init__(
+        self,
+        enabled: bool = RESPONSE_CACHE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        intents=RESPONSE_CACHE_INTENTS
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.intents = set(intents)
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str, context: str, last_reply: str = "") -> Optional[str]:
+        if not self.enabled:
+            return None
+        normalized = normalize(text)
+        intent = _match_intent(normalized)
+        if intent is None or intent not in self.intents:
+            return None
+
+        scope = last_reply if intent in TURN_SCOPED_INTENTS else ""
+        raw = "\x1f".join((intent, normalized, context, scope))
+        return f"{intent}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def peek(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created_at > self.ttl:
+            self._remove(key)
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.peek(key)
+        if entry is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc("miss")
+            return None
+
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        CACHE_LOOKUPS.inc("hit")
+        return entry
+
+    def put(self, key: str, text: str):
+        intent = key.split(":", 1)[0]
+        self._remove(key)
+        entry = CachedResponse(intent, text)
+        self._entries[key] = entry
+        self.size += entry.size
+        self._evict()
+
+    def attach_audio(self, key: str, voice: str, text: str, pcm: bytes):
+        # Only audio that speaks exactly the cached text is kept
+        entry = self.peek(key)
+        if entry is None or entry.text.split() != text.split() or voice in entry.audio:
+            return
+        entry.audio[voice] = pcm
+        self.size += len(pcm)
+        self._evict()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio()
+        }
+
+
+response_cache = ResponseCache()
+
+registry.gauge(
+    "voicebot_response_cache_hit_ratio", "Share of cacheable questions answered from the response cache",
+    callback=response_cache.hit_ratio
+)
+registry.gauge(
+    "voicebot_response_cache_bytes", "Text and audio held by the response cache",
+    callback=lambda: response_cache.size
+)
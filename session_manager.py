@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import shutil
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from ai_handler import AIHandler, Speculation
+from audio_capture import UtteranceCapture
+from partial_stt import PartialTranscriber, same_words
+from playback import PlaybackScheduler
+from tts_handler import TTSHandler
+from config import MAX_CALLS, SESSION_MAX_CONCURRENT_TURNS, SESSION_MAX_PENDING_TURNS, BARGE_IN_TIMEOUT, STT_LANGUAGE
+
+logger = logging.getLogger(__name__)
+
+class CallSession:
+    def __init__(self, chat_id: int, base_dir: str):
+        self.chat_id = chat_id
+        self.ai_handler = AIHandler()
+        self.tts_handler = TTSHandler()
+        self.temp_dir = os.path.join(base_dir, str(chat_id))
+        self.is_in_call = False
+        self.joined_at: Optional[float] = None
+        self.turns_served = 0
+        self.pending_turns = 0
+        self.interruptions = 0
+        self.turns: Set[asyncio.Task] = set()
+        self._turn_slots = asyncio.Semaphore(SESSION_MAX_CONCURRENT_TURNS)
+        self.capture: Optional[UtteranceCapture] = None
+        self.player: Optional[PlaybackScheduler] = None
+        self.stt_model: Optional[str] = None
+        self.stt_language: Optional[str] = STT_LANGUAGE
+        self.partials: Optional[PartialTranscriber] = None
+        self.speculation: Optional[Speculation] = None
+        self.speculations_used = 0
+
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def is_saturated(self) -> bool:
+        return self.pending_turns >= SESSION_MAX_PENDING_TURNS
+
+    def try_admit(self) -> bool:
+        if self.is_saturated():
+            return False
+        self.pending_turns += 1
+        return True
+
+    async def __aenter__(self):
+        try:
+            await self._turn_slots.acquire()
+        except BaseException:
+            self.pending_turns -= 1
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._turn_slots.release()
+        self.pending_turns -= 1
+        self.turns_served += 1
+
+    @property
+    def is_responding(self) -> bool:
+        if self.turns:
+            return True
+        return self.player is not None and (self.player.is_playing or self.player.queued > 0)
+
+    async def interrupt(self, timeout: float = BARGE_IN_TIMEOUT) -> bool:
+        if not self.is_responding:
+            return False
+
+        if self.player:
+            self.player.cancel_all()
+
+        turns = list(self.turns)
+        for turn in turns:
+            turn.cancel()
+        if turns:
+            await asyncio.wait(turns, timeout=timeout)
+
+        self.interruptions += 1
+        return True
+
+    def start_capture(
+        self,
+        on_utterance: Callable[..., Awaitable[None]],
+        on_speech_start: Optional[Callable[[int], None]] = None,
+        on_partial: Optional[Callable[[int, bytes, int, bool], None]] = None
+    ):
+        if self.capture is None:
+            self.capture = UtteranceCapture(
+                lambda wav: self._utterance_ended(on_utterance, wav),
+                on_speech_start=(lambda: on_speech_start(self.chat_id)) if on_speech_start else None,
+                on_partial=(lambda wav, frames, pause: on_partial(self.chat_id, wav, frames, pause)) if on_partial else None
+            )
+
+    def _utterance_ended(self, on_utterance: Callable[..., Awaitable[None]], wav: bytes) -> Awaitable[None]:
+        # Runs synchronously when the capture closes the utterance, before the next one
+        # can start, so the partial transcriber is handed to the right turn
+        partials, self.partials = self.partials, None
+        return on_utterance(self.chat_id, wav, partials, self.capture.last_speech_frames)
+
+    def take_speculation(self, text: str) -> Optional[Speculation]:
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if not same_words(speculation.text, text):
+            speculation.cancel()
+            return None
+        self.speculations_used += 1
+        return speculation
+
+    def discard_speculation(self):
+        if self.speculation:
+            self.speculation.cancel()
+            self.speculation = None
+
+    async def close(self):
+        if self.partials:
+            self.partials.close()
+            self.partials = None
+        self.discard_speculation()
+        if self.player:
+            await self.player.close()
+            self.player = None
+        if self.capture:
+            await self.capture.close()
+            self.capture = None
+        self.remove_temp_files()
+
+    def remove_temp_files(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def get_status(self) -> dict:
+        return {
+            "chat_id": self.chat_id,
+            "in_call": self.is_in_call,
+            "joined_at": self.joined_at,
+            "pending_turns": self.pending_turns,
+            "turns_served": self.turns_served,
+            "interruptions": self.interruptions,
+            "memory": self.ai_handler.memory.stats(),
+            "voice": self.tts_handler.voice,
+            "stt": {"model": self.stt_model, "language": self.stt_language, "speculations_used": self.speculations_used},
+            "playback": self.player.get_status() if self.player else None,
+            "listening": self.capture is not None and self.capture.in_speech
+        }
+
+
+class SessionManager:
+    def __init__(self, base_dir: str, max_sessions: int = MAX_CALLS):
+        self.base_dir = base_dir
+        self.max_sessions = max_sessions
+        self.sessions: Dict[int, CallSession] = {}
+
+    def get(self, chat_id: int) -> Optional[CallSession]:
+        return self.sessions.get(chat_id)
+
+    def create(self, chat_id: int) -> Optional[CallSession]:
+        session = self.sessions.get(chat_id)
+        if session:
+            return session
+
+        if len(self.sessions) >= self.max_sessions:
+            logger.warning(f"Session limit reached ({self.max_sessions}), cannot open chat {chat_id}")
+            return None
+
+        session = CallSession(chat_id, self.base_dir)
+        self.sessions[chat_id] = session
+        logger.info(f"Created call session for chat {chat_id}")
+        return session
+
+    async def remove(self, chat_id: int) -> Optional[CallSession]:
+        session = self.sessions.pop(chat_id, None)
+        if session:
+            await session.close()
+            logger.info(f"Removed call session for chat {chat_id}")
+        return session
+
+    def active(self) -> List[CallSession]:
+        return [session for session in self.sessions.values() if session.is_in_call]
+
+    def __len__(self) -> int:
+        return len(self.sessions)
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+from metrics import registry
+from config import STATE_DB, STATE_FLUSH_INTERVAL, STATE_FLUSH_BATCH, STATE_MAX_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id INTEGER PRIMARY KEY,
+    in_call INTEGER NOT NULL DEFAULT 0,
+    voice TEXT,
+    rate TEXT,
+    volume TEXT,
+    stt_language TEXT,
+    stt_model TEXT,
+    summary TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (chat_id, seq)
+) WITHOUT ROWID;
+"""
+
+UPSERT_CHAT = """
+INSERT INTO chats (chat_id, in_call, voice, rate, volume, stt_language, stt_model, summary, updated_at)
+VALUES (:chat_id, :in_call, :voice, :rate, :volume, :stt_language, :stt_model, :summary, :updated_at)
+ON CONFLICT(chat_id) DO UPDATE SET
+    in_call = excluded.in_call, voice = excluded.voice, rate = excluded.rate, volume = excluded.volume,
+    stt_language = excluded.stt_language, stt_model = excluded.stt_model, summary = excluded.summary,
+    updated_at = excluded.updated_at
+"""
+
+STATE_ROWS_WRITTEN = registry.counter(
+    "voicebot_state_rows_written_total", "Rows written to the session store", ("table",)
+)
+STATE_BYTES_WRITTEN = registry.counter(
+    "voicebot_state_bytes_written_total", "Payload bytes written to the session store"
+)
+STATE_FLUSH_SECONDS = registry.histogram(
+    "voicebot_state_flush_seconds", "Time to write one batch of session changes",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+STATE_RESTORE_SECONDS = registry.histogram(
+    "voicebot_state_restore_seconds", "Time to load a saved chat into a new call session",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+
+def worker_path(path: str, worker: str) -> str:
+    # Each shard worker keeps its own file, so workers never contend for the write lock
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{worker}{ext or '.db'}"
+
+
+class SessionStore:
+    # Write-behind store for per-chat state that should survive a restart: conversation
+    # memory, voice and transcription settings, and whether the bot was in the call.
+    # Changes are only recorded in memory on the hot path; a background task writes
+    # them in one transaction every flush_interval (or sooner once flush_batch pile up).
+    def __init__(
+        self,
+        path: str = STATE_DB,
+        flush_interval: float = STATE_FLUSH_INTERVAL,
+        flush_batch: int = STATE_FLUSH_BATCH,
+        max_messages: int = STATE_MAX_MESSAGES
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_messages = max_messages
+        self.closed = False
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._chats: Dict[int, dict] = {}
+        self._messages: List[Tuple[int, int, str, str]] = []
+        # Chat id -> last message seq at the time of its most recent /reset
+        self._resets: Dict[int, int] = {}
+        self._seq: Dict[int, int] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.restored = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not self.closed
+
+    @property
+    def pending(self) -> int:
+        return len(self._chats) + len(self._messages) + len(self._resets)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Only ever used from one thread at a time: writes and reads hold self._lock
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def start(self):
+        if not self.enabled or self._flush_task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _changed(self):
+        if self._wakeup is not None and self.pending >= self.flush_batch:
+            self._wakeup.set()
+
+    # Hot-path hooks: plain in-memory bookkeeping, no I/O
+
+    def save(self, session):
+        if not self.enabled:
+            return
+        # Later snapshots of the same chat replace earlier ones, so a burst of
+        # settings changes costs a single row write
+        self._chats[session.chat_id] = {
+            "chat_id": session.chat_id,
+            "in_call": int(session.is_in_call),
+            "voice": session.tts_handler.voice,
+            "rate": session.tts_handler.rate,
+            "volume": session.tts_handler.volume,
+            "stt_language": session.stt_language,
+            "stt_model": session.stt_model,
+            "summary": session.ai_handler.memory.summary,
+            "updated_at": time.time()
+        }
+        self._changed()
+
+    def track(self, session):
+        # Journals the session's conversation memory from now on
+        session.ai_handler.memory.on_change = lambda event, message: self._memory_changed(session, event, message)
+
+    def _memory_changed(self, session, event: str, message: Optional[Dict]):
+        if not self.enabled:
+            return
+        chat_id = session.chat_id
+        if event == "append":
+            seq = self._seq.get(chat_id, 0) + 1
+            self._seq[chat_id] = seq
+            self._messages.append((chat_id, seq, message["role"], message["content"]))
+            self._changed()
+        elif event == "reset":
+            self._messages = [row for row in self._messages if row[0] != chat_id]
+            self._resets[chat_id] = self._seq.get(chat_id, 0)
+            self.save(session)
+        elif event == "summary":
+            self.save(session)
+
+    # Background side
+
+    async def flush(self):
+        if not self.path:
+            return
+        async with self._lock:
+            if not self.pending:
+                return
+            chats, self._chats = self._chats, {}
+            messages, self._messages = self._messages, []
+            resets, self._resets = self._resets, {}
+
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, chats, messages, resets)
+            except Exception as e:
+                logger.error(f"Error writing session state ({len(chats)} chats, {len(messages)} messages): {e}")
+                # Keep the batch for the next attempt; newer snapshots win over older ones
+                self._chats = {**chats, **self._chats}
+                self._messages = messages + self._messages
+                self._resets = {**resets, **self._resets}
+                return
+            STATE_FLUSH_SECONDS.observe(value=time.perf_counter() - started)
+            self.flushes += 1
+
+    def _write(self, chats: Dict[int, dict], messages: List[Tuple[int, int, str, str]], resets: Dict[int, int]):
+        db = self._connect()
+        payload = 0
+        with db:
+            db.execute("BEGIN")
+            if resets:
+                db.executemany("DELETE FROM messages WHERE chat_id = ? AND seq <= ?", list(resets.items()))
+            if messages:
+                db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", messages)
+                payload += sum(len(role) + len(content.encode("utf-8")) + 16 for _, _, role, content in messages)
+                # Only the recent window is ever restored, so older rows are pruned as we go
+                newest: Dict[int, int] = {}
+                for chat_id, seq, _, _ in messages:
+                    newest[chat_id] = max(seq, newest.get(chat_id, 0))
+                db.executemany("DELETE FROM messages WHERE chat_id = ? AND seq <= ?", [
+                    (chat_id, seq - self.max_messages) for chat_id, seq in newest.items() if seq > self.max_messages
+                ])
+            if chats:
+                db.executemany(UPSERT_CHAT, list(chats.values()))
+                payload += sum(len(str(row).encode("utf-8")) for row in chats.values())
+
+        STATE_ROWS_WRITTEN.inc("messages", amount=len(messages))
+        STATE_ROWS_WRITTEN.inc("chats", amount=len(chats))
+        STATE_BYTES_WRITTEN.inc(amount=payload)
+
+    def _read(self, chat_id: int) -> Tuple[Optional[tuple], List[tuple], int]:
+        db = self._connect()
+        row = db.execute(
+            "SELECT voice, rate, volume, stt_language, stt_model, summary FROM chats WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        messages = db.execute(
+            "SELECT seq, role, content FROM messages WHERE chat_id = ? ORDER BY seq DESC LIMIT ?",
+            (chat_id, self.max_messages)
+        ).fetchall()
+        last_seq = messages[0][0] if messages else 0
+        return row, messages[::-1], last_seq
+
+    async def restore(self, session) -> bool:
+        # Loads a chat's saved state the first time it gets a session after a restart,
+        # then journals its changes from there
+        if not self.enabled:
+            return False
+        started = time.perf_counter()
+        try:
+            # Anything still pending for the chat has to land before it is read back
+            await self.flush()
+            async with self._lock:
+                row, messages, last_seq = await asyncio.to_thread(self._read, session.chat_id)
+        except Exception as e:
+            logger.error(f"Error loading saved state for chat {session.chat_id}: {e}")
+            self.track(session)
+            return False
+
+        self._seq[session.chat_id] = max(last_seq, self._seq.get(session.chat_id, 0))
+        summary = ""
+        if row:
+            voice, rate, volume, stt_language, stt_model, summary = row
+            session.tts_handler.voice = voice or session.tts_handler.voice
+            session.tts_handler.rate = rate or session.tts_handler.rate
+            session.tts_handler.volume = volume or session.tts_handler.volume
+            session.stt_language = stt_language or session.stt_language
+            session.stt_model = stt_model
+        if summary or messages:
+            session.ai_handler.memory.restore(summary, [{"role": role, "content": content} for _, role, content in messages])
+        self.track(session)
+
+        STATE_RESTORE_SECONDS.observe(value=time.perf_counter() - started)
+        if not (row or messages):
+            return False
+        self.restored += 1
+        logger.info(f"Restored chat {session.chat_id}: {len(messages)} messages, voice {session.tts_handler.voice}")
+        return True
+
+    async def calls_to_rejoin(self) -> List[int]:
+        if not self.enabled:
+            return []
+        try:
+            async with self._lock:
+                rows = await asyncio.to_thread(
+                    lambda: self._connect().execute(
+                        "SELECT chat_id FROM chats WHERE in_call = 1 ORDER BY updated_at DESC"
+                    ).fetchall()
+                )
+        except Exception as e:
+            logger.error(f"Error reading saved calls: {e}")
+            return []
+        return [chat_id for chat_id, in rows]
+
+    async def close(self):
+        # Writes what is pending and stops recording; leaving calls on shutdown after
+        # this keeps them marked for rejoin on the next start
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        self.closed = True
+        if self._db is not None:
+            async with self._lock:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "restored": self.restored
+        }
+
+
+session_store = SessionStore()
@@ -0,0 +1,121 @@
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+import types
+import commands
+from admission import admission
+from health_server import HealthCheckServer
+from log_pipeline import setup_logging
+from loop_monitor import loop_monitor
+from sharding import IPCServer
+from startup import StartupTimer, create_voice_stack, connect_voice_stack
+
+logger = logging.getLogger(__name__)
+
+
+class ProxiedEvent:
+    # The parts of a Telethon NewMessage event the command handlers use; replies go
+    # back to the supervisor, which already applied the rate limits
+    admitted = True
+
+    def __init__(self, chat_id: int, sender_id: int, text: str, notify):
+        self.chat_id = chat_id
+        self.sender_id = sender_id
+        self.message = types.SimpleNamespace(text=text)
+        self._notify = notify
+
+    async def respond(self, text: str):
+        await self._notify("respond", text=text)
+
+
+class ShardWorker:
+    def __init__(self, index: int, socket_path: str):
+        self.index = index
+        self.startup = StartupTimer(PROCESS_STARTED)
+        self.health_server = HealthCheckServer(readiness=self.readiness)
+        self.ipc = IPCServer(socket_path, {"command": self.command, "join": self.join, "status": self.status})
+        self.client = None
+        self.voice_handler = None
+
+    def readiness(self) -> dict:
+        if self.voice_handler is None or self.startup.total is None:
+            return {"ready": False, "checks": {"startup": False}, "startup": self.startup.report()}
+
+        report = self.voice_handler.readiness()
+        report["startup"] = self.startup.report()
+        return report
+
+    async def command(self, notify, command: str, chat_id: int, sender_id: int, text: str) -> dict:
+        await commands.COMMANDS[command](ProxiedEvent(chat_id, sender_id, text, notify))
+        return {"in_call": self.voice_handler.in_call(chat_id)}
+
+    async def join(self, notify, chat_id: int) -> bool:
+        if self.voice_handler.in_call(chat_id):
+            return True
+        # join_call also returns False when another join for the chat got there first
+        return await self.voice_handler.join_call(chat_id) or self.voice_handler.in_call(chat_id)
+
+    async def status(self, notify) -> dict:
+        report = self.readiness()
+        report["chats"] = [session.chat_id for session in self.voice_handler.sessions.active() if session.is_in_call]
+        return report
+
+    async def run(self):
+        stop = asyncio.Event()
+        # Ctrl-C reaches the whole process group; the supervisor decides when workers stop
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+
+        try:
+            self.startup.mark("imports")
+            loop_monitor.start()
+            await self.startup.run("health_server", self.health_server.start())
+
+            self.client, self.voice_handler = await create_voice_stack(self.startup)
+            await connect_voice_stack(self.startup, self.client, self.voice_handler)
+            commands.bind(self.voice_handler)
+
+            # Listening on the socket is the signal to the supervisor that we are ready
+            await self.startup.run("ipc", self.ipc.start())
+            self.startup.ready()
+            logger.info(f"Worker {self.index} ready")
+
+            disconnected = asyncio.ensure_future(self.client.run_until_disconnected())
+            stopped = asyncio.ensure_future(stop.wait())
+            await asyncio.wait({disconnected, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (disconnected, stopped):
+                task.cancel()
+        finally:
+            await self.ipc.stop()
+            admission.close()
+            if self.voice_handler:
+                await self.voice_handler.cleanup()
+            await self.health_server.stop()
+            if self.client:
+                await self.client.disconnect()
+            await loop_monitor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", type=int, required=True)
+    parser.add_argument("--socket", required=True)
+    args = parser.parse_args()
+
+    setup_logging(worker=f"worker-{args.index}")
+
+    try:
+        asyncio.run(ShardWorker(args.index, args.socket).run())
+    except Exception as e:
+        logger.error(f"Worker {args.index} crashed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from config import SHARD_VNODES
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+
+Notify = Callable[..., Awaitable[None]]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    # Consistent hashing with virtual nodes: adding or removing a worker only moves
+    # the chats that hashed to it, and a restarted worker gets the same chats back
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = SHARD_VNODES):
+        self.vnodes = vnodes
+        self._ring: List[Tuple[int, str]] = []
+        self._keys: List[int] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for replica in range(self.vnodes):
+            bisect.insort(self._ring, (_hash(f"{node}#{replica}"), node))
+        self._keys = [point for point, _ in self._ring]
+
+    def remove(self, node: str):
+        self._ring = [(point, owner) for point, owner in self._ring if owner != node]
+        self._keys = [point for point, _ in self._ring]
+
+    def node_for(self, key: Any) -> str:
+        if not self._ring:
+            raise LookupError("Hash ring is empty")
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._ring)
+        return self._ring[index][1]
+
+
+async def _write(writer: asyncio.StreamWriter, message: dict):
+    writer.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+class IPCServer:
+    # JSON lines over a unix socket. Requests are {"id", "method", "params"}; a handler
+    # may send any number of {"id", "event", ...} notifications before the final
+    # {"id", "result"} or {"id", "error"}. Requests are handled concurrently.
+    def __init__(self, path: str, handlers: Dict[str, Callable[..., Awaitable[Any]]]):
+        self.path = path
+        self.handlers = handlers
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, self.path, limit=MAX_MESSAGE_BYTES)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._handle(json.loads(line), writer))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"IPC connection lost: {e}")
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _handle(self, message: dict, writer: asyncio.StreamWriter):
+        request_id = message.get("id")
+
+        async def notify(event: str, **data):
+            await _write(writer, {"id": request_id, "event": event, **data})
+
+        try:
+            handler = self.handlers[message["method"]]
+            result = await handler(notify=notify, **message.get("params", {}))
+            reply = {"id": request_id, "result": result}
+        except Exception as e:
+            logger.error(f"Error handling IPC {message.get('method')}: {e}")
+            reply = {"id": request_id, "error": str(e)}
+
+        try:
+            await _write(writer, reply)
+        except ConnectionError as e:
+            logger.warning(f"Could not send IPC reply: {e}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in list(self._tasks):
+            task.cancel()
+        # Closing the connections lets their readers see EOF and finish cleanly
+        connections = list(self._connections.items())
+        for _, writer in connections:
+            writer.close()
+        await asyncio.gather(*(task for task, _ in connections), return_exceptions=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class IPCClient:
+    def __init__(self, path: str):
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, Optional[Notify]]] = {}
+        self._ids = itertools.count(1)
+        self._event_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def connected(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def connect(self, timeout: float):
+        # The worker creates its socket only once it is ready to serve
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=MAX_MESSAGE_BYTES)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if asyncio.get_running_loop().time() > deadline:
+                    raise asyncio.TimeoutError(f"No IPC server at {self.path}")
+                await asyncio.sleep(0.1)
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future, on_event = self._pending.get(message.get("id"), (None, None))
+                if future is None:
+                    continue
+                if "event" in message:
+                    if on_event:
+                        task = asyncio.create_task(on_event(message))
+                        self._event_tasks.add(task)
+                        task.add_done_callback(self._event_tasks.discard)
+                elif "error" in message:
+                    future.set_exception(RuntimeError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"IPC connection to {self.path} lost: {e}")
+        finally:
+            for future, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"IPC connection to {self.path} closed"))
+
+    async def call(self, method: str, timeout: Optional[float] = None, on_event: Optional[Notify] = None, **params) -> Any:
+        if not self.connected:
+            raise ConnectionError(f"Not connected to {self.path}")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, on_event)
+        try:
+            await _write(self._writer, {"id": request_id, "method": method, "params": params})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+        if self._reader_task:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
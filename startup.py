@@ -0,0 +1,102 @@
+import asyncio
+import importlib
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Optional
+from metrics import registry
+from config import API_ID, API_HASH, SESSION_STRING, STARTUP_BUDGET
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PHASE_SECONDS = registry.gauge(
+    "voicebot_startup_phase_seconds", "Duration of each startup phase", ("phase",)
+)
+STARTUP_SECONDS = registry.gauge(
+    "voicebot_startup_seconds", "Time from process start until the bot accepted commands"
+)
+
+
+class StartupTimer:
+    # Times named startup phases against the moment the process started. Phases may
+    # overlap when they run concurrently; "total" is wall time until ready().
+    def __init__(self, started: Optional[float] = None, budget: float = STARTUP_BUDGET):
+        self.started = started if started is not None else time.perf_counter()
+        self.budget = budget
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.current: Optional[str] = None
+        self.total: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        self.current = name
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases[name] = {"start": begin - self.started, "seconds": end - begin}
+            STARTUP_PHASE_SECONDS.set(name, value=end - begin)
+            logger.info(f"Startup phase {name} took {(end - begin) * 1000:.0f}ms")
+
+    async def run(self, name: str, awaitable: Awaitable):
+        with self.phase(name):
+            return await awaitable
+
+    def mark(self, name: str):
+        # A phase that already happened, measured from process start (e.g. imports)
+        elapsed = time.perf_counter() - self.started
+        self.phases[name] = {"start": 0.0, "seconds": elapsed}
+        STARTUP_PHASE_SECONDS.set(name, value=elapsed)
+
+    def ready(self) -> float:
+        self.total = time.perf_counter() - self.started
+        self.current = None
+        STARTUP_SECONDS.set(value=self.total)
+
+        if self.budget and self.total > self.budget:
+            slowest = max(self.phases.items(), key=lambda item: item[1]["seconds"], default=(None, None))[0]
+            logger.warning(
+                f"Cold start took {self.total:.2f}s, over the {self.budget:.2f}s budget (slowest phase: {slowest})"
+            )
+        else:
+            logger.info(f"Cold start took {self.total:.2f}s")
+        return self.total
+
+    def report(self) -> dict:
+        return {
+            "ready": self.total is not None,
+            "phase": self.current,
+            "total_seconds": round(self.total, 3) if self.total is not None else None,
+            "budget_seconds": self.budget,
+            "phases": {
+                name: {key: round(value, 3) for key, value in timing.items()}
+                for name, timing in self.phases.items()
+            }
+        }
+
+
+async def create_voice_stack(timer: StartupTimer):
+    # Telethon, PyTgCalls and the handlers are imported off the event loop, so the
+    # health server keeps answering meanwhile
+    await timer.run("load_modules", asyncio.to_thread(importlib.import_module, "voice_handler"))
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    from voice_handler import VoiceCallHandler
+
+    client = TelegramClient(StringSession(SESSION_STRING), API_ID, API_HASH)
+    voice_handler = VoiceCallHandler(client)
+    voice_handler.prepare()
+    return client, voice_handler
+
+
+async def connect_voice_stack(timer: StartupTimer, client, voice_handler):
+    await timer.run("telegram", client.start())
+    logger.info("Telegram client started successfully")
+
+    me, _ = await asyncio.gather(
+        timer.run("get_me", client.get_me()),
+        timer.run("pytgcalls", voice_handler.start())
+    )
+    logger.info(f"Logged in as: {me.first_name} (@{me.username})")
+    return me
@@ -1,53 +1,155 @@
+import asyncio
+import aiofiles
+import aiofiles.os
 import logging
-import os
-from groq import Groq
 from typing import Optional
-from config import GROQ_API_KEY
+from config import (
+    GROQ_API_KEY, STT_MAX_CONCURRENCY, STT_TIMEOUT,
+    STT_MODEL, STT_LANGUAGE, STT_FALLBACK_MODEL, STT_FALLBACK_QUEUE
+)
+from log_pipeline import TURN_DETAIL
+from loop_monitor import loop_monitor
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
 class STTHandler:
     def __init__(self):
+        self.client = None
+        self._client_failed = False
+
+        self._semaphore = asyncio.Semaphore(STT_MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.waiting = 0
+        self.fallbacks = 0
+
+    def get_client(self):
+        # groq and its models are slow to import, so the client is built on first use
+        # or by warm() in the background, never while the bot is starting up
+        if self.client is None and not self._client_failed:
+            try:
+                logger.info("Initializing Groq client for Whisper API...")
+                from groq import AsyncGroq
+                self.client = AsyncGroq(api_key=GROQ_API_KEY, timeout=STT_TIMEOUT)
+                logger.info("Groq client initialized successfully")
+            except Exception as e:
+                logger.error(f"Error initializing Groq client: {e}")
+                self._client_failed = True
+        return self.client
+
+    async def warm(self):
+        await asyncio.to_thread(self.get_client)
+
+    def is_loaded(self) -> bool:
+        return self.waiting > 0
+
+    def select_model(self, model: Optional[str] = None) -> str:
+        # Under load, trade some accuracy for the smaller, faster model
+        if STT_FALLBACK_MODEL and self.waiting >= STT_FALLBACK_QUEUE:
+            self.fallbacks += 1
+            return STT_FALLBACK_MODEL
+        return model or STT_MODEL
+
+    async def transcribe_audio(
+        self,
+        audio_file: str,
+        model: Optional[str] = None,
+        language: Optional[str] = STT_LANGUAGE
+    ) -> Optional[str]:
         try:
-            logger.info("Initializing Groq client for Whisper API...")
-            self.client = Groq(api_key=GROQ_API_KEY)
-            logger.info("Groq client initialized successfully")
-        except Exception as e:
-            logger.error(f"Error initializing Groq client: {e}")
-            self.client = None
-    
-    async def transcribe_audio(self, audio_file: str) -> Optional[str]:
-        try:
-            if not self.client:
+            if not self.get_client():
                 logger.error("Groq client not initialized")
                 return None
-            
-            if not os.path.exists(audio_file):
+
+            if not await aiofiles.os.path.exists(audio_file):
                 logger.error(f"Audio file does not exist: {audio_file}")
                 return None
-            
-            logger.info(f"Transcribing audio file: {audio_file}")
-            
-            with open(audio_file, "rb") as file:
-                transcription = self.client.audio.transcriptions.create(
-                    file=(audio_file, file.read()),
-                    model="whisper-large-v3",
-                    response_format="text",
-                    language="en"
-                )
-            
-            transcribed_text = transcription.strip() if isinstance(transcription, str) else str(transcription).strip()
-            
-            if transcribed_text:
-                logger.info(f"Transcription: {transcribed_text}")
-                return transcribed_text
-            else:
-                logger.info("No speech detected in audio")
+
+            logger.info(f"Transcribing audio file: {audio_file}", extra=TURN_DETAIL)
+
+            async with aiofiles.open(audio_file, "rb") as file:
+                audio_bytes = await file.read()
+
+            return await self._transcribe(audio_file, audio_bytes, model, language)
+
+        except Exception as e:
+            logger.error(f"Error transcribing audio: {e}")
+            return None
+
+    async def transcribe_bytes(
+        self,
+        audio_bytes: bytes,
+        filename: str = "utterance.wav",
+        model: Optional[str] = None,
+        language: Optional[str] = STT_LANGUAGE,
+        partial: bool = False
+    ) -> Optional[str]:
+        try:
+            if not self.get_client():
+                logger.error("Groq client not initialized")
                 return None
-                
+
+            return await self._transcribe(filename, audio_bytes, model, language, partial)
+
         except Exception as e:
             logger.error(f"Error transcribing audio: {e}")
             return None
-    
+
+    async def _transcribe(
+        self,
+        filename: str,
+        audio_bytes: bytes,
+        model: Optional[str] = None,
+        language: Optional[str] = STT_LANGUAGE,
+        partial: bool = False
+    ) -> Optional[str]:
+        options = {"language": language} if language and language != "auto" else {}
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            model = model if partial else self.select_model(model)
+            self.in_flight += 1
+            window = loop_monitor.begin_window()
+            try:
+                with span("stt_partial" if partial else "stt"):
+                    transcription = await self.client.audio.transcriptions.create(
+                        file=(filename, audio_bytes),
+                        model=model or STT_MODEL,
+                        response_format="text",
+                        **options
+                    )
+            finally:
+                self.in_flight -= 1
+                peak_lag = loop_monitor.end_window(window)
+        finally:
+            self._semaphore.release()
+
+        if loop_monitor.running:
+            logger.debug(f"Peak event loop lag during transcription: {peak_lag * 1000:.1f}ms")
+
+        transcribed_text = transcription.strip() if isinstance(transcription, str) else str(transcription).strip()
+
+        if partial:
+            return transcribed_text or None
+
+        if transcribed_text:
+            logger.info(f"Transcription ({model}): {transcribed_text}", extra=TURN_DETAIL)
+            return transcribed_text
+        else:
+            logger.info("No speech detected in audio", extra=TURN_DETAIL)
+            return None
+
+    async def close(self):
+        if self.client:
+            try:
+                await self.client.close()
+            except Exception as e:
+                logger.error(f"Error closing Groq client: {e}")
+
     def is_ready(self) -> bool:
         return self.client is not None
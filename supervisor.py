@@ -0,0 +1,325 @@
+import asyncio
+import functools
+import importlib
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Set
+import commands
+from health_server import HealthCheckServer
+from loop_monitor import loop_monitor
+from metrics import registry
+from session_store import SessionStore, worker_path
+from sharding import HashRing, IPCClient
+from startup import StartupTimer
+from config import (
+    API_ID, API_HASH, SESSION_STRING, AUDIO_DIR, HEALTH_CHECK_PORT, SHARDS, SHARD_SESSION_STRINGS, SHARD_SOCKET_DIR,
+    SHARD_START_TIMEOUT, SHARD_HEARTBEAT_INTERVAL, SHARD_RESTART_MAX_DELAY, STATE_DB, STATE_REJOIN
+)
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_worker.py")
+MISSED_HEARTBEATS = 3
+
+WORKER_RESTARTS = registry.counter(
+    "voicebot_shard_restarts_total", "Worker processes restarted after exiting or hanging", ("worker",)
+)
+IPC_SECONDS = registry.histogram(
+    "voicebot_shard_command_seconds", "Time to run a proxied command on its worker", ("command",)
+)
+
+
+def check_sessions(shards: int, sessions: List[str]):
+    # Every process needs its own login: Telegram answers a second connection on the same
+    # auth key with AUTH_KEY_DUPLICATED and may revoke the session
+    if len(sessions) != shards:
+        raise ValueError(f"SHARDS={shards} needs {shards} SHARD_SESSION_STRINGS, got {len(sessions)}")
+    if len(set(sessions)) != len(sessions):
+        raise ValueError("SHARD_SESSION_STRINGS must all be different sessions")
+    if SESSION_STRING in sessions:
+        raise ValueError("SHARD_SESSION_STRINGS must not reuse the front end's SESSION_STRING")
+
+
+class WorkerProcess:
+    def __init__(self, index: int, session: str):
+        self.index = index
+        self.session = session
+        self.name = f"worker-{index}"
+        self.socket_path = os.path.join(SHARD_SOCKET_DIR, f"{self.name}.sock")
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.client: Optional[IPCClient] = None
+        self.ready = False
+        self.started_at = 0.0
+        self.restarts = 0
+        self.missed = 0
+        self.status: dict = {}
+        # Chats in a call on this worker, rejoined if it has to be restarted
+        self.chats: Set[int] = set()
+
+    async def spawn(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        env = {
+            **os.environ,
+            "SHARD_INDEX": str(self.index),
+            "SESSION_STRING": self.session,
+            "PORT": str(HEALTH_CHECK_PORT + 1 + self.index),
+            "AUDIO_DIR": os.path.join(AUDIO_DIR, self.name),
+            "STATE_DB": worker_path(STATE_DB, self.name),
+            # Calls are rejoined by the supervisor only, so a worker never races it
+            "STATE_REJOIN": "false"
+        }
+        # A worker only needs its own login
+        env.pop("SHARD_SESSION_STRINGS", None)
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, "--index", str(self.index), "--socket", self.socket_path, env=env
+        )
+        self.started_at = time.monotonic()
+        self.missed = 0
+
+        self.client = IPCClient(self.socket_path)
+        connect = asyncio.create_task(self.client.connect(SHARD_START_TIMEOUT))
+        exited = asyncio.create_task(self.process.wait())
+        await asyncio.wait({connect, exited}, return_when=asyncio.FIRST_COMPLETED)
+        if not connect.done():
+            connect.cancel()
+            raise RuntimeError(f"{self.name} exited during startup with code {self.process.returncode}")
+        exited.cancel()
+        connect.result()
+        self.ready = True
+
+    def kill(self):
+        if self.process and self.process.returncode is None:
+            self.process.kill()
+
+    async def stop(self, timeout: float = 10.0):
+        self.ready = False
+        if self.client:
+            await self.client.close()
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self.name} did not stop in {timeout:.0f}s, killing it")
+                self.process.kill()
+                await self.process.wait()
+
+
+class Supervisor:
+    # Front end for SHARDS worker processes. It owns no calls itself: each command is
+    # forwarded to the worker that owns the chat on the hash ring, and a worker that
+    # exits or stops answering heartbeats is restarted and rejoins its calls
+    def __init__(self, shards: int = SHARDS, sessions: List[str] = SHARD_SESSION_STRINGS):
+        check_sessions(shards, sessions)
+        self.workers: Dict[str, WorkerProcess] = {
+            worker.name: worker for worker in (WorkerProcess(index, sessions[index]) for index in range(shards))
+        }
+        self.ring = HashRing(self.workers)
+        self.stopping = False
+        self._tasks: Set[asyncio.Task] = set()
+
+        registry.gauge(
+            "voicebot_shard_workers_ready", "Worker processes connected and serving",
+            callback=lambda: sum(worker.ready for worker in self.workers.values())
+        )
+
+    def worker_for(self, chat_id: int) -> WorkerProcess:
+        return self.workers[self.ring.node_for(chat_id)]
+
+    def start(self):
+        os.makedirs(SHARD_SOCKET_DIR, exist_ok=True)
+        for worker in self.workers.values():
+            self._spawn(self._supervise(worker))
+        self._spawn(self._heartbeat())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _supervise(self, worker: WorkerProcess):
+        if STATE_REJOIN:
+            await self._load_saved_calls(worker)
+        failures = 0
+        while not self.stopping:
+            code = None
+            try:
+                await worker.spawn()
+                logger.info(f"{worker.name} ready (pid {worker.process.pid})")
+                await self._rejoin(worker)
+                code = await worker.process.wait()
+            except Exception as e:
+                logger.error(f"Error starting {worker.name}: {e}")
+                worker.kill()
+
+            worker.ready = False
+            if worker.client:
+                await worker.client.close()
+            if self.stopping:
+                return
+
+            # Back off only while the worker keeps dying right after it starts
+            failures = 0 if time.monotonic() - worker.started_at > 60 else failures + 1
+            delay = min(SHARD_RESTART_MAX_DELAY, 0.5 * 2 ** failures)
+            worker.restarts += 1
+            WORKER_RESTARTS.inc(worker.name)
+            logger.error(
+                f"{worker.name} exited with code {code}, restarting in {delay:.1f}s "
+                f"({len(worker.chats)} calls to rejoin)"
+            )
+            await asyncio.sleep(delay)
+
+    async def _load_saved_calls(self, worker: WorkerProcess):
+        # After a full restart the calls the worker was in are only in its state file
+        store = SessionStore(worker_path(STATE_DB, worker.name))
+        try:
+            for chat_id in await store.calls_to_rejoin():
+                if self.worker_for(chat_id) is worker:
+                    worker.chats.add(chat_id)
+                else:
+                    logger.warning(f"Not rejoining chat {chat_id}: it no longer hashes to {worker.name}")
+        finally:
+            await store.close()
+
+    async def _rejoin(self, worker: WorkerProcess):
+        for chat_id in list(worker.chats):
+            try:
+                joined = await worker.client.call("join", timeout=SHARD_START_TIMEOUT, chat_id=chat_id)
+            except Exception as e:
+                logger.error(f"Error rejoining chat {chat_id} on {worker.name}: {e}")
+                joined = False
+            if joined:
+                logger.info(f"Rejoined chat {chat_id} on {worker.name}")
+            else:
+                worker.chats.discard(chat_id)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(SHARD_HEARTBEAT_INTERVAL)
+            await asyncio.gather(*(
+                self._check(worker) for worker in self.workers.values() if worker.ready
+            ))
+
+    async def _check(self, worker: WorkerProcess):
+        try:
+            worker.status = await worker.client.call("status", timeout=SHARD_HEARTBEAT_INTERVAL)
+            worker.chats = set(worker.status.get("chats", []))
+            worker.missed = 0
+        except Exception as e:
+            worker.missed += 1
+            logger.warning(f"{worker.name} missed heartbeat {worker.missed}/{MISSED_HEARTBEATS}: {e}")
+            if worker.missed >= MISSED_HEARTBEATS:
+                logger.error(f"{worker.name} is not responding, killing it")
+                worker.kill()
+
+    async def forward(self, command: str, event):
+        if not await commands.admitted(event, command):
+            return
+
+        chat_id = event.chat_id
+        worker = self.worker_for(chat_id)
+        if not worker.ready:
+            await event.respond("⏳ The worker for this chat is restarting. Please try again in a moment.")
+            return
+
+        started = time.perf_counter()
+        try:
+            result = await worker.client.call(
+                "command",
+                on_event=lambda message: event.respond(message["text"]),
+                command=command,
+                chat_id=chat_id,
+                sender_id=event.sender_id,
+                text=event.message.text
+            )
+        except Exception as e:
+            logger.error(f"Error forwarding /{command} for chat {chat_id} to {worker.name}: {e}")
+            await event.respond("❌ The worker for this chat is unavailable. Please try again in a moment.")
+            return
+        finally:
+            IPC_SECONDS.observe(command, value=time.perf_counter() - started)
+
+        if result.get("in_call"):
+            worker.chats.add(chat_id)
+        else:
+            worker.chats.discard(chat_id)
+
+    def readiness(self) -> dict:
+        checks = {name: worker.ready and worker.status.get("ready", False) for name, worker in self.workers.items()}
+        return {
+            "ready": all(checks.values()),
+            "checks": checks,
+            "active_calls": sum(len(worker.chats) for worker in self.workers.values()),
+            "workers": {
+                name: {
+                    "pid": worker.process.pid if worker.process else None,
+                    "ready": worker.ready,
+                    "restarts": worker.restarts,
+                    "calls": len(worker.chats)
+                }
+                for name, worker in self.workers.items()
+            }
+        }
+
+    async def stop(self):
+        self.stopping = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers.values()))
+
+
+async def run_supervisor(timer: StartupTimer):
+    supervisor = Supervisor()
+    client = None
+    router = None
+
+    def readiness() -> dict:
+        report = supervisor.readiness()
+        report["ready"] = report["ready"] and timer.total is not None
+        report["startup"] = timer.report()
+        return report
+
+    health_server = HealthCheckServer(readiness=readiness)
+    try:
+        logger.info(f"Starting Telegram Voice Bot supervisor with {len(supervisor.workers)} workers...")
+        timer.mark("imports")
+        loop_monitor.start()
+
+        await timer.run("health_server", health_server.start())
+        supervisor.start()
+
+        await timer.run("load_modules", asyncio.to_thread(importlib.import_module, "telethon"))
+        from telethon import TelegramClient
+        from telethon.sessions import StringSession
+
+        client = TelegramClient(StringSession(SESSION_STRING), API_ID, API_HASH)
+        await timer.run("telegram", client.start())
+        logger.info("Telegram client started successfully")
+
+        # /help needs no call state; everything else runs on the chat's worker
+        handlers = {
+            command: functools.partial(supervisor.forward, command)
+            for command in commands.COMMANDS if command != "help"
+        }
+        handlers["help"] = commands.help_handler
+        router = commands.register(
+            client, handlers, is_active=lambda chat_id: chat_id in supervisor.worker_for(chat_id).chats
+        )
+
+        timer.ready()
+        logger.info("Supervisor is ready and forwarding commands...")
+
+        await client.run_until_disconnected()
+    finally:
+        if router:
+            await router.close()
+        await supervisor.stop()
+        await health_server.stop()
+        if client:
+            await client.disconnect()
+        await loop_monitor.stop()
@@ -0,0 +1,115 @@
+import contextvars
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+from metrics import STAGE_SECONDS, STAGE_IN_FLIGHT, STAGE_ERRORS, TURN_FIRST_AUDIO_SECONDS, TURN_SECONDS, TURNS
+from config import TRACE_HISTORY
+
+logger = logging.getLogger(__name__)
+
+_turn_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("stage", "start", "end", "error")
+
+    def __init__(self, stage: str, start: float):
+        self.stage = stage
+        self.start = start
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "stage": self.stage,
+            "start_ms": round((self.start - origin) * 1000, 1),
+            "duration_ms": round((self.end - self.start) * 1000, 1) if self.end is not None else None,
+            "error": self.error
+        }
+
+
+class Trace:
+    def __init__(self, chat_id: int, text: str = ""):
+        self.turn_id = next(_turn_ids)
+        self.chat_id = chat_id
+        self.text = text[:80]
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.first_audio: Optional[float] = None
+        self.end: Optional[float] = None
+        self.outcome: Optional[str] = None
+        self.spans: List[Span] = []
+        self.tags: Dict[str, str] = {}
+
+    def mark_first_audio(self, at: Optional[float] = None):
+        if self.first_audio is None:
+            self.first_audio = at if at is not None else time.perf_counter()
+            TURN_FIRST_AUDIO_SECONDS.observe(value=self.first_audio - self.start)
+
+    def finish(self, outcome: str):
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        self.outcome = outcome
+        TURN_SECONDS.observe(value=self.end - self.start)
+        TURNS.inc(outcome)
+        recent_traces.append(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "turn_id": self.turn_id,
+            "chat_id": self.chat_id,
+            "text": self.text,
+            "started_at": self.started_at,
+            "outcome": self.outcome,
+            "first_audio_ms": round((self.first_audio - self.start) * 1000, 1) if self.first_audio else None,
+            "total_ms": round((self.end - self.start) * 1000, 1) if self.end else None,
+            "tags": self.tags,
+            "spans": [span.to_dict(self.start) for span in self.spans]
+        }
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+recent_traces: Deque[Trace] = deque(maxlen=TRACE_HISTORY)
+
+
+@contextmanager
+def span(stage: str, trace: Optional[Trace] = None):
+    trace = trace or current_trace.get()
+    record = Span(stage, time.perf_counter())
+    if trace is not None:
+        trace.spans.append(record)
+
+    STAGE_IN_FLIGHT.inc(stage)
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        if isinstance(e, Exception):
+            STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        record.end = time.perf_counter()
+        STAGE_IN_FLIGHT.dec(stage)
+        STAGE_SECONDS.observe(stage, value=record.end - record.start)
+
+
+def record(stage: str, start: float, trace: Optional[Trace] = None):
+    # Records an already finished span that does not map onto a with-block
+    trace = trace or current_trace.get()
+    record = Span(stage, start)
+    record.end = time.perf_counter()
+    if trace is not None:
+        trace.spans.append(record)
+    STAGE_SECONDS.observe(stage, value=record.end - start)
+
+
+def fail(stage: str):
+    # For stages that report failure by return value instead of raising
+    STAGE_ERRORS.inc(stage)
+    trace = current_trace.get()
+    if trace is not None and trace.spans and trace.spans[-1].stage == stage:
+        trace.spans[-1].error = "failed"
@@ -0,0 +1,167 @@
+import asyncio
+import aiofiles
+import aiofiles.os
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Optional, Set
+from config import TTS_CACHE_MAX_BYTES, TTS_CACHE_DIR, TTS_CACHE_DISK_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+class TTSCache:
+    def __init__(
+        self,
+        max_bytes: int = TTS_CACHE_MAX_BYTES,
+        disk_dir: Optional[str] = TTS_CACHE_DIR,
+        disk_max_bytes: int = TTS_CACHE_DISK_MAX_BYTES
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        # Key -> file size for the disk tier, least recently used first
+        self._disk_entries: "OrderedDict[str, int]" = OrderedDict()
+        self.disk_size = 0
+        self._writes: Set[asyncio.Task] = set()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        # Rebuilds the disk LRU from what an earlier run left, oldest use first
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+            elif entry.is_file() and entry.name.endswith(".tmp"):
+                # Left by a write that was interrupted
+                os.remove(entry.path)
+        for _, key, size in sorted(files):
+            self._disk_entries[key] = size
+            self.disk_size += size
+        self._evict_disk()
+
+    @staticmethod
+    def key(text: str, voice: str, rate: str, volume: str) -> str:
+        raw = "\x1f".join((text.strip(), voice, rate, volume))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+        if self.disk_dir and key in self._disk_entries:
+            path = self._disk_path(key)
+            try:
+                async with aiofiles.open(path, "rb") as file:
+                    audio = await file.read()
+                if key in self._disk_entries:
+                    self._disk_entries.move_to_end(key)
+                    # The mtime is the LRU order the next start rebuilds from
+                    os.utime(path)
+                self._store(key, audio)
+                self.hits += 1
+                self.disk_hits += 1
+                return audio
+            except OSError as e:
+                logger.warning(f"Error reading TTS cache entry {key[:12]}: {e}")
+                self._forget_disk(key)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, audio: bytes):
+        self._store(key, audio)
+
+        if self.disk_dir and key not in self._disk_entries and len(audio) <= self.disk_max_bytes:
+            task = asyncio.create_task(self._write_disk(key, audio))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def _store(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+
+        self._entries[key] = audio
+        self.size += len(audio)
+
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.mp3")
+
+    async def _write_disk(self, key: str, audio: bytes):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            async with aiofiles.open(tmp_path, "wb") as file:
+                await file.write(audio)
+            await aiofiles.os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Error writing TTS cache entry {key[:12]}: {e}")
+            return
+
+        self._forget_disk(key)
+        self._disk_entries[key] = len(audio)
+        self.disk_size += len(audio)
+        self._evict_disk()
+
+    def _forget_disk(self, key: str):
+        size = self._disk_entries.pop(key, None)
+        if size is not None:
+            self.disk_size -= size
+
+    def _evict_disk(self):
+        while self.disk_size > self.disk_max_bytes and self._disk_entries:
+            key, size = self._disk_entries.popitem(last=False)
+            self.disk_size -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except OSError as e:
+                logger.warning(f"Error evicting TTS cache entry {key[:12]}: {e}")
+
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_entries": len(self._disk_entries),
+            "disk_bytes": self.disk_size,
+            "disk_evictions": self.disk_evictions,
+            "hit_ratio": self.hit_ratio()
+        }
+
+    async def flush(self):
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+
+tts_cache = TTSCache()
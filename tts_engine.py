@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import random
+import ssl
+import time
+from typing import Any, List, Optional
+from xml.sax.saxutils import escape
+import aiohttp
+import edge_tts
+from metrics import registry
+from tracing import current_trace
+from config import (
+    TTS_POOL, TTS_POOL_SIZE, TTS_POOL_MIN_IDLE, TTS_POOL_PING_INTERVAL, TTS_CONN_MAX_AGE, TTS_CONN_MAX_IDLE,
+    TTS_CONNECT_TIMEOUT, TTS_RECEIVE_TIMEOUT, TTS_CONNECT_RETRIES, TTS_RECONNECT_MAX_DELAY, TTS_WSS_URL,
+    TTS_VOICES_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    # The wire protocol helpers edge_tts.Communicate uses for each of its own requests
+    import certifi
+    from edge_tts.communicate import (
+        calc_max_mesg_size, connect_id, date_to_string, get_headers_and_data, mkssml,
+        remove_incompatible_characters, split_text_by_byte_length, ssml_headers_plus_data
+    )
+    from edge_tts.constants import WSS_URL
+    from edge_tts.exceptions import NoAudioReceived
+    PROTOCOL_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"edge_tts protocol helpers unavailable, TTS connections will not be pooled: {e}")
+    PROTOCOL_AVAILABLE = False
+    WSS_URL = ""
+
+HEADERS = {
+    "Pragma": "no-cache",
+    "Cache-Control": "no-cache",
+    "Origin": "chrome-extension://jdiccldimpdaibmpdkjnbmckianbfold",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Language": "en-US,en;q=0.9",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+                  " (KHTML, like Gecko) Chrome/91.0.4472.77 Safari/537.36 Edg/91.0.864.41",
+}
+
+SPEECH_CONFIG = (
+    "Content-Type:application/json; charset=utf-8\r\n"
+    "Path:speech.config\r\n\r\n"
+    '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+    '"sentenceBoundaryEnabled":false,"wordBoundaryEnabled":false},'
+    '"outputFormat":"audio-24khz-48kbitrate-mono-mp3"'
+    "}}}}\r\n"
+)
+
+TTS_CONNECT_SECONDS = registry.histogram(
+    "voicebot_tts_connect_seconds", "TTS websocket setup time (TCP, TLS, handshake, speech config)"
+)
+TTS_SYNTHESIS_SECONDS = registry.histogram(
+    "voicebot_tts_synthesis_seconds", "TTS request time on an open connection, by connection kind", ("connection",)
+)
+TTS_CONNECTIONS = registry.counter(
+    "voicebot_tts_connections_total", "TTS connection events", ("event",)
+)
+
+
+class EdgeConnection:
+    # One Edge read-aloud websocket. Requests run one at a time, each ending at its
+    # turn.end; a request that does not finish cleanly leaves the stream in an unknown
+    # state, so the connection is then closed instead of reused
+    def __init__(self, ws: aiohttp.ClientWebSocketResponse):
+        self.ws = ws
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.ws.closed
+
+    def expired(self, max_age: float = TTS_CONN_MAX_AGE, max_idle: float = TTS_CONN_MAX_IDLE) -> bool:
+        now = time.monotonic()
+        return now - self.created_at > max_age or now - self.last_used > max_idle
+
+    async def _receive(self, timeout: float) -> aiohttp.WSMessage:
+        while True:
+            message = await self.ws.receive(timeout)
+            if message.type == aiohttp.WSMsgType.PING:
+                await self.ws.pong(message.data)
+                continue
+            if message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                                aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                raise ConnectionError(f"TTS websocket closed ({message.type.name})")
+            return message
+
+    async def synthesize(self, communicate: "edge_tts.Communicate", timeout: float = TTS_RECEIVE_TIMEOUT) -> bytes:
+        texts = split_text_by_byte_length(
+            escape(remove_incompatible_characters(communicate.text)),
+            calc_max_mesg_size(communicate.voice, communicate.rate, communicate.volume, communicate.pitch)
+        )
+        chunks = []
+        for text in texts:
+            ssml = mkssml(text, communicate.voice, communicate.rate, communicate.volume, communicate.pitch)
+            await self.ws.send_str(ssml_headers_plus_data(connect_id(), date_to_string(), ssml))
+            while True:
+                message = await self._receive(timeout)
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    headers, _ = get_headers_and_data(message.data)
+                    if headers.get(b"Path") == b"turn.end":
+                        break
+                elif message.type == aiohttp.WSMsgType.BINARY and len(message.data) >= 2:
+                    header_length = int.from_bytes(message.data[:2], "big")
+                    chunks.append(message.data[header_length + 2:])
+
+        self.uses += 1
+        self.last_used = time.monotonic()
+        if not any(chunks):
+            raise NoAudioReceived("No audio was received")
+        return b"".join(chunks)
+
+    async def ping(self, timeout: float) -> bool:
+        try:
+            await self.ws.ping()
+            message = await self.ws.receive(timeout)
+            return message.type == aiohttp.WSMsgType.PONG
+        except Exception:
+            return False
+
+    async def close(self):
+        try:
+            await self.ws.close()
+        except Exception:
+            pass
+
+
+class EdgeTTSPool:
+    # Keeps up to `size` warm Edge websockets, so an utterance skips the TCP, TLS and
+    # websocket handshake. Idle connections are pinged and recycled before the service
+    # drops them; when connecting keeps failing the pool backs off and callers fall
+    # back to a one-off edge_tts.Communicate
+    def __init__(
+        self,
+        size: int = TTS_POOL_SIZE,
+        url: str = TTS_WSS_URL or WSS_URL,
+        min_idle: int = TTS_POOL_MIN_IDLE,
+        enabled: bool = TTS_POOL and PROTOCOL_AVAILABLE
+    ):
+        self.size = max(size, 1)
+        self.url = url
+        self.min_idle = min(min_idle, self.size)
+        self.enabled = enabled
+        self._idle: List[EdgeConnection] = []
+        self._open = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ssl: Any = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._health_task: Optional[asyncio.Task] = None
+
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._retry_at
+
+    def start(self):
+        if self.enabled and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def _client(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(trust_env=True)
+            if self.url.startswith("wss:"):
+                self._ssl = ssl.create_default_context(cafile=certifi.where())
+        return self._session
+
+    async def _connect(self) -> EdgeConnection:
+        last_error: Optional[BaseException] = None
+        for attempt in range(TTS_CONNECT_RETRIES):
+            if attempt:
+                # Full jitter, like the LLM client's retries
+                await asyncio.sleep(random.uniform(0, min(TTS_RECONNECT_MAX_DELAY, 0.25 * 2 ** attempt)))
+            started = time.perf_counter()
+            try:
+                ws = await self._client().ws_connect(
+                    f"{self.url}&ConnectionId={connect_id()}",
+                    compress=15,
+                    autoping=False,
+                    headers=HEADERS,
+                    ssl=self._ssl if self._ssl is not None else True,
+                    timeout=TTS_CONNECT_TIMEOUT
+                )
+                await ws.send_str(f"X-Timestamp:{date_to_string()}\r\n{SPEECH_CONFIG}")
+            except Exception as e:
+                last_error = e
+                TTS_CONNECTIONS.inc("failed")
+                logger.warning(f"TTS connection attempt {attempt + 1}/{TTS_CONNECT_RETRIES} failed: {e}")
+                continue
+
+            TTS_CONNECT_SECONDS.observe(value=time.perf_counter() - started)
+            TTS_CONNECTIONS.inc("opened")
+            self._failures = 0
+            self._open += 1
+            return EdgeConnection(ws)
+
+        # Every attempt failed: stop trying for a while so turns are not held up by it
+        self._failures += 1
+        delay = min(TTS_RECONNECT_MAX_DELAY, 2 ** self._failures)
+        self._retry_at = time.monotonic() + delay
+        logger.error(f"TTS connections failing, using one-off connections for {delay:.0f}s: {last_error}")
+        raise ConnectionError(f"Could not connect to TTS service: {last_error}")
+
+    async def _discard(self, connection: EdgeConnection, event: str = "discarded"):
+        self._open -= 1
+        TTS_CONNECTIONS.inc(event)
+        await connection.close()
+
+    async def _acquire(self) -> tuple:
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.closed and not connection.expired():
+                return connection, "reused"
+            await self._discard(connection, "expired")
+        return await self._connect(), "new"
+
+    async def synthesize(self, text: str, voice: str, rate: str = "+0%", volume: str = "+0%") -> bytes:
+        # Normalizes and validates the voice and prosody exactly as a one-off request would
+        communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            for attempt in range(2):
+                connection, kind = await self._acquire()
+                started = time.perf_counter()
+                try:
+                    audio = await connection.synthesize(communicate)
+                except asyncio.CancelledError:
+                    await self._discard(connection)
+                    raise
+                except Exception as e:
+                    await self._discard(connection)
+                    # A warm connection the service closed while idle is retried once on a new one
+                    if kind == "reused" and attempt == 0:
+                        logger.warning(f"Pooled TTS connection failed, reconnecting: {e}")
+                        continue
+                    raise
+
+                TTS_SYNTHESIS_SECONDS.observe(kind, value=time.perf_counter() - started)
+                trace = current_trace.get()
+                if trace is not None:
+                    trace.tags["tts_connection"] = kind
+                self._idle.append(connection)
+                return audio
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self._check_idle()
+                await self._fill()
+            except Exception as e:
+                logger.error(f"Error in TTS pool health check: {e}")
+            await asyncio.sleep(TTS_POOL_PING_INTERVAL)
+
+    async def _check_idle(self):
+        # Connections are taken out of the pool while they are checked, so a request
+        # never shares one with a ping
+        checking, self._idle = self._idle, []
+        healthy = []
+        for connection in checking:
+            if connection.closed or connection.expired() or not await connection.ping(TTS_CONNECT_TIMEOUT):
+                await self._discard(connection, "expired")
+            else:
+                healthy.append(connection)
+        self._idle[:0] = healthy
+
+    async def _fill(self):
+        while self.available() and len(self._idle) < self.min_idle and self._open < self.size:
+            try:
+                self._idle.insert(0, await self._connect())
+            except ConnectionError:
+                break
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._discard(connection, "closed")
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "open": self._open,
+            "idle": len(self._idle),
+            "size": self.size,
+            "backing_off": self.enabled and not self.available()
+        }
+
+
+class VoiceCatalog:
+    # The Edge voice list rarely changes; fetch it once per TTL and share the request
+    # between concurrent callers. A failed refresh keeps serving the last good list
+    def __init__(self, ttl: float = TTS_VOICES_TTL):
+        self.ttl = ttl
+        self._voices: List[dict] = []
+        self._fetched_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+
+    def fresh(self) -> bool:
+        return bool(self._voices) and time.monotonic() - self._fetched_at < self.ttl
+
+    async def _fetch(self) -> List[dict]:
+        try:
+            voices = await edge_tts.list_voices()
+            self._voices = voices
+            self._fetched_at = time.monotonic()
+            logger.info(f"Fetched {len(voices)} TTS voices")
+        except Exception as e:
+            logger.error(f"Error getting voices: {e}")
+        return self._voices
+
+    async def get(self) -> List[dict]:
+        if self.fresh():
+            return self._voices
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._fetch())
+        return await asyncio.shield(self._refresh)
+
+
+tts_pool = EdgeTTSPool()
+voice_catalog = VoiceCatalog()
+
+registry.gauge(
+    "voicebot_tts_pool_idle", "Warm TTS connections waiting for a request",
+    callback=lambda: tts_pool.stats()["idle"]
+)
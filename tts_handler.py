@@ -1,7 +1,12 @@
+import asyncio
 import edge_tts
 import logging
-import os
-from typing import Optional
+from typing import Iterable, Optional
+from log_pipeline import TURN_DETAIL
+from tts_cache import tts_cache
+from tts_engine import tts_pool, voice_catalog
+from tts_pipeline import RenderPipeline, split_for_tts
+from tracing import fail, span
 
 logger = logging.getLogger(__name__)
 
@@ -10,39 +15,100 @@ class TTSHandler:
         self.voice = "en-US-AndrewNeural"
         self.rate = "+0%"
         self.volume = "+0%"
-        
-    async def text_to_speech(self, text: str, output_file: str) -> Optional[str]:
+
+    async def synthesize(self, text: str) -> Optional[bytes]:
+        with span("tts"):
+            key = tts_cache.key(text, self.voice, self.rate, self.volume)
+            audio = await tts_cache.get(key)
+            if audio is not None:
+                logger.info(f"TTS cache hit: {text[:50]}...", extra=TURN_DETAIL)
+                return audio
+
+            audio = await self._synthesize_uncached(text)
+            if audio:
+                tts_cache.put(key, audio)
+            else:
+                fail("tts")
+            return audio
+
+    async def _synthesize_uncached(self, text: str) -> Optional[bytes]:
+        logger.info(f"Converting text to speech: {text[:50]}...", extra=TURN_DETAIL)
+        if tts_pool.available():
+            try:
+                return await tts_pool.synthesize(text, self.voice, self.rate, self.volume)
+            except Exception as e:
+                logger.warning(f"Pooled TTS failed, using a one-off connection: {e}")
+
         try:
-            logger.info(f"Converting text to speech: {text[:50]}...")
-            
             communicate = edge_tts.Communicate(
                 text=text,
                 voice=self.voice,
                 rate=self.rate,
                 volume=self.volume
             )
-            
-            await communicate.save(output_file)
-            
-            if os.path.exists(output_file):
-                logger.info(f"TTS audio saved to {output_file}")
-                return output_file
+
+            chunks = []
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    chunks.append(chunk["data"])
+
+            if chunks:
+                return b"".join(chunks)
             else:
-                logger.error("TTS file was not created")
+                logger.error("TTS returned no audio")
                 return None
-                
+
         except Exception as e:
-            logger.error(f"Error in text_to_speech: {e}")
+            logger.error(f"Error in synthesize: {e}")
             return None
-    
+
+    async def synthesize_long(self, text: str) -> Optional[bytes]:
+        # Chunks are synthesized in parallel; MP3 frames from the same voice join as-is
+        pipeline = RenderPipeline(self.synthesize)
+        pipeline.submit_all(split_for_tts(text))
+        pipeline.close()
+        try:
+            parts = [audio async for _, audio in pipeline.results()]
+        finally:
+            pipeline.cancel()
+
+        if not parts or not all(parts):
+            return None
+        return b"".join(parts)
+
+    async def text_to_speech(self, text: str, output_file: str) -> Optional[str]:
+        audio = await self.synthesize_long(text)
+        if not audio:
+            return None
+
+        try:
+            with open(output_file, "wb") as file:
+                file.write(audio)
+            logger.info(f"TTS audio saved to {output_file}")
+            return output_file
+        except OSError as e:
+            logger.error(f"Error saving TTS audio: {e}")
+            return None
+
+    async def prewarm(self, phrases: Iterable[str], concurrency: int = 3):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm(phrase: str):
+            async with semaphore:
+                await self.synthesize(phrase)
+
+        phrases = [phrase for phrase in phrases if phrase.strip()]
+        await asyncio.gather(*(warm(phrase) for phrase in phrases))
+        logger.info(f"TTS cache pre-warmed with {len(phrases)} phrases: {tts_cache.stats()}")
+
+    @property
+    def profile(self) -> str:
+        # Everything besides the text that changes the rendered audio
+        return f"{self.voice}|{self.rate}|{self.volume}"
+
     def set_voice(self, voice: str):
         self.voice = voice
         logger.info(f"Voice changed to: {voice}")
-    
+
     async def get_available_voices(self):
-        try:
-            voices = await edge_tts.list_voices()
-            return voices
-        except Exception as e:
-            logger.error(f"Error getting voices: {e}")
-            return []
+        return await voice_catalog.get()
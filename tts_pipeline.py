@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from config import TTS_FIRST_CHUNK_CHARS, TTS_MAX_CHUNK_CHARS, TTS_PARALLELISM
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r'(?<=[.!?…])["\')\]]*\s+')
+CLAUSE_BOUNDARY = re.compile(r'[,;:]\s+|\s+[—–-]\s+')
+
+
+def _split_long(text: str, limit: int) -> List[str]:
+    # Cut at the last clause boundary before the limit, else at the last space
+    parts = []
+    while len(text) > limit:
+        window = text[:limit + 1]
+        cut = max((match.end() for match in CLAUSE_BOUNDARY.finditer(window)), default=0)
+        if cut < limit // 3:
+            cut = window.rfind(" ") + 1
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+def split_for_tts(
+    text: str,
+    first_chars: Optional[int] = TTS_FIRST_CHUNK_CHARS,
+    max_chars: int = TTS_MAX_CHUNK_CHARS
+) -> List[str]:
+    # A short first chunk gets audio playing quickly; later chunks are whole sentences
+    # merged up to max_chars, since fewer requests sound more natural and cost less
+    pieces: List[str] = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        if sentence.strip():
+            pieces.extend(_split_long(sentence.strip(), max_chars))
+    if not pieces:
+        return []
+
+    if first_chars and len(pieces[0]) > first_chars:
+        head = _split_long(pieces[0], first_chars)[0]
+        rest = pieces[0][len(head):].strip()
+        pieces[0:1] = [head, rest] if rest else [head]
+        first_limit = len(head)
+    else:
+        first_limit = first_chars or max_chars
+
+    chunks = [pieces[0]]
+    for piece in pieces[1:]:
+        limit = first_limit if len(chunks) == 1 else max_chars
+        if len(chunks[-1]) + 1 + len(piece) <= limit:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+class RenderPipeline:
+    # Renders chunks with bounded parallelism and hands the results back in the order
+    # the chunks were submitted, so the first one can play while the rest are in flight
+    def __init__(self, render: Callable[[str], Awaitable[Optional[bytes]]], parallelism: int = TTS_PARALLELISM):
+        self.render = render
+        self._semaphore = asyncio.Semaphore(max(parallelism, 1))
+        self._order: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, chunk: str):
+        task = asyncio.create_task(self._render(chunk))
+        self._tasks.append(task)
+        self._order.put_nowait((chunk, task))
+
+    def submit_all(self, chunks: List[str]):
+        for chunk in chunks:
+            self.submit(chunk)
+
+    def close(self):
+        self._order.put_nowait(None)
+
+    async def _render(self, chunk: str) -> Optional[bytes]:
+        async with self._semaphore:
+            return await self.render(chunk)
+
+    async def results(self) -> AsyncIterator[Tuple[str, Optional[bytes]]]:
+        while True:
+            item = await self._order.get()
+            if item is None:
+                return
+            chunk, task = item
+            try:
+                pcm = await task
+            except Exception as e:
+                logger.error(f"Error rendering TTS chunk: {e}")
+                pcm = None
+            yield chunk, pcm
+
+    def cancel(self):
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
@@ -1,15 +1,35 @@
 import asyncio
+import contextvars
 import logging
 import os
 import time
 from pytgcalls import PyTgCalls, StreamType
-from pytgcalls.types import AudioPiped, Update
+from pytgcalls.types import Update
 from pytgcalls.exceptions import GroupCallNotFound, AlreadyJoinedError
 from telethon import TelegramClient
-from typing import Optional
-from ai_handler import AIHandler
+from typing import List, Optional, Set
+from ai_handler import AIHandler, ERROR_REPLY, EXCEPTION_REPLY
 from tts_handler import TTSHandler
+from tts_cache import tts_cache
+from tts_engine import tts_pool
+from response_cache import response_cache
+from admission import upstream_limit
 from stt_handler import STTHandler
+from session_manager import CallSession, SessionManager
+from session_store import session_store
+from audio_dsp import pcm_cache, postprocess, record_postprocess
+from audio_pipeline import PcmDecoder, raw_stream, silence_pcm, write_pcm
+from playback import PlaybackItem, PlaybackScheduler
+from log_pipeline import TURN_DETAIL
+from tracing import Trace, current_trace, span
+from metrics import registry
+from partial_stt import PartialTranscriber
+from fillers import FILLERS_PLAYED, FillerBank
+from tts_pipeline import RenderPipeline, split_for_tts
+from config import (
+    AUDIO_DIR, BARGE_IN, STREAM_RESPONSES, TTS_PREWARM_PHRASES, STT_PARTIALS, STT_SPECULATIVE_LLM,
+    FILLERS, FILLER_AFTER_MS, TTS_FIRST_CHUNK_CHARS, AUDIO_DSP, STATE_REJOIN
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,75 +37,133 @@ class VoiceCallHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
         self.pytgcalls = PyTgCalls(client)
-        self.ai_handler = AIHandler()
-        self.tts_handler = TTSHandler()
         self.stt_handler = STTHandler()
         
-        self.current_chat_id: Optional[int] = None
-        self.is_in_call = False
-        self.temp_dir = "temp_audio"
+        self.decoder = PcmDecoder()
+        self.started = False
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self.fillers = FillerBank(self._render)
+        self._background: Set[asyncio.Task] = set()
+        
+        self.temp_dir = AUDIO_DIR
+        self.sessions = SessionManager(self.temp_dir)
         
         os.makedirs(self.temp_dir, exist_ok=True)
         
+        registry.gauge(
+            "voicebot_active_calls", "Voice calls currently joined",
+            callback=lambda: len(self.sessions.active())
+        )
+        
         self._setup_handlers()
     
     def _setup_handlers(self):
         @self.pytgcalls.on_stream_end()
         async def on_stream_end(client: PyTgCalls, update: Update):
-            logger.info("Audio stream ended")
+            logger.info(f"Audio stream ended in chat {update.chat_id}")
+            session = self.sessions.get(update.chat_id)
+            if session and session.player:
+                session.player.on_stream_end()
+    
+    def prepare(self):
+        # Warm-up that needs no Telegram connection; runs in the background while the
+        # client connects, so the first call does not pay for it
+        self.decoder.start()
+        self._spawn(asyncio.to_thread(self._create_silence_audio))
+        self._spawn(self.stt_handler.warm())
+        tts_pool.start()
+        session_store.start()
+        self._prewarm_task = asyncio.create_task(
+            TTSHandler().prewarm([ERROR_REPLY, EXCEPTION_REPLY, *TTS_PREWARM_PHRASES])
+        )
+        if FILLERS:
+            self.fillers.ensure(TTSHandler())
+    
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
     
     async def start(self):
         try:
+            if self._prewarm_task is None:
+                self.prepare()
             await self.pytgcalls.start()
+            self.started = True
             logger.info("PyTgCalls started successfully")
+            if STATE_REJOIN:
+                self._spawn(self._rejoin_saved_calls())
         except Exception as e:
             logger.error(f"Error starting PyTgCalls: {e}")
     
+    def in_call(self, chat_id: int) -> bool:
+        session = self.sessions.get(chat_id)
+        return session is not None and session.is_in_call
+    
+    def can_join(self) -> bool:
+        return len(self.sessions) < self.sessions.max_sessions
+    
+    def is_busy(self, chat_id: int) -> bool:
+        session = self.sessions.get(chat_id)
+        return session is not None and session.is_saturated()
+    
     async def join_call(self, chat_id: int) -> bool:
         try:
-            if self.is_in_call:
-                logger.warning("Already in a call")
+            if self.in_call(chat_id):
+                logger.warning(f"Already in the call in chat {chat_id}")
                 return False
             
+            is_new = self.sessions.get(chat_id) is None
+            session = self.sessions.create(chat_id)
+            if not session:
+                return False
+            if is_new:
+                await session_store.restore(session)
+            
             logger.info(f"Attempting to join voice call in chat {chat_id}")
             
-            silence_file = await self._create_silence_audio()
+            silence_file = self._create_silence_audio()
             
             await self.pytgcalls.join_group_call(
                 chat_id,
-                AudioPiped(silence_file),
+                raw_stream(silence_file),
                 stream_type=StreamType().pulse_stream
             )
             
-            self.current_chat_id = chat_id
-            self.is_in_call = True
-            logger.info(f"Successfully joined voice call in chat {chat_id}")
+            self._mark_joined(session)
+            logger.info(f"Successfully joined voice call in chat {chat_id} ({len(self.sessions)} active)")
             
             return True
             
         except AlreadyJoinedError:
             logger.warning("Already joined this call")
-            self.is_in_call = True
-            self.current_chat_id = chat_id
+            self._mark_joined(self.sessions.create(chat_id))
             return True
         except GroupCallNotFound:
-            logger.error("No active group call found in this chat")
+            logger.error(f"No active group call found in chat {chat_id}")
+            session = self.sessions.get(chat_id)
+            if session and not session.is_in_call:
+                # The call has ended, so it is not one to rejoin after a restart
+                session_store.save(session)
+            await self._discard_if_idle(chat_id)
             return False
         except Exception as e:
             logger.error(f"Error joining call: {e}")
+            await self._discard_if_idle(chat_id)
             return False
     
-    async def leave_call(self) -> bool:
+    async def leave_call(self, chat_id: int) -> bool:
         try:
-            if not self.is_in_call or not self.current_chat_id:
-                logger.warning("Not currently in a call")
+            if not self.in_call(chat_id):
+                logger.warning(f"Not currently in a call in chat {chat_id}")
                 return False
             
-            await self.pytgcalls.leave_group_call(self.current_chat_id)
+            await self.pytgcalls.leave_group_call(chat_id)
             
-            self.is_in_call = False
-            chat_id = self.current_chat_id
-            self.current_chat_id = None
+            session = self.sessions.get(chat_id)
+            session.is_in_call = False
+            session_store.save(session)
+            await self.sessions.remove(chat_id)
             
             logger.info(f"Left voice call in chat {chat_id}")
             return True
@@ -94,85 +172,434 @@ class VoiceCallHandler:
             logger.error(f"Error leaving call: {e}")
             return False
     
-    async def process_and_speak(self, text: str) -> bool:
+    async def process_and_speak(
+        self,
+        chat_id: int,
+        text: str,
+        barge_in: bool = BARGE_IN,
+        trace: Optional[Trace] = None
+    ) -> bool:
+        trace = trace or Trace(chat_id, text)
+        
+        session = self.sessions.get(chat_id)
+        if not session or not session.is_in_call:
+            logger.warning(f"Not in a call in chat {chat_id}, cannot speak")
+            trace.finish("rejected")
+            return False
+        
+        if barge_in and await session.interrupt():
+            logger.info(f"[{chat_id}] Interrupted the previous reply")
+        
+        if not session.try_admit():
+            logger.warning(f"Chat {chat_id} has too many pending turns, dropping: {text}")
+            trace.finish("rejected")
+            return False
+        
         try:
-            if not self.is_in_call or not self.current_chat_id:
-                logger.warning("Not in a call, cannot speak")
-                return False
-            
-            logger.info(f"Processing text: {text}")
-            
-            ai_response = await self.ai_handler.get_response(text)
+            async with session:
+                context = contextvars.copy_context()
+                context.run(current_trace.set, trace)
+                turn = asyncio.create_task(self._speak_turn(session, text), context=context)
+                session.turns.add(turn)
+                turn.add_done_callback(session.turns.discard)
+                
+                try:
+                    success = await turn
+                    trace.finish("ok" if success else "failed")
+                    return success
+                except asyncio.CancelledError:
+                    trace.finish("interrupted")
+                    if turn.cancelled() and not asyncio.current_task().cancelling():
+                        logger.info(f"[{chat_id}] Reply interrupted")
+                        return False
+                    raise
             
-            output_file = os.path.join(self.temp_dir, f"response_{int(time.time())}.mp3")
-            audio_file = await self.tts_handler.text_to_speech(ai_response, output_file)
+        except Exception as e:
+            logger.error(f"Error in process_and_speak: {e}")
+            trace.finish("error")
+            return False
+    
+    async def interrupt(self, chat_id: int) -> bool:
+        session = self.sessions.get(chat_id)
+        return session is not None and await session.interrupt()
+    
+    async def _speak_turn(self, session: CallSession, text: str) -> bool:
+        logger.info(f"[{session.chat_id}] Processing text: {text}", extra=TURN_DETAIL)
+        
+        cache_key = session.ai_handler.cache_key(text)
+        if cache_key:
+            cached = session.ai_handler.cached_audio(text, cache_key, session.tts_handler.profile)
+            if cached:
+                return await self._speak_cached(session, *cached)
+        
+        filler = self._start_filler(session, text)
+        try:
+            if STREAM_RESPONSES:
+                return await self._stream_and_speak(session, text, filler, cache_key)
+            return await self._reply_and_speak(session, text, filler, cache_key)
+        finally:
+            self._end_filler(session, filler)
+    
+    async def _speak_cached(self, session: CallSession, reply: str, pcm: bytes) -> bool:
+        item = session.player.enqueue(pcm, label=reply)
+        try:
+            return await item.wait()
+        finally:
+            session.player.cancel(item)
+            if item.played:
+                session.ai_handler.commit_reply(item.label)
+    
+    async def _reply_and_speak(
+        self,
+        session: CallSession,
+        text: str,
+        filler: Optional[asyncio.Task],
+        cache_key: Optional[str] = None
+    ) -> bool:
+        tts_handler = session.tts_handler
+        pipeline = RenderPipeline(lambda chunk: self._render(tts_handler, chunk))
+        
+        # The upstream cap covers the LLM request and the renders, never playback
+        async with upstream_limit:
+            ai_response = await session.ai_handler.get_response(text, commit=False)
+        pipeline.submit_all(split_for_tts(ai_response))
+        pipeline.close()
+        
+        return await self._speak_rendered(session, pipeline, filler, cache_key, tts_handler.profile)
+    
+    async def _stream_and_speak(
+        self,
+        session: CallSession,
+        text: str,
+        filler: Optional[asyncio.Task] = None,
+        cache_key: Optional[str] = None
+    ) -> bool:
+        tts_handler = session.tts_handler
+        pipeline = RenderPipeline(lambda chunk: self._render(tts_handler, chunk))
+        
+        async def generate():
+            try:
+                first = True
+                # The upstream cap covers the LLM stream and the renders, never playback
+                async with upstream_limit:
+                    async for sentence in session.ai_handler.stream_response(
+                        text, commit=False, speculation=session.take_speculation(text)
+                    ):
+                        # Only the opening of the reply is cut short to start audio early
+                        pipeline.submit_all(split_for_tts(sentence, first_chars=TTS_FIRST_CHUNK_CHARS if first else None))
+                        first = False
+            finally:
+                pipeline.close()
+        
+        producer = asyncio.create_task(generate())
+        try:
+            return await self._speak_rendered(session, pipeline, filler, cache_key, tts_handler.profile)
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+    
+    async def _speak_rendered(
+        self,
+        session: CallSession,
+        pipeline: RenderPipeline,
+        filler: Optional[asyncio.Task],
+        cache_key: Optional[str],
+        profile: str
+    ) -> bool:
+        # Chunks are queued in order as soon as each is decoded; the scheduler joins
+        # the ones that are ready into one gapless stream
+        items: List[PlaybackItem] = []
+        try:
+            async for chunk, pcm in pipeline.results():
+                if pcm:
+                    self._stop_filler(filler)
+                    items.append(session.player.enqueue(pcm, label=chunk))
+                else:
+                    logger.error("Failed to generate TTS audio for chunk")
             
-            if not audio_file:
+            if not items:
                 logger.error("Failed to generate TTS audio")
                 return False
             
-            await self.pytgcalls.change_stream(
-                self.current_chat_id,
-                AudioPiped(audio_file)
-            )
-            
-            logger.info("Audio streamed to voice call")
+            played = await asyncio.gather(*(item.wait() for item in items))
+            return any(played)
+        finally:
+            pipeline.cancel()
+            for item in items:
+                session.player.cancel(item)
+            # Only what the call actually heard goes into the conversation history
+            session.ai_handler.commit_reply(" ".join(item.label for item in items if item.played))
+            if cache_key and items:
+                # Kept only if the chunks add up to the cached reply
+                response_cache.attach_audio(
+                    cache_key, profile, " ".join(item.label for item in items), b"".join(item.pcm for item in items)
+                )
+    
+    def _start_filler(self, session: CallSession, text: str) -> Optional[asyncio.Task]:
+        if not FILLERS or session.player is None:
+            return None
+        
+        self.fillers.ensure(session.tts_handler)
+        if session.player.is_playing or session.player.queued:
+            return None
+        
+        picked = self.fillers.pick(session.tts_handler.voice, text)
+        if not picked:
+            return None
+        return asyncio.create_task(self._play_filler(session, *picked))
+    
+    async def _play_filler(self, session: CallSession, kind: str, phrase: str, pcm: bytes) -> PlaybackItem:
+        # Only speaks up if the real answer is not ready within FILLER_AFTER_MS
+        await asyncio.sleep(FILLER_AFTER_MS / 1000)
+        FILLERS_PLAYED.inc(kind)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.tags["filler"] = phrase
+        return session.player.enqueue(pcm, label=phrase)
+    
+    def _stop_filler(self, filler: Optional[asyncio.Task]):
+        # The answer is ready: drop a filler that has not started, keep one already queued
+        if filler and not filler.done():
+            filler.cancel()
+    
+    def _end_filler(self, session: CallSession, filler: Optional[asyncio.Task]):
+        if filler is None:
+            return
+        if not filler.done():
+            filler.cancel()
+        elif not filler.cancelled() and filler.exception() is None and session.player:
+            session.player.cancel(filler.result())
+    
+    async def _render(self, tts_handler: TTSHandler, text: str) -> Optional[bytes]:
+        async with upstream_limit:
+            mp3 = await tts_handler.synthesize(text)
+        if not mp3:
+            return None
+        
+        # A repeated phrase comes back from the TTS cache as the same MP3
+        key = pcm_cache.key(mp3)
+        pcm = pcm_cache.get(key)
+        if pcm is not None:
+            return pcm
+        
+        with span("decode"):
+            pcm = await self.decoder.decode(mp3)
+        if pcm and AUDIO_DSP:
+            # A few ms per clip; NumPy releases the GIL, so it runs off the event loop
+            with span("dsp"):
+                pcm, lead, tail, gain_db = await asyncio.to_thread(postprocess, pcm)
+            record_postprocess(lead, tail, gain_db)
+        if pcm:
+            pcm_cache.put(key, pcm)
+        return pcm
+    
+    async def listen_and_respond(self, chat_id: int, audio_file: str) -> bool:
+        try:
+            if not self.stt_handler.get_client():
+                logger.error("STT handler not ready")
+                return False
             
-            await asyncio.sleep(5)
+            session = self.sessions.get(chat_id)
+            options = self._stt_options(session)
             
+            trace = Trace(chat_id)
+            token = current_trace.set(trace)
             try:
-                os.remove(audio_file)
-            except:
-                pass
+                transcribed_text = await self.stt_handler.transcribe_audio(audio_file, **options)
+            finally:
+                current_trace.reset(token)
             
-            return True
+            if transcribed_text:
+                logger.info(f"[{chat_id}] Heard: {transcribed_text}", extra=TURN_DETAIL)
+                await self.process_and_speak(chat_id, transcribed_text, trace=trace)
+                return True
+            
+            trace.finish("no_speech")
+            return False
             
         except Exception as e:
-            logger.error(f"Error in process_and_speak: {e}")
+            logger.error(f"Error in listen_and_respond: {e}")
             return False
     
-    async def listen_and_respond(self, audio_file: str) -> bool:
+    def feed_audio(self, chat_id: int, pcm: bytes):
+        # Entry point for inbound 16-bit mono PCM from the call at CAPTURE_SAMPLE_RATE
+        session = self.sessions.get(chat_id)
+        if session and session.capture:
+            session.capture.push(pcm)
+    
+    def _on_speech_start(self, chat_id: int):
+        session = self.sessions.get(chat_id)
+        if BARGE_IN and session and session.is_responding:
+            logger.info(f"[{chat_id}] Participant started talking, interrupting reply")
+            self._spawn(session.interrupt())
+    
+    async def respond_to_utterance(
+        self,
+        chat_id: int,
+        wav_bytes: bytes,
+        partials: Optional[PartialTranscriber] = None,
+        speech_frames: int = 0
+    ) -> bool:
         try:
-            if not self.stt_handler.is_ready():
+            if not self.stt_handler.get_client():
                 logger.error("STT handler not ready")
                 return False
             
-            transcribed_text = await self.stt_handler.transcribe_audio(audio_file)
+            trace = Trace(chat_id)
+            token = current_trace.set(trace)
+            try:
+                if partials:
+                    transcribed_text = await partials.final(wav_bytes, speech_frames)
+                else:
+                    options = self._stt_options(self.sessions.get(chat_id))
+                    transcribed_text = await self.stt_handler.transcribe_bytes(wav_bytes, **options)
+            finally:
+                current_trace.reset(token)
             
             if transcribed_text:
-                logger.info(f"Heard: {transcribed_text}")
-                await self.process_and_speak(transcribed_text)
+                logger.info(f"[{chat_id}] Heard: {transcribed_text}", extra=TURN_DETAIL)
+                await self.process_and_speak(chat_id, transcribed_text, trace=trace)
                 return True
             
+            session = self.sessions.get(chat_id)
+            if session:
+                session.discard_speculation()
+            trace.finish("no_speech")
             return False
             
         except Exception as e:
-            logger.error(f"Error in listen_and_respond: {e}")
+            logger.error(f"Error in respond_to_utterance: {e}")
+            return False
+    
+    def _stt_options(self, session: Optional[CallSession]) -> dict:
+        if not session:
+            return {}
+        return {"model": session.stt_model, "language": session.stt_language}
+    
+    def _on_partial(self, chat_id: int, wav_bytes: bytes, speech_frames: int, pause: bool):
+        session = self.sessions.get(chat_id)
+        if not session:
+            return
+        if session.partials is None:
+            session.partials = PartialTranscriber(
+                self.stt_handler,
+                **self._stt_options(session),
+                on_pause_hypothesis=(lambda text: self._speculate(chat_id, text)) if STT_SPECULATIVE_LLM and STREAM_RESPONSES else None
+            )
+        if not pause:
+            # Speech resumed after a pause, so a reply started on it is stale
+            session.discard_speculation()
+        session.partials.push(wav_bytes, speech_frames, pause)
+    
+    def _speculate(self, chat_id: int, text: str):
+        session = self.sessions.get(chat_id)
+        if not session or session.is_responding:
+            return
+        session.discard_speculation()
+        session.speculation = session.ai_handler.speculate(text)
+        logger.debug(f"[{chat_id}] Speculative reply started for: {text}")
+    
+    def set_transcription(self, chat_id: int, language: Optional[str] = None, model: Optional[str] = None) -> bool:
+        session = self.sessions.get(chat_id)
+        if not session:
+            return False
+        if language:
+            session.stt_language = language
+        if model:
+            session.stt_model = model
+        session_store.save(session)
+        return True
+    
+    def reset_conversation(self, chat_id: int) -> bool:
+        session = self.sessions.get(chat_id)
+        if not session:
             return False
+        session.ai_handler.reset_conversation()
+        return True
+    
+    def _mark_joined(self, session: CallSession):
+        session.is_in_call = True
+        session.joined_at = time.time()
+        session.start_capture(
+            self.respond_to_utterance,
+            self._on_speech_start,
+            self._on_partial if STT_PARTIALS else None
+        )
+        if session.player is None:
+            session.player = PlaybackScheduler(self.pytgcalls, session.chat_id, session.temp_dir, self._create_silence_audio())
+            session.player.start()
+        session_store.save(session)
+    
+    async def _rejoin_saved_calls(self):
+        chat_ids = await session_store.calls_to_rejoin()
+        if chat_ids:
+            logger.info(f"Rejoining {len(chat_ids)} saved calls")
+        for chat_id in chat_ids:
+            if not self.can_join():
+                logger.warning("Session limit reached, not rejoining the remaining saved calls")
+                break
+            if not self.in_call(chat_id):
+                await self.join_call(chat_id)
     
-    async def _create_silence_audio(self) -> str:
-        silence_file = os.path.join(self.temp_dir, "silence.mp3")
+    async def _discard_if_idle(self, chat_id: int):
+        if not self.in_call(chat_id):
+            await self.sessions.remove(chat_id)
+    
+    def _create_silence_audio(self) -> str:
+        silence_file = os.path.join(self.temp_dir, "silence.raw")
         
         if not os.path.exists(silence_file):
-            await self.tts_handler.text_to_speech(".", silence_file)
+            write_pcm(silence_file, silence_pcm(1.0))
         
         return silence_file
     
-    def get_status(self) -> dict:
+    def get_status(self, chat_id: Optional[int] = None) -> dict:
+        session = self.sessions.get(chat_id) if chat_id is not None else None
         return {
-            "in_call": self.is_in_call,
-            "chat_id": self.current_chat_id,
-            "stt_ready": self.stt_handler.is_ready()
+            "in_call": session is not None and session.is_in_call,
+            "chat_id": chat_id if session else None,
+            "active_calls": len(self.sessions.active()),
+            "pending_turns": session.pending_turns if session else 0,
+            "playback": session.player.get_status() if session and session.player else None,
+            "stt_ready": self.stt_handler.is_ready(),
+            "tts_cache": tts_cache.stats(),
+            "tts_pool": tts_pool.stats(),
+            "pcm_cache": pcm_cache.stats(),
+            "session_store": session_store.stats(),
+            "response_cache": response_cache.stats()
+        }
+    
+    def readiness(self) -> dict:
+        checks = {
+            "pytgcalls": self.started,
+            "stt": self.stt_handler.is_ready(),
+            "llm": AIHandler.is_healthy()
         }
+        return {"ready": all(checks.values()), "checks": checks, "active_calls": len(self.sessions.active())}
     
     async def cleanup(self):
         try:
-            if self.is_in_call:
-                await self.leave_call()
+            # Closing the store first keeps these calls marked as joined, so the next
+            # start rejoins them
+            await session_store.close()
+            for session in list(self.sessions.active()):
+                await self.leave_call(session.chat_id)
+            
+            if self._prewarm_task:
+                self._prewarm_task.cancel()
+            self.fillers.close()
+            
+            await AIHandler.close()
+            await self.stt_handler.close()
+            await self.decoder.close()
+            await tts_pool.close()
+            await tts_cache.flush()
             
             for file in os.listdir(self.temp_dir):
                 file_path = os.path.join(self.temp_dir, file)
                 try:
+                    if os.path.isdir(file_path):
+                        continue
                     os.remove(file_path)
                 except:
                     pass